@@ -0,0 +1,356 @@
+import json
+import os
+import re
+import threading
+from typing import Optional, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from pydantic import BaseModel, Field
+
+ANNOTATIONS_PATH = os.getenv('ANNOTATIONS_PATH', 'annotations.npz')
+EVENT_COLUMNS = {
+    'onset': np.float64, 'end': np.float64, 'confidence': np.float32,
+    'kind': np.int32, 'label': np.int32, 'channel': np.int32, 'source': np.int32,
+}
+STRING_COLUMNS = ('kind', 'label', 'channel', 'source')
+# Events shorter than this, instantaneous ones included, share the finest level of the index
+MIN_SPAN = 2.0 ** -6
+MAX_LISTED = 20
+
+_FENCE = re.compile(r"^```\w*\s*|\s*```$")
+
+
+class EventTable:
+    """
+    The events of one recording as columns, with an interval index.
+
+    Events are grouped into levels by duration, a level holding the events
+    shorter than a power of two seconds, and the columns are sorted by level
+    and then by onset. An event of a level can only overlap a window if it
+    starts less than the level's bound before the window, so a range query is
+    one binary search per level, for the events starting within that bound
+    before the window, in it and after it, and a comparison of the few
+    starting before it; its cost does not grow with the number of events or
+    with the length of the longest one. Appended events are buffered and
+    merged into the index on the next query.
+    """
+
+    def __init__(self, columns=None, levels=None, metadata=None):
+        self.metadata = dict(metadata or {})
+        self.columns = columns or {name: np.empty(0, dtype) for name, dtype in EVENT_COLUMNS.items()}
+        self.levels = np.empty((0, 3), dtype=np.int64)
+        self._pending = []
+        self._views = []
+        if levels is not None:
+            self._set_levels(levels)
+        elif len(self.columns['onset']):
+            self._pending.append(self.columns)
+            self.columns = {name: np.empty(0, dtype) for name, dtype in EVENT_COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.columns['onset']) + sum(len(batch['onset']) for batch in self._pending)
+
+    def append(self, columns):
+        """Buffer events given as a column array per name of EVENT_COLUMNS."""
+        if len(columns['onset']):
+            self._pending.append(columns)
+
+    def _set_levels(self, levels):
+        # One row per level: its exponent (durations below 2 ** exponent), first and last row + 1
+        self.levels = np.asarray(levels, dtype=np.int64).reshape(-1, 3)
+        onset, end = self.columns['onset'], self.columns['end']
+        self._views = [(2.0 ** exponent, first, onset[first:last], end[first:last])
+                       for exponent, first, last in self.levels.tolist()]
+
+    def index(self):
+        """Merge the buffered events into the columns and rebuild the index."""
+        if not self._pending:
+            return
+        columns = {name: np.concatenate([self.columns[name]] + [batch[name] for batch in self._pending])
+                   for name in EVENT_COLUMNS}
+        self._pending = []
+        exponent = np.frexp(np.maximum(columns['end'] - columns['onset'], MIN_SPAN))[1]
+        order = np.lexsort((columns['onset'], exponent))
+        self.columns = {name: column[order] for name, column in columns.items()}
+        exponent = exponent[order]
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(exponent)) + 1])
+        stops = np.concatenate([starts[1:], [len(exponent)]])
+        self._set_levels(np.stack([exponent[starts], starts, stops], axis=1))
+
+    def overlapping(self, start=-np.inf, stop=np.inf):
+        """
+        Rows of the events overlapping ``[start, stop)``, in order of onset; an
+        instantaneous event overlaps it if it falls within it.
+        """
+        self.index()
+        found = []
+        for bound, first, onset, end in self._views:
+            early, inside, after = np.searchsorted(onset, (start - bound, start, stop)).tolist()
+            if early < inside:
+                rows = np.flatnonzero(end[early:min(inside, after)] > start)
+                if len(rows):
+                    found.append(rows + (first + early))
+            if inside < after:
+                found.append(np.arange(first + inside, first + after))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(found)
+        if len(found) > 1:
+            rows = rows[np.argsort(self.columns['onset'][rows], kind='stable')]
+        return rows
+
+    def at(self, time):
+        """Rows of the events under ``time``, such as the sleep stage it falls in."""
+        return self.overlapping(time, np.nextafter(time, np.inf))
+
+
+class AnnotationStore:
+    """
+    Annotations of a set of recordings, persisted to a single ``.npz`` file.
+
+    Each recording has an EventTable of timed events (stimulus onsets, sleep
+    stages, artifact spans, ...) and a dict of metadata. An event is a row of
+    columns, not a Python object: its onset and end in seconds, a confidence,
+    and its kind, label, channel and source as codes into a string table the
+    recordings share, so millions of events take a few tens of bytes each.
+    ``save`` writes the columns and index of every recording, with the string
+    table and metadata as a JSON header, to a temporary file and renames it,
+    so loading the store does not re-sort anything and readers never see a
+    partial file.
+    """
+
+    def __init__(self, path=ANNOTATIONS_PATH):
+        self.path = path
+        self.tables = {}
+        self.strings = ['']
+        self._codes = {'': 0}
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with np.load(self.path) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            self.strings = header['strings']
+            self._codes = {string: code for code, string in enumerate(self.strings)}
+            for index, recording in enumerate(header['recordings']):
+                columns = {name: data[f'{index}.{name}'] for name in EVENT_COLUMNS}
+                self.tables[recording['name']] = EventTable(columns, data[f'{index}.levels'], recording['metadata'])
+
+    def save(self):
+        with self._lock:
+            header = {
+                'strings': self.strings,
+                'recordings': [{'name': name, 'metadata': table.metadata} for name, table in self.tables.items()],
+            }
+            arrays = {'header': np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)}
+            for index, table in enumerate(self.tables.values()):
+                table.index()
+                arrays.update({f'{index}.{name}': column for name, column in table.columns.items()})
+                arrays[f'{index}.levels'] = table.levels
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'wb') as file:
+                np.savez(file, **arrays)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(self.path + '.tmp', self.path)
+
+    def table(self, recording):
+        with self._lock:
+            if recording not in self.tables:
+                self.tables[recording] = EventTable()
+            return self.tables[recording]
+
+    def recordings(self):
+        return list(self.tables)
+
+    def update_metadata(self, recording, values):
+        with self._lock:
+            self.table(recording).metadata.update(values)
+
+    def _code(self, string):
+        code = self._codes.get(string)
+        if code is None:
+            code = self._codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def encode(self, values, rows):
+        """Codes of ``values``, a string or one string per row."""
+        if values is None or isinstance(values, str):
+            return np.full(rows, self._code(values or ''), dtype=np.int32)
+        unique, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        return np.array([self._code(value) for value in unique.tolist()], dtype=np.int32)[inverse.reshape(-1)]
+
+    def decode(self, codes):
+        return np.asarray(self.strings, dtype=object)[codes]
+
+    def add(self, recording, onset, end=None, duration=None, kind='event', label='', channel='', source='',
+            confidence=np.nan):
+        """
+        Add events in bulk: ``onset`` and ``end`` (or ``duration``, 0 for
+        instantaneous events) are arrays of seconds, and the other fields
+        arrays or a single value for every event. Events with a non-finite
+        onset or ending before they start are left out; returns the number
+        added.
+        """
+        onset = np.atleast_1d(np.asarray(onset, dtype=np.float64))
+        if end is None:
+            end = onset + (0.0 if duration is None else np.asarray(duration, dtype=np.float64))
+        end = np.broadcast_to(np.asarray(end, dtype=np.float64), onset.shape)
+        with self._lock:
+            columns = {'onset': onset, 'end': end,
+                       'confidence': np.broadcast_to(np.asarray(confidence, dtype=np.float32), onset.shape)}
+            for name, values in zip(STRING_COLUMNS, (kind, label, channel, source)):
+                columns[name] = self.encode(values, len(onset))
+            valid = np.isfinite(onset) & np.isfinite(end) & (end >= onset)
+            columns = {name: np.ascontiguousarray(column[valid], dtype=EVENT_COLUMNS[name])
+                       for name, column in columns.items()}
+            self.table(recording).append(columns)
+            return int(valid.sum())
+
+    def add_records(self, recording, records, source='llm'):
+        """
+        Add events given as dicts with an ``onset`` (or ``start``), an ``end``
+        or ``duration``, and optionally a ``kind``, ``label``, ``channel`` and
+        ``confidence``, such as the annotations an agent proposes; returns the
+        numbers of events added and skipped.
+        """
+        fields = {name: [] for name in ('onset', 'end', 'kind', 'label', 'channel', 'confidence')}
+        for record in records:
+            try:
+                onset = float(record.get('onset', record.get('start')))
+                end = float(record['end']) if record.get('end') is not None else onset + float(record.get('duration') or 0)
+                confidence = float(record['confidence']) if record.get('confidence') is not None else np.nan
+            except (AttributeError, TypeError, ValueError):
+                continue
+            fields['onset'].append(onset)
+            fields['end'].append(end)
+            fields['confidence'].append(confidence)
+            for name in ('kind', 'label', 'channel'):
+                fields[name].append(str(record.get(name) or ('event' if name == 'kind' else '')))
+        added = self.add(recording, source=source, **fields) if fields['onset'] else 0
+        return added, len(records) - added
+
+    def query(self, recording, start=None, stop=None, kind=None, label=None, channel=None):
+        """
+        Rows of the events of ``recording`` overlapping ``[start, stop)`` (the
+        whole recording by default), in order of onset, optionally only those
+        of a ``kind``, ``label`` or ``channel``.
+        """
+        with self._lock:
+            table = self.tables.get(recording)
+            if table is None:
+                return np.empty(0, dtype=np.int64)
+            rows = table.overlapping(-np.inf if start is None else start, np.inf if stop is None else stop)
+            for name, value in (('kind', kind), ('label', label), ('channel', channel)):
+                if value is not None:
+                    code = self._codes.get(value)
+                    rows = rows[table.columns[name][rows] == code] if code is not None else rows[:0]
+            return rows
+
+    def records(self, recording, rows):
+        """The events of ``recording`` at ``rows`` as dicts."""
+        columns = self.tables[recording].columns
+        decoded = {name: self.decode(columns[name][rows]) for name in STRING_COLUMNS}
+        return [
+            {'onset': float(columns['onset'][row]), 'end': float(columns['end'][row]),
+             'confidence': None if np.isnan(columns['confidence'][row]) else float(columns['confidence'][row]),
+             **{name: decoded[name][index] for name in STRING_COLUMNS}}
+            for index, row in enumerate(rows.tolist())
+        ]
+
+    def describe(self, recording, start=None, stop=None, kind=None, limit=MAX_LISTED):
+        """The metadata of ``recording``, the events per kind in a window and the first ``limit`` of them."""
+        table = self.table(recording)
+        lines = [f"{recording}: {len(table)} events"]
+        if table.metadata:
+            lines.append("Metadata: " + json.dumps(table.metadata, ensure_ascii=False))
+        rows = self.query(recording, start, stop, kind)
+        window = f"{'start' if start is None else f'{start:g} s'}-{'end' if stop is None else f'{stop:g} s'}"
+        if not len(rows):
+            lines.append(f"No events in {window}")
+            return "\n".join(lines)
+        counts = np.bincount(table.columns['kind'][rows])
+        lines.append(f"{len(rows)} events in {window}: " + ", ".join(
+            f"{self.strings[code]} {counts[code]}" for code in np.flatnonzero(counts)))
+        for event in self.records(recording, rows[:limit]):
+            span = f"{event['onset']:.3f} s" if event['end'] == event['onset'] else \
+                f"{event['onset']:.3f}-{event['end']:.3f} s"
+            details = "".join([f" [{event['channel']}]" if event['channel'] else "",
+                               f" ({event['confidence']:.2f})" if event['confidence'] is not None else ""])
+            lines.append(f"{span} {event['kind']}: {event['label'] or '-'}{details}")
+        if len(rows) > limit:
+            lines.append(f"... and {len(rows) - limit} more")
+        return "\n".join(lines)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path=ANNOTATIONS_PATH):
+    """The AnnotationStore of ``path``, shared by every tool of the process that uses it."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = AnnotationStore(path)
+        return _stores[key]
+
+
+def _parse_json(text):
+    return json.loads(_FENCE.sub('', text.strip()))
+
+
+class AnnotationToolSchema(BaseModel):
+    recording: str = Field(..., description="Name of the recording the annotations belong to")
+    annotations: Optional[str] = Field(
+        None,
+        description='JSON list of events to add, each {"onset": seconds, "duration": seconds (or "end"), '
+                    '"kind": e.g. "stimulus", "sleep_stage" or "artifact", "label": ..., "channel": ... (omit for '
+                    'all channels), "confidence": 0-1}; use a duration of 0 for instantaneous events',
+    )
+    metadata: Optional[str] = Field(
+        None, description="JSON object of metadata to set on the recording, e.g. subject, task, montage, findings"
+    )
+    start: Optional[float] = Field(None, description="Start in seconds of the window to list events of")
+    stop: Optional[float] = Field(None, description="End in seconds of the window to list events of")
+    kind: Optional[str] = Field(None, description="List only the events of this kind")
+
+
+class AnnotationTool(BaseTool):
+    name: str = "Neural data annotations"
+    description: str = (
+        "Records and looks up the annotations of a neural recording: timed events such as stimulus onsets, "
+        "sleep stages and artifact spans, and metadata about the recording. Adds the given events and metadata, "
+        "then lists the recording's metadata and the events in the given window."
+    )
+    args_schema: Type[BaseModel] = AnnotationToolSchema
+    path: str = ANNOTATIONS_PATH
+
+    def _run(self, recording, annotations=None, metadata=None, start=None, stop=None, kind=None):
+        store = open_store(self.path)
+        lines = []
+        try:
+            if annotations:
+                proposed = _parse_json(annotations)
+                if isinstance(proposed, dict):
+                    proposed = proposed.get('annotations', proposed.get('events', [proposed]))
+                if not isinstance(proposed, list):
+                    return "annotations must be a JSON list of events"
+                added, skipped = store.add_records(recording, proposed)
+                lines.append(f"Added {added} events" + (f", skipped {skipped} without a valid onset and end"
+                                                        if skipped else ""))
+            if metadata:
+                values = _parse_json(metadata)
+                if not isinstance(values, dict):
+                    return "metadata must be a JSON object"
+                store.update_metadata(recording, values)
+        except ValueError as exc:
+            return f"Invalid JSON: {exc}"
+        if annotations or metadata:
+            store.save()
+        lines.append(store.describe(recording, start, stop, kind))
+        return "\n".join(lines)
@@ -0,0 +1,277 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from pydantic import BaseModel, Field
+
+from neural_data import open_recording
+
+ARTIFACT_WORKERS = int(os.getenv('ARTIFACT_WORKERS', str(os.cpu_count() or 1)))
+CRITERIA = ('amplitude', 'flat', 'jump')
+
+
+def _rolling_sum(x, width):
+    """Centred moving sum over ``width`` samples along the last axis, same length as ``x``."""
+    before = width // 2
+    padded = np.pad(x, ((0, 0), (before + 1, width - 1 - before)))
+    cumulative = np.cumsum(padded, axis=1)
+    return cumulative[:, width:] - cumulative[:, :-width]
+
+
+def fast_ica(x, n_components=None, max_iter=200, tol=1e-4, seed=0):
+    """
+    Symmetric FastICA with a log-cosh contrast on (channels, samples) data.
+
+    Returns ``(unmixing, mixing)`` so that sources are ``unmixing @ (x - mean)``
+    and ``mixing @ sources`` reconstructs the centred data.
+    """
+    x = x - x.mean(axis=1, keepdims=True)
+    samples = x.shape[1]
+    eigenvalues, eigenvectors = np.linalg.eigh(x @ x.T / samples)
+    order = np.argsort(eigenvalues)[::-1][:n_components or x.shape[0]]
+    order = order[eigenvalues[order] > 1e-12 * eigenvalues[order[0]]]
+    whitening = (eigenvectors[:, order] / np.sqrt(eigenvalues[order])).T
+    z = whitening @ x
+
+    def decorrelate(w):
+        values, vectors = np.linalg.eigh(w @ w.T)
+        return (vectors / np.sqrt(values)) @ vectors.T @ w
+
+    w = decorrelate(np.random.default_rng(seed).standard_normal((len(order), len(order))))
+    for _ in range(max_iter):
+        g = np.tanh(w @ z)
+        updated = decorrelate(g @ z.T / samples - (1 - g ** 2).mean(axis=1)[:, None] * w)
+        converged = np.max(np.abs(np.abs(np.einsum('ij,ij->i', updated, w)) - 1)) < tol
+        w = updated
+        if converged:
+            break
+
+    unmixing = w @ whitening
+    return unmixing, np.linalg.pinv(unmixing)
+
+
+class ArtifactDetector:
+    """
+    Artifact detection and removal for (channels, samples) recordings.
+
+    ``fit`` learns a linear cleaning operator from a subsample of the recording:
+    either regression of the EOG channels out of every other channel, or ICA
+    with rejection of components whose time course correlates with EOG. ``run``
+    then shards the recording by time segment across a process pool; each shard
+    is read with ``overlap`` seconds of context on both sides so that detections
+    spanning shard borders are identical to a single-pass run. Per shard it
+    applies the operator, flags samples exceeding ``amplitude``, raw channels
+    flatter than ``flat`` (moving standard deviation over ``flat_window`` seconds) and
+    sample-to-sample jumps larger than ``jump``, widens the flags by ``margin``
+    seconds, and replaces flagged samples by linear interpolation. Thresholds
+    are in the units of the recording.
+    """
+
+    def __init__(self, sfreq, eog_channels=(), method='regression', amplitude=150.0, flat=0.5, flat_window=1.0,
+                 jump=100.0, margin=0.1, ica_components=None, ica_threshold=0.5, fit_seconds=120.0):
+        if method not in (None, 'regression', 'ica'):
+            raise ValueError(f"Unknown artifact removal method: {method}")
+        self.sfreq = sfreq
+        self.eog_channels = list(eog_channels)
+        self.method = method if self.eog_channels else None
+        self.amplitude = amplitude
+        self.flat = flat
+        self.flat_window = max(int(flat_window * sfreq), 2)
+        self.jump = jump
+        self.margin = int(margin * sfreq)
+        self.ica_components = ica_components
+        self.ica_threshold = ica_threshold
+        self.fit_samples = int(fit_seconds * sfreq)
+        self.mean = None
+        self.projection = None
+        self.rejected_components = []
+
+    @property
+    def overlap(self):
+        return self.flat_window + self.margin + 1
+
+    def _subsample(self, data, pieces=20):
+        samples = data.shape[1]
+        if samples <= self.fit_samples:
+            return np.asarray(data, dtype=np.float64)
+        length = self.fit_samples // pieces
+        starts = np.linspace(0, samples - length, pieces).astype(np.int64)
+        return np.concatenate([np.asarray(data[:, s:s + length], dtype=np.float64) for s in starts], axis=1)
+
+    def fit(self, data):
+        channels = data.shape[0]
+        x = self._subsample(data)
+        self.mean = x.mean(axis=1)
+        self.projection = None
+        self.rejected_components = []
+        if self.method is None:
+            return self
+
+        x = x - self.mean[:, None]
+        eog = self.eog_channels
+        others = [c for c in range(channels) if c not in eog]
+        projection = np.eye(channels)
+        if self.method == 'regression':
+            weights = np.linalg.lstsq(x[eog].T, x[others].T, rcond=None)[0].T
+            projection[np.ix_(others, eog)] = -weights
+        else:
+            unmixing, mixing = fast_ica(x[others], self.ica_components)
+            sources = unmixing @ x[others]
+            sources = (sources - sources.mean(axis=1, keepdims=True)) / sources.std(axis=1, keepdims=True)
+            reference = (x[eog] - x[eog].mean(axis=1, keepdims=True)) / x[eog].std(axis=1, keepdims=True)
+            correlation = np.abs(sources @ reference.T / sources.shape[1]).max(axis=1)
+            self.rejected_components = [int(i) for i in np.flatnonzero(correlation > self.ica_threshold)]
+            block = np.eye(len(others)) - mixing[:, self.rejected_components] @ unmixing[self.rejected_components]
+            projection[np.ix_(others, others)] = block
+        self.projection = projection
+        return self
+
+    def detect(self, x, raw=None):
+        """
+        Boolean artifact mask of ``x`` and the per-criterion masks it combines.
+
+        Flat lines are looked for in ``raw`` when given, since removing EOG
+        activity can leave a dead channel with a non-flat residue.
+        """
+        flags = {
+            'amplitude': np.abs(x) > self.amplitude,
+            'jump': np.zeros(x.shape, dtype=bool),
+        }
+        jumps = np.abs(np.diff(x, axis=1)) > self.jump
+        flags['jump'][:, 1:] |= jumps
+        flags['jump'][:, :-1] |= jumps
+
+        raw = x if raw is None else raw
+        width = min(self.flat_window, x.shape[1])
+        mean = _rolling_sum(raw, width) / width
+        variance = _rolling_sum(raw * raw, width) / width - mean ** 2
+        flags['flat'] = variance < self.flat ** 2
+
+        mask = flags['amplitude'] | flags['flat'] | flags['jump']
+        if self.margin:
+            mask = _rolling_sum(mask.astype(np.int32), 2 * self.margin + 1) > 0
+        return mask, flags
+
+    def clean(self, x):
+        """Apply the fitted operator, then detect and interpolate over artifacts; returns ``(cleaned, mask, flags)``."""
+        raw = x
+        if self.projection is not None:
+            x = self.projection @ (x - self.mean[:, None]) + self.mean[:, None]
+        mask, flags = self.detect(x, raw)
+        cleaned = x.copy()
+        positions = np.arange(x.shape[1])
+        for channel in np.flatnonzero(mask.any(axis=1)):
+            good = ~mask[channel]
+            if good.any():
+                cleaned[channel, ~good] = np.interp(positions[~good], positions[good], x[channel, good])
+            else:
+                cleaned[channel] = 0.0
+        return cleaned, mask, flags
+
+    def run(self, input_path, output_path, mask_path, shard_seconds=60.0, workers=ARTIFACT_WORKERS):
+        """
+        Clean the recording at ``input_path`` into ``output_path`` (.npy) and write the mask to ``mask_path``.
+
+        Returns per-channel flagged sample counts and per-criterion totals.
+        """
+        data = open_recording(input_path).data
+        channels, samples = data.shape
+        if self.mean is None:
+            self.fit(data)
+        np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=(channels, samples)).flush()
+        np.lib.format.open_memmap(mask_path, mode='w+', dtype=np.bool_, shape=(channels, samples)).flush()
+
+        shard = max(int(shard_seconds * self.sfreq), 1)
+        bounds = [(start, min(start + shard, samples)) for start in range(0, samples, shard)]
+        jobs = [(self, input_path, output_path, mask_path, start, stop) for start, stop in bounds]
+        if workers <= 1:
+            results = [_process_shard(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_process_shard, *zip(*jobs)))
+
+        return {
+            'channels': channels,
+            'samples': samples,
+            'flagged_per_channel': sum(result[0] for result in results),
+            'criteria': {name: sum(result[1][name] for result in results) for name in CRITERIA},
+        }
+
+
+def _process_shard(detector, input_path, output_path, mask_path, start, stop):
+    data = open_recording(input_path).data
+    lo, hi = max(start - detector.overlap, 0), min(stop + detector.overlap, data.shape[1])
+    cleaned, mask, flags = detector.clean(np.asarray(data[:, lo:hi], dtype=np.float64))
+    inner = slice(start - lo, stop - lo)
+
+    out = np.load(output_path, mmap_mode='r+')
+    out[:, start:stop] = cleaned[:, inner]
+    out.flush()
+    mask_out = np.load(mask_path, mmap_mode='r+')
+    mask_out[:, start:stop] = mask[:, inner]
+    mask_out.flush()
+    return mask[:, inner].sum(axis=1), {name: int(flags[name][:, inner].sum()) for name in CRITERIA}
+
+
+class ArtifactRemovalToolSchema(BaseModel):
+    input_path: str = Field(..., description="Path of a .npy recording or a raw recording with a JSON sidecar")
+    output_path: str = Field(..., description="Path of the .npy file to write the cleaned recording to")
+    sampling_rate: Optional[float] = Field(None, description="Sampling rate in Hz, if not given by the recording header")
+    eog_channels: str = Field('', description="Comma-separated EOG channel names or indices, empty if none")
+    method: str = Field('regression', description="'regression' or 'ica' for EOG removal, or 'none'")
+    amplitude: float = Field(150.0, description="Absolute amplitude threshold, in recording units")
+    flat: float = Field(0.5, description="Moving standard deviation below which a channel counts as flat")
+    jump: float = Field(100.0, description="Largest allowed sample-to-sample step, in recording units")
+
+
+class ArtifactRemovalTool(BaseTool):
+    name: str = "Remove artifacts from neural recording"
+    description: str = (
+        "Detects amplitude, flat-line and jump artifacts, removes blink/EOG activity by regression or ICA, "
+        "and interpolates over flagged samples in a neural recording, in parallel across CPU cores. Writes "
+        "the cleaned recording to output_path and the boolean artifact mask next to it."
+    )
+    args_schema: Type[BaseModel] = ArtifactRemovalToolSchema
+
+    def _run(self, input_path, output_path, sampling_rate=None, eog_channels='', method='regression',
+             amplitude=150.0, flat=0.5, jump=100.0):
+        recording = open_recording(input_path)
+        try:
+            sampling_rate = recording.require_sfreq(sampling_rate)
+        except ValueError as exc:
+            return str(exc)
+        names = [c.strip() for c in eog_channels.split(',') if c.strip()]
+        unknown = [c for c in names if c not in recording.channels
+                   and not (c.isdigit() and int(c) < len(recording.channels))]
+        if unknown:
+            return (f"Unknown EOG channels {', '.join(unknown)}; the recording has channels "
+                    f"{', '.join(recording.channels)} (or give their indices 0-{len(recording.channels) - 1})")
+        eog = [recording.channels.index(c) if c in recording.channels else int(c) for c in names]
+        detector = ArtifactDetector(
+            sampling_rate,
+            eog_channels=eog,
+            method=None if method == 'none' else method,
+            amplitude=amplitude,
+            flat=flat,
+            jump=jump,
+        )
+        mask_path = os.path.splitext(output_path)[0] + '_mask.npy'
+        stats = detector.run(input_path, output_path, mask_path)
+
+        total = stats['channels'] * stats['samples']
+        flagged = stats['flagged_per_channel']
+        worst = [c for c in np.argsort(flagged)[::-1][:5] if flagged[c]]
+        affected = ", ".join(f"{recording.channels[c]} {flagged[c] / stats['samples']:.1%}" for c in worst)
+        lines = [
+            f"Cleaned {stats['channels']} channels x {stats['samples']} samples into {output_path} "
+            f"(mask: {mask_path}); {flagged.sum() / total:.2%} of samples flagged and interpolated.",
+            "Flagged by criterion: " + ", ".join(f"{name} {count / total:.2%}" for name, count in stats['criteria'].items()),
+            f"Most affected channels: {affected or 'none'}",
+        ]
+        if detector.method == 'regression':
+            lines.append(f"EOG activity regressed out using channels {', '.join(recording.channels[c] for c in eog)}.")
+        elif detector.method == 'ica':
+            lines.append(f"ICA rejected {len(detector.rejected_components)} EOG-correlated components.")
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+"""
+Insert, range query and persistence benchmark for the annotation store on synthetic events.
+
+Run from the repository root:
+
+    python -m benchmarks.annotations --events 1000000 5000000 --hours 8 --window 30
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from annotations import AnnotationStore
+
+
+def synthetic_events(count, seconds, seed=0):
+    """Stimulus onsets, 30 s sleep stages and exponentially distributed artifact spans, plus one whole-recording event."""
+    rng = np.random.default_rng(seed)
+    kind = rng.choice(['stimulus', 'sleep_stage', 'artifact'], size=count, p=[0.5, 0.05, 0.45])
+    onset = rng.uniform(0, seconds, count)
+    duration = np.select([kind == 'stimulus', kind == 'sleep_stage'], [0.0, 30.0], rng.exponential(1.5, count))
+    label = rng.choice(['N1', 'N2', 'N3', 'REM', 'W', 'blink', 'muscle', 'tone'], size=count)
+    onset[0], duration[0], kind[0] = 0.0, seconds, 'recording'
+    return onset, duration, kind, label
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the annotation store')
+    parser.add_argument('--events', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--hours', type=float, default=8)
+    parser.add_argument('--window', type=float, default=30, help='query window in seconds')
+    parser.add_argument('--queries', type=int, default=10_000)
+    args = parser.parse_args()
+
+    seconds = args.hours * 3600
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.events:
+            path = os.path.join(directory, f'{count}.npz')
+            onset, duration, kind, label = synthetic_events(count, seconds)
+            store = AnnotationStore(path)
+
+            start = time.perf_counter()
+            store.add('recording', onset, duration=duration, kind=kind, label=label, source='synthetic')
+            store.table('recording').index()
+            inserted = time.perf_counter() - start
+
+            starts = rng.uniform(0, seconds, args.queries)
+            start = time.perf_counter()
+            found = sum(len(store.query('recording', t, t + args.window)) for t in starts)
+            queried = (time.perf_counter() - start) / args.queries
+
+            start = time.perf_counter()
+            store.save()
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            AnnotationStore(path)
+            loaded = time.perf_counter() - start
+
+            print(
+                f"events={count:<10,} insert+index {inserted:6.2f} s  query {queried * 1e6:8.1f} us "
+                f"({found / args.queries:,.0f} events/{args.window:g} s)  save {saved:5.2f} s  load {loaded:5.2f} s  "
+                f"{os.path.getsize(path) / count:5.1f} B/event"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+End-to-end benchmark of the three crews against local fakes of the Groq API and Serper search.
+
+The fakes sit below the real clients: ChatGroq and the Groq SDK talk to a fake
+HTTP transport behind the shared rate limiter, so caching, rate limiting,
+retries and scheduling are all exercised, while latency, token counts and
+failures come from a seeded, configurable model instead of the network. Each
+crew runs in its own process, in a scratch directory, so imports, caches and
+peak memory are measured from cold.
+
+Run from the repository root:
+
+    python -m benchmarks.crews --latency 0.4 --jitter 0.3 --failure-rate 0.02 --repeat 3
+
+Results are appended to ``.cache/benchmarks/crews.jsonl`` with the commit they
+were measured on, and compared with the latest earlier commit run with the
+same settings.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from statistics import median
+from unittest.mock import patch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join('.cache', 'benchmarks', 'crews.jsonl')
+WORDS = (
+    "neural cortex signal model data network analysis memory synapse activity brain pattern "
+    "research result method feature learning response region dynamics structure"
+).split()
+METRICS = ('wall_seconds', 'import_seconds', 'overhead_seconds', 'llm_requests', 'retries', 'tasks',
+           'tasks_per_second', 'tokens_per_second', 'peak_rss_mb')
+
+
+class FakeGroq:
+    """
+    Fake Groq chat-completions endpoint for an httpx transport.
+
+    Each request sleeps for ``latency`` seconds (log-normally jittered by
+    ``jitter``) plus ``per_token`` seconds per completion token, then answers
+    with ``completion_tokens`` (±50%) tokens of text shaped as a crewai final
+    answer. A ``failure_rate`` share of requests get a 429 or 500 instead.
+    Randomness is seeded from ``seed``, the request body and the attempt
+    number, so a run is reproducible. Request intervals are recorded.
+    """
+
+    def __init__(self, latency=0.3, jitter=0.0, per_token=0.0, completion_tokens=300, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_token = per_token
+        self.completion_tokens = completion_tokens
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.intervals = []
+        self.failures = 0
+        self.tokens = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        import httpx
+
+        start = time.perf_counter()
+        body = request.content or b''
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            attempt = self._attempts[digest] = self._attempts.get(digest, -1) + 1
+        rng = random.Random(f"{self.seed}:{digest}:{attempt}")
+
+        completion = max(1, int(self.completion_tokens * rng.uniform(0.5, 1.5)))
+        delay = self.latency * (rng.lognormvariate(0, self.jitter) if self.jitter else 1.0)
+        time.sleep(delay + self.per_token * completion)
+        try:
+            if rng.random() < self.failure_rate:
+                with self._lock:
+                    self.failures += 1
+                if rng.random() < 0.5:
+                    return httpx.Response(429, headers={'retry-after': '0.05'}, json={'error': {'message': 'rate'}})
+                return httpx.Response(500, json={'error': {'message': 'fake server error'}})
+
+            payload = json.loads(body or b'{}')
+            prompt = sum(len(str(message.get('content', ''))) for message in payload.get('messages', [])) // 4
+            text = " ".join(rng.choice(WORDS) for _ in range(completion))
+            with self._lock:
+                self.tokens += prompt + completion
+            return httpx.Response(200, json={
+                'id': f"chatcmpl-{digest[:12]}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': f"Thought: I now can give a great answer\nFinal Answer: {text}"},
+                    'finish_reason': 'stop',
+                    'logprobs': None,
+                }],
+                'usage': {'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': prompt + completion},
+            })
+        finally:
+            with self._lock:
+                self.intervals.append((start, time.perf_counter()))
+
+    def busy_seconds(self):
+        """Time during which at least one request was in flight."""
+        total, end = 0.0, float('-inf')
+        for start, stop in sorted(self.intervals):
+            if stop > end:
+                total += stop - max(start, end)
+                end = stop
+        return total
+
+
+def fake_search_tool(latency):
+    """A SerperDevTool stand-in answering every query with canned results after ``latency`` seconds."""
+    # CachedSearchTool carries SerperDevTool's name and description
+    from search_cache import CachedSearchTool
+
+    class FakeSerperDevTool(CachedSearchTool):
+        def _run(self, **kwargs):
+            time.sleep(latency)
+            query = kwargs.get('search_query') or kwargs.get('query')
+            return "\n".join(f"Title: Result {i} for {query}\nLink: https://example.org/{i}\nSnippet: ..."
+                             for i in range(5))
+
+    return FakeSerperDevTool
+
+
+def _checkpointed_tasks(directory):
+    return sum(
+        name.endswith('.json')
+        for _, _, names in os.walk(os.path.join(directory, '.checkpoints'))
+        for name in names
+    )
+
+
+def run_child(crew, config, result_path):
+    """Run one crew script in this process against the fakes and write its measurements to ``result_path``."""
+    import importlib
+
+    from crew_worker import SCRIPTS, WARM_MODULES
+
+    os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+    os.environ.setdefault('SERPER_API_KEY', 'benchmark')
+    start = time.perf_counter()
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    import_seconds = time.perf_counter() - start
+
+    import httpx
+
+    import rate_limiter
+
+    fake = FakeGroq(config['latency'], config['jitter'], config['per_token'], config['completion_tokens'],
+                    config['failure_rate'], config['seed'])
+    limiter = rate_limiter.configure_limiters(config['rpm'], config['tpm'], base_delay=0.05)
+    retries = []
+    limiter.listeners.append(lambda: retries.append(1))
+
+    def rate_limited_client(limiter=None, **client_options):
+        transport = rate_limiter.RateLimitedTransport(limiter, httpx.MockTransport(fake))
+        return httpx.Client(transport=transport, **client_options)
+
+    argv = list(config['argv'].get(crew, []))
+    sys.argv = [SCRIPTS[crew]] + argv
+    with patch('rate_limiter.rate_limited_client', rate_limited_client), \
+            patch('crewai_tools.SerperDevTool', fake_search_tool(config['search_latency'])), \
+            open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        runpy.run_path(os.path.join(REPO_ROOT, SCRIPTS[crew]), run_name='__main__')
+        wall = time.perf_counter() - start
+
+    tasks = _checkpointed_tasks(os.getcwd())
+    result = {
+        'wall_seconds': wall,
+        'import_seconds': import_seconds,
+        'overhead_seconds': wall - fake.busy_seconds(),
+        'llm_requests': len(fake.intervals),
+        'retries': len(retries),
+        'tasks': tasks,
+        'tasks_per_second': tasks / wall,
+        'tokens_per_second': fake.tokens / wall,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    with open(result_path, 'w') as file:
+        json.dump(result, file)
+
+
+def run_crew(crew, config):
+    """Run ``crew`` in a fresh process and scratch directory; returns its measurements."""
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, 'result.json')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv('PYTHONPATH')])))
+        env['CREW_MAX_CONCURRENCY'] = str(config['max_concurrency'])
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.crews', '--child', crew, '--config', json.dumps(config),
+             '--result', result_path],
+            cwd=directory, env=env, check=True,
+        )
+        with open(result_path) as file:
+            return json.load(file)
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return commit + ('-dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+
+
+def previous_record(path, config, commit):
+    """Latest stored record with the same settings from a different commit."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    matching = [record for record in records if record['config'] == config and record['commit'] != commit]
+    return matching[-1] if matching else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crews against a fake Groq API')
+    parser.add_argument('--crews', nargs='+', default=['newsletter', 'eeg', 'neuroscience'],
+                        choices=['newsletter', 'eeg', 'neuroscience'])
+    parser.add_argument('--latency', type=float, default=0.3, help='base seconds per LLM request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='log-normal sigma of the request latency')
+    parser.add_argument('--per-token', type=float, default=0.0, help='extra seconds per completion token')
+    parser.add_argument('--completion-tokens', type=int, default=300, help='mean completion tokens per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests answered with 429/500')
+    parser.add_argument('--search-latency', type=float, default=0.1, help='seconds per web search')
+    parser.add_argument('--rpm', type=float, default=100000, help='requests-per-minute quota of the rate limiter')
+    parser.add_argument('--tpm', type=float, default=1e9, help='tokens-per-minute quota of the rate limiter')
+    parser.add_argument('--max-concurrency', type=int, default=4, help='CREW_MAX_CONCURRENCY for the crews')
+    parser.add_argument('--newsletter-topics', type=int, default=0, help='run the newsletter in batch mode over N topics')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per crew; the median is reported')
+    parser.add_argument('--results', default=RESULTS_PATH, help='JSON-lines file results are appended to')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.config), args.result)
+        return
+
+    topics = [arg for i in range(args.newsletter_topics) for arg in ('--topic', f"Benchmark topic {i}")]
+    config = {
+        'latency': args.latency, 'jitter': args.jitter, 'per_token': args.per_token,
+        'completion_tokens': args.completion_tokens, 'failure_rate': args.failure_rate,
+        'search_latency': args.search_latency, 'rpm': args.rpm, 'tpm': args.tpm,
+        'max_concurrency': args.max_concurrency, 'seed': args.seed, 'argv': {'newsletter': topics},
+    }
+    commit = git_revision()
+    previous = previous_record(args.results, config, commit)
+    results = {}
+    print(f"commit {commit}; " + ", ".join(f"{key}={value}" for key, value in config.items() if key != 'argv'))
+    print(f"{'crew':<14}" + "".join(f"{metric:>18}" for metric in METRICS))
+    for crew in args.crews:
+        runs = [run_crew(crew, config) for _ in range(args.repeat)]
+        results[crew] = {metric: median(run[metric] for run in runs) for metric in METRICS}
+        print(f"{crew:<14}" + "".join(f"{results[crew][metric]:>18,.2f}" for metric in METRICS))
+        if previous and crew in previous['results']:
+            before = previous['results'][crew]
+            deltas = "".join(
+                f"{(results[crew][metric] / before[metric] - 1) if before[metric] else 0.0:>+18.1%}"
+                for metric in METRICS
+            )
+            print(f"{'  vs ' + previous['commit']:<14}" + deltas)
+
+    if os.path.dirname(args.results):
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    with open(args.results, 'a') as file:
+        file.write(json.dumps({'commit': commit, 'time': time.time(), 'config': config, 'results': results}) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput benchmark for the EEG/MEG preprocessing engine on synthetic recordings.
+
+Run from the repository root:
+
+    python -m benchmarks.preprocessing --channels 256 --seconds 600 --sfreq 1000 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from eeg_preprocessing import DEFAULT_CHUNK_SIZE, Preprocessor
+
+
+def synthetic_recording(path, channels, samples, sfreq, chunk_size=DEFAULT_CHUNK_SIZE, seed=0):
+    """Write alpha rhythm + line noise + drift + white noise to a memory-mapped .npy file."""
+    rng = np.random.default_rng(seed)
+    data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(channels, samples))
+    gains = rng.uniform(0.5, 2.0, size=(channels, 1))
+    for start in range(0, samples, chunk_size):
+        t = np.arange(start, min(start + chunk_size, samples)) / sfreq
+        signal = np.sin(2 * np.pi * 10 * t) + 0.5 * np.sin(2 * np.pi * 50 * t) + 0.01 * t
+        data[:, start:start + len(t)] = gains * signal + rng.normal(0, 0.2, size=(channels, len(t)))
+    data.flush()
+    return np.load(path, mmap_mode='r')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the preprocessing engine')
+    parser.add_argument('--channels', type=int, default=256)
+    parser.add_argument('--seconds', type=float, default=300)
+    parser.add_argument('--sfreq', type=float, default=1000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    samples = int(args.seconds * args.sfreq)
+    with tempfile.TemporaryDirectory() as directory:
+        data = synthetic_recording(os.path.join(directory, 'raw.npy'), args.channels, samples, args.sfreq)
+        out = np.lib.format.open_memmap(
+            os.path.join(directory, 'clean.npy'), mode='w+', dtype=np.float32, shape=data.shape
+        )
+        print(f"{args.channels} channels x {samples} samples ({args.seconds:.0f} s at {args.sfreq:.0f} Hz)")
+        for workers in args.workers:
+            preprocessor = Preprocessor(args.sfreq, chunk_size=args.chunk_size, workers=workers)
+            start = time.perf_counter()
+            preprocessor.run(data, out)
+            elapsed = time.perf_counter() - start
+            rate = samples / elapsed
+            print(
+                f"workers={workers:<3} {elapsed:8.2f} s  {rate:12,.0f} samples/s  "
+                f"{rate / workers:12,.0f} samples/s/core  {rate * args.channels / workers:14,.0f} channel-samples/s/core"
+            )
+
+
+if __name__ == "__main__":
+    main()
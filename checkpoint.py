@@ -0,0 +1,60 @@
+import json
+import os
+import time
+import uuid
+
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', '.checkpoints')
+
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class CheckpointStore:
+    """
+    Outputs of the completed tasks of one run, as one JSON file per task under ``root/run_id``.
+
+    Each checkpoint records the task's description, the context it ran with and
+    its output. A checkpoint is only replayed for a task whose description still
+    matches, so editing a task invalidates its saved output.
+    """
+
+    def __init__(self, run_id=None, root=CHECKPOINT_DIR):
+        self.run_id = run_id or new_run_id()
+        self.directory = os.path.join(root, self.run_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def exists(cls, run_id, root=CHECKPOINT_DIR):
+        return os.path.isdir(os.path.join(root, run_id))
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def save(self, name, description, output, context=None):
+        record = {
+            'task': name,
+            'description': description,
+            'context': context,
+            'output': output,
+            'completed_at': time.time(),
+        }
+        path = self._path(name)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(record, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+    def load(self, name, description=None):
+        try:
+            with open(self._path(name)) as file:
+                record = json.load(file)
+        except FileNotFoundError:
+            return None
+        if description is not None and record['description'] != description:
+            return None
+        return record
+
+    def completed(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
@@ -0,0 +1,147 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# Tokens of upstream output a task may receive as context; llama3-8b-8192 has an 8192-token window
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[*])")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has have been were from this that "
+    "with they their them then than there these those which what when where who will would should could "
+    "into onto over under about after before such each other some more most also only very just its it's "
+    "your yours his she him how why may might must our ours ensure ensuring provide using use used".split()
+)
+OMISSION = "[...]"
+
+
+def count_tokens(text):
+    """Approximate token count (about four characters per token for English with Llama 3's tokenizer)."""
+    return (len(text) + 3) // 4
+
+
+def _terms(text):
+    return Counter(word for word in _WORD.findall(text.lower()) if len(word) > 2 and word not in _STOPWORDS)
+
+
+def relevance(query, text):
+    """Cosine similarity of the term-frequency vectors of ``query`` and ``text``, in [0, 1]."""
+    a, b = (query if isinstance(query, Counter) else _terms(query)), _terms(text)
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items())
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+
+def extract(text, query, budget, count=count_tokens):
+    """
+    Shorten ``text`` to about ``budget`` tokens by keeping its sentences most
+    relevant to ``query``, in their original order, with gaps marked ``[...]``.
+    Headings and the opening sentence are favoured, since they frame the rest.
+    """
+    if count(text) <= budget:
+        return text
+    query = _terms(query)
+    units = []
+    for line_number, line in enumerate(text.splitlines()):
+        for sentence in _SENTENCE_END.split(line.strip()):
+            if sentence:
+                units.append((line_number, sentence))
+    scores = []
+    for position, (_, sentence) in enumerate(units):
+        score = relevance(query, sentence)
+        if position == 0 or sentence.startswith('#'):
+            score += 1.0
+        scores.append(score + 0.1 / (1 + position))
+
+    kept, used = set(), count(OMISSION)
+    for position in sorted(range(len(units)), key=scores.__getitem__, reverse=True):
+        cost = count(units[position][1]) + 1
+        if used + cost <= budget:
+            kept.add(position)
+            used += cost
+
+    lines, previous_line, previous_position = [], None, -1
+    for position in sorted(kept):
+        line_number, sentence = units[position]
+        if position != previous_position + 1:
+            lines.append(OMISSION)
+            previous_line = None
+        if line_number == previous_line:
+            lines[-1] += ' ' + sentence
+        else:
+            lines.append(sentence)
+        previous_line, previous_position = line_number, position
+    if previous_position != len(units) - 1:
+        lines.append(OMISSION)
+    return "\n".join(lines)
+
+
+class ContextCompactor:
+    """
+    Keeps the context a task receives from its upstream tasks within ``budget`` tokens.
+
+    Context that already fits is passed through unchanged. Otherwise the budget
+    is shared between the upstream outputs in proportion to their relevance to
+    the task's description, with every output guaranteed a floor, and budget an
+    output does not need is passed on to the others. Outputs over their share
+    are shortened by extracting their most relevant sentences. No LLM calls are
+    made, so compaction costs microseconds rather than a round trip. Each
+    compaction calls every one of ``listeners`` with the token counts before and
+    after, and is recorded per task for ``summary()``.
+    """
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, count=count_tokens, floor=0.1):
+        self.budget = budget
+        self.count = count
+        self.floor = floor
+        self.records = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def allocate(self, description, outputs):
+        """Token allowance of each output in ``outputs`` (a dict of name to text)."""
+        needs = {name: self.count(text) for name, text in outputs.items()}
+        weights = {name: self.floor + relevance(description, text) for name, text in outputs.items()}
+        allowance, remaining, open_names = {}, self.budget, set(outputs)
+        while open_names:
+            total_weight = sum(weights[name] for name in open_names)
+            shares = {name: remaining * weights[name] / total_weight for name in open_names}
+            satisfied = {name for name in open_names if needs[name] <= shares[name]}
+            if not satisfied:
+                allowance.update({name: int(shares[name]) for name in open_names})
+                break
+            for name in satisfied:
+                allowance[name] = needs[name]
+                remaining -= needs[name]
+            open_names -= satisfied
+        return allowance
+
+    def compact(self, name, description, upstream):
+        """Context for task ``name`` from ``upstream`` (a dict of upstream task name to output)."""
+        context = "\n\n".join(upstream.values())
+        before = self.count(context)
+        if before > self.budget:
+            allowance = self.allocate(description, upstream)
+            context = "\n\n".join(
+                extract(text, description, allowance[upstream_name], self.count)
+                for upstream_name, text in upstream.items()
+            )
+        after = self.count(context)
+        with self._lock:
+            self.records[name] = (before, after)
+        for listener in self.listeners:
+            listener(before, after)
+        return context
+
+    def summary(self):
+        before = sum(record[0] for record in self.records.values())
+        after = sum(record[1] for record in self.records.values())
+        compacted = sum(1 for record in self.records.values() if record[1] < record[0])
+        saved = before - after
+        share = saved / before if before else 0.0
+        return (f"Context compaction: {compacted} of {len(self.records)} task contexts compacted, "
+                f"{before:,} -> {after:,} tokens ({saved:,} saved, {share:.0%})")
@@ -0,0 +1,213 @@
+import os
+import threading
+from collections import namedtuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+CREWS_PATH = os.getenv('CREWS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crews.toml'))
+AGENT_SETTINGS = ('verbose', 'memory', 'allow_delegation', 'max_iter')
+
+AgentSpec = namedtuple('AgentSpec', 'name role goal backstory tools settings')
+# ``after`` names the tasks whose outputs are the task's context
+TaskSpec = namedtuple('TaskSpec', 'name agent description expected_output after')
+
+
+class Crew:
+    """The crewai agents and tasks built from a CrewSpec, in spec order, with the tasks' dependencies."""
+
+    def __init__(self, spec, agents, tasks, dependencies):
+        self.spec = spec
+        self.agents = list(agents.values())
+        self.tasks = list(tasks.values())
+        self.dependencies = dependencies
+        self._agents = agents
+        self._tasks = tasks
+
+    def agent(self, name):
+        return self._agents[name]
+
+    def task(self, name):
+        return self._tasks[name]
+
+
+class CrewSpec:
+    """
+    The definition of one crew: a shared prompt prefix, agents and tasks.
+
+    A spec is plain data, cheap to build, copy and pickle, and turns into
+    crewai objects only when ``build`` (or ``build_agents`` and
+    ``build_tasks``) is called. Every agent is given a system template that
+    starts with the crew's prefix, so the prompts of all of its agents share
+    their first bytes and the serving side can cache them; only the agent's
+    role, goal and backstory and the task follow.
+    """
+
+    def __init__(self, name, prefix, agents, tasks):
+        if '{' in prefix or '}' in prefix:
+            raise ValueError(f"The prefix of crew {name} must not contain braces")
+        self.name = name
+        self.prefix = prefix
+        self.agents = tuple(agents)
+        self.tasks = tuple(tasks)
+        roles = {agent.name for agent in self.agents}
+        names = [task.name for task in self.tasks]
+        for index, task in enumerate(self.tasks):
+            if task.agent not in roles:
+                raise ValueError(f"Task {task.name} of crew {name} has no agent {task.agent}")
+            if any(dep not in names[:index] for dep in task.after):
+                raise ValueError(f"Task {task.name} of crew {name} must come after the tasks it depends on")
+
+    @classmethod
+    def from_dict(cls, name, data):
+        defaults = dict(data.get('defaults', {}))
+        default_tools = tuple(defaults.pop('tools', ()))
+        agents = []
+        for agent in data.get('agents', []):
+            settings = {**defaults, **{key: agent[key] for key in AGENT_SETTINGS if key in agent}}
+            agents.append(AgentSpec(agent['name'], agent['role'], agent['goal'], agent['backstory'],
+                                    tuple(agent.get('tools', default_tools)), settings))
+        tasks = []
+        for task in data.get('tasks', []):
+            after = task.get('after', ())
+            after = tuple(earlier.name for earlier in tasks) if after == '*' else tuple(after)
+            tasks.append(TaskSpec(task['name'], task['agent'], task['description'], task['expected_output'], after))
+        return cls(name, data.get('prefix', ''), agents, tasks)
+
+    def to_dict(self):
+        return {
+            'prefix': self.prefix,
+            'agents': [{'name': agent.name, 'role': agent.role, 'goal': agent.goal, 'backstory': agent.backstory,
+                        'tools': list(agent.tools), **agent.settings} for agent in self.agents],
+            'tasks': [{**task._asdict(), 'after': list(task.after)} for task in self.tasks],
+        }
+
+    @property
+    def system_template(self):
+        return f"{self.prefix}\n\n{{{{ .System }}}}" if self.prefix else "{{ .System }}"
+
+    def build_agents(self, tools=None, llm=None):
+        """
+        crewai agents by name. ``tools`` maps the tool names of the spec to
+        tools, or to None to leave a tool out; without an ``llm``, agents get
+        crewai's default.
+        """
+        from crewai import Agent
+
+        tools = tools or {}
+        agents = {}
+        for spec in self.agents:
+            missing = [name for name in spec.tools if name not in tools]
+            if missing:
+                raise KeyError(f"Agent {spec.name} of crew {self.name} needs tools {', '.join(missing)}")
+            options = {'llm': llm} if llm is not None else {}
+            agents[spec.name] = Agent(
+                role=spec.role,
+                goal=spec.goal,
+                backstory=spec.backstory,
+                tools=[tools[name] for name in spec.tools if tools[name] is not None],
+                system_template=self.system_template,
+                prompt_template="{{ .Prompt }}",
+                response_template="{{ .Response }}",
+                **spec.settings,
+                **options,
+            )
+        return agents
+
+    def build_tasks(self, agents, focus='', notes=None):
+        """
+        crewai tasks by name for ``agents`` (from ``build_agents``), and their
+        dependencies. ``focus`` is appended to every task's description, and
+        ``notes`` maps task names to text appended to that task's only.
+        """
+        from crewai import Task
+
+        notes = notes or {}
+        tasks = {
+            spec.name: Task(
+                description=spec.description + notes.get(spec.name, '') + focus,
+                expected_output=spec.expected_output,
+                agent=agents[spec.agent],
+            )
+            for spec in self.tasks
+        }
+        dependencies = [(tasks[spec.name], [tasks[dep] for dep in spec.after]) for spec in self.tasks if spec.after]
+        return tasks, dependencies
+
+    def build(self, tools=None, llm=None, focus='', notes=None):
+        """A Crew of new agents and tasks; see ``build_agents`` and ``build_tasks``."""
+        agents = self.build_agents(tools, llm)
+        tasks, dependencies = self.build_tasks(agents, focus, notes)
+        return Crew(self, agents, tasks, dependencies)
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def load_crews(path=CREWS_PATH):
+    """The CrewSpecs of the spec file at ``path`` by crew name, parsed once per version of the file."""
+    version = os.stat(path).st_mtime_ns
+    with _registry_lock:
+        cached = _registry.get(path)
+        if cached is None or cached[0] != version:
+            with open(path, 'rb') as file:
+                data = tomllib.load(file)
+            cached = _registry[path] = version, {name: CrewSpec.from_dict(name, crew) for name, crew in data.items()}
+        return cached[1]
+
+
+def crew_spec(name, path=CREWS_PATH):
+    return load_crews(path)[name]
+
+
+class PromptMeter(BaseCallbackHandler):
+    """
+    LangChain callback handler measuring the prompt bytes a shared prefix saves.
+
+    Attach it to the agents' LLMs. Every call's prompt is measured, and the
+    bytes of it that are the crew's prefix, which the serving side can cache
+    instead of processing again, are counted as saved.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.prefix_bytes = len(prefix.encode())
+        self.calls = 0
+        self.sent = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def attach(self, agents):
+        for agent in agents:
+            callbacks = list(agent.llm.callbacks or [])
+            if self not in callbacks:
+                agent.llm.callbacks = callbacks + [self]
+
+    def _measure(self, text):
+        size = len(text.encode())
+        with self._lock:
+            self.calls += 1
+            self.sent += size
+            if self.prefix and text.startswith(self.prefix):
+                self.saved += self.prefix_bytes
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        for prompt in prompts:
+            self._measure(prompt)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        for conversation in messages:
+            self._measure("".join(str(message.content) for message in conversation))
+
+    def summary(self):
+        if not self.calls:
+            return "Prompt prefix: no LLM calls"
+        return (
+            f"Prompt prefix: {self.calls} LLM calls, {self.sent / 1024:.1f} KiB of prompts, "
+            f"{self.saved / self.calls:.0f} B/call ({self.saved / max(self.sent, 1):.0%}) in the shared prefix"
+        )
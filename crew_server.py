@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import mimetypes
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from checkpoint import CheckpointStore, new_run_id
+from context_compaction import ContextCompactor
+from crew_worker import SCRIPTS, load_script
+from groq_client import DEFAULT_MODEL
+from model_router import ModelRouter, model_limiter
+from rate_limiter import rate_limited_client
+from response_cache import LangChainResponseCache, ResponseCache
+
+SERVER_PORT = int(os.getenv('CREW_SERVER_PORT', '8765'))
+JOBS_DIR = os.getenv('CREW_JOBS_DIR', 'jobs')
+# Crews running at once, and jobs waiting beyond those before submissions are turned away
+MAX_RUNNING = int(os.getenv('CREW_MAX_RUNNING', '8'))
+MAX_QUEUED = int(os.getenv('CREW_MAX_QUEUED', '64'))
+MAX_BODY = 1 << 20
+
+_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+# Types a job param may take; they are passed to the crew as they are and saved in job.json
+_PARAM_TYPES = (str, int, float, bool, type(None))
+
+
+@dataclass
+class Job:
+    """A crew run requested over the API. ``output`` is the path of its result once done."""
+    id: str
+    crew: str
+    params: dict = field(default_factory=dict)
+    priority: int = 0
+    status: str = 'queued'  # queued, running, done, failed or cancelled
+    submitted: float = 0.0
+    started: float = None
+    finished: float = None
+    output: str = None
+    error: str = None
+
+
+class ClientPool:
+    """
+    LLM clients shared by every job: per model, one rate-limited connection
+    pool, and one response cache for all of them, all with ``api_key``. ``llm`` is the home LLM
+    every job's agents start from; ``build_llm`` makes the per-model LLMs a
+    ModelRouter routes tasks to, on the same connections.
+    """
+
+    def __init__(self, response_cache, api_key):
+        self.response_cache = response_cache
+        self.api_key = api_key
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.llm = self.build_llm(DEFAULT_MODEL)
+
+    def http_client(self, model):
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = rate_limited_client(model_limiter(model))
+            return self._clients[model]
+
+    def build_llm(self, model):
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(
+            temperature=0,
+            groq_api_key=self.api_key,
+            model_name=model,
+            cache=LangChainResponseCache(self.response_cache),
+            http_client=self.http_client(model),
+            max_retries=0,
+        )
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class CrewServer:
+    """
+    Long-running asyncio service running crew jobs submitted over a local HTTP API.
+
+    ``POST /jobs`` with ``{"crew": "newsletter" | "eeg" | "neuroscience",
+    "params": {...}, "priority": 0}`` queues a job and answers 202 with its
+    id. Jobs start in priority order (higher first, then by submission),
+    ``max_running`` at a time; each crew runs in a worker thread, so the event
+    loop stays free to take requests. At most ``max_queued`` jobs wait: past
+    that a submission gets a 503 with a ``Retry-After`` estimated from recent
+    job durations, so clients back off instead of piling up work. Jobs share
+    one pool of LLM clients, rate limiters, response cache and ModelRouter,
+    and the tools each crew script defines, but get fresh agents and tasks,
+    their own context compactor and checkpoints under their id, and write
+    their outputs into ``jobs_dir/<id>/``, so concurrent jobs never share a
+    path. ``GET /jobs/<id>`` reports a job, ``GET /jobs/<id>/output`` returns
+    its result, ``DELETE /jobs/<id>`` cancels it while it is queued, and
+    ``GET /stats`` summarizes the server. Each job's state is kept in
+    ``jobs_dir/<id>/job.json``; on start, jobs left queued or running by a
+    previous server are queued again and resume from their checkpoints.
+
+    A crew script serves jobs by defining ``run_job(params, output_dir, llm,
+    checkpoint, tracer, compactor, router)``, returning the path of its result,
+    and ``JOB_PARAMS``, the names of the params it accepts; a submission with
+    any other param is rejected.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_running=MAX_RUNNING, max_queued=MAX_QUEUED, crews=tuple(SCRIPTS)):
+        self.jobs_dir = jobs_dir
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.crews = list(crews)
+        self.modules = {}
+        self.jobs = {}
+        self.durations = []
+        self._sequence = itertools.count()
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='crew-job')
+        self._save_lock = threading.Lock()
+        # Taken before any crew script is loaded, so a script's placeholder keys cannot replace it
+        self.api_key = os.getenv('GROQ_API_KEY')
+
+    def start_services(self):
+        """Load the crews and build the shared clients; slow, so done once, before serving."""
+        for crew in self.crews:
+            self.modules[crew] = load_script(crew)
+        self.pool = ClientPool(ResponseCache(), self.api_key)
+        self.router = ModelRouter(self.pool.build_llm)
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save(self, job):
+        path = os.path.join(self.job_dir(job.id), 'job.json')
+        with self._save_lock:
+            with open(path + '.tmp', 'w') as file:
+                json.dump(asdict(job), file)
+            os.replace(path + '.tmp', path)
+
+    def _enqueue(self, job):
+        self._queue.put_nowait((-job.priority, next(self._sequence), job.id))
+
+    def queued(self):
+        return sum(1 for job in self.jobs.values() if job.status == 'queued')
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up, from the durations of recent jobs."""
+        recent = self.durations[-20:]
+        mean = sum(recent) / len(recent) if recent else 60.0
+        return max(1, int(mean * (self.queued() - self.max_queued + 1) / self.max_running))
+
+    def submit(self, crew, params=None, priority=0):
+        if not isinstance(crew, str) or crew not in self.modules:
+            raise _HTTPError(400, f"Unknown crew {crew!r}; this server runs {', '.join(self.modules)}")
+        if not isinstance(params or {}, dict) or not isinstance(priority, int) or isinstance(priority, bool):
+            raise _HTTPError(400, "params must be an object and priority an integer")
+        invalid = sorted(name for name, value in (params or {}).items() if not isinstance(value, _PARAM_TYPES))
+        if invalid:
+            raise _HTTPError(400, f"Params {', '.join(invalid)} must be strings, numbers, booleans or null")
+        accepted = self.modules[crew].JOB_PARAMS
+        unknown = sorted(set(params or {}) - set(accepted))
+        if unknown:
+            raise _HTTPError(400, f"Unknown params {', '.join(unknown)} for crew {crew}; "
+                                  f"it accepts {', '.join(accepted)}")
+        if self.queued() >= self.max_queued:
+            raise _HTTPError(503, f"{self.queued()} jobs are already queued; retry later",
+                             {'Retry-After': str(self.retry_after())})
+        job = Job(new_run_id(), crew, params or {}, priority, submitted=time.time())
+        os.makedirs(self.job_dir(job.id))
+        self.jobs[job.id] = job
+        self._save(job)
+        self._enqueue(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self._job(job_id)
+        if job.status != 'queued':
+            raise _HTTPError(409, f"Job {job_id} is {job.status}; only queued jobs can be cancelled")
+        job.status = 'cancelled'
+        job.finished = time.time()
+        self._save(job)
+        return job
+
+    def _job(self, job_id):
+        if job_id not in self.jobs:
+            raise _HTTPError(404, f"No job {job_id}")
+        return self.jobs[job_id]
+
+    def recover(self):
+        """Load the jobs of earlier servers from ``jobs_dir``, queueing again those that never finished."""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            try:
+                with open(os.path.join(self.job_dir(job_id), 'job.json')) as file:
+                    job = Job(**json.load(file))
+            except (OSError, ValueError, TypeError):
+                continue
+            self.jobs[job.id] = job
+            if job.status in ('queued', 'running') and job.crew in self.modules:
+                job.status, job.started = 'queued', None
+                self._save(job)
+                self._enqueue(job)
+
+    def _run(self, job):
+        module = self.modules[job.crew]
+        return module.run_job(job.params, self.job_dir(job.id), self.pool.llm, CheckpointStore(job.id),
+                              None, ContextCompactor(), self.router)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs[job_id]
+            if job.status != 'queued':
+                continue
+            job.status, job.started = 'running', time.time()
+            self._save(job)
+            try:
+                job.output = await loop.run_in_executor(self._executor, contextvars.copy_context().run,
+                                                        self._run, job)
+                job.status = 'done'
+            except Exception as exc:
+                job.status = 'failed'
+                job.error = f"{type(exc).__name__}: {exc}"
+                with open(os.path.join(self.job_dir(job.id), 'error.log'), 'w') as file:
+                    file.write(traceback.format_exc())
+            job.finished = time.time()
+            self.durations = self.durations[-99:] + [job.finished - job.started]
+            self._save(job)
+            print(f"Job {job.id} ({job.crew}) {job.status} in {job.finished - job.started:.1f} s")
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        recent = self.durations[-20:]
+        return {
+            'jobs': counts,
+            'max_running': self.max_running,
+            'max_queued': self.max_queued,
+            'mean_job_seconds': sum(recent) / len(recent) if recent else None,
+            'routes': self.router.summary().splitlines()[1:],
+        }
+
+    def route(self, method, path, body):
+        """Status and JSON payload answering ``method`` on ``path``, or a str: the path of a file to send."""
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                raise _HTTPError(400, "Body must be JSON")
+            if not isinstance(request, dict):
+                raise _HTTPError(400, "Body must be a JSON object")
+            job = self.submit(request.get('crew'), request.get('params'), request.get('priority', 0))
+            return 202, {**asdict(job), 'position': self.queued()}
+        if parts == ['jobs'] and method == 'GET':
+            return 200, [asdict(job) for job in sorted(self.jobs.values(), key=lambda job: job.submitted)]
+        if len(parts) == 2 and parts[0] == 'jobs' and method == 'GET':
+            return 200, asdict(self._job(parts[1]))
+        if len(parts) == 2 and parts[0] == 'jobs' and method == 'DELETE':
+            return 200, asdict(self.cancel(parts[1]))
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'output' and method == 'GET':
+            job = self._job(parts[1])
+            if job.status != 'done':
+                raise _HTTPError(409, f"Job {job.id} is {job.status}")
+            if not job.output or not os.path.isfile(job.output):
+                raise _HTTPError(404, f"The output of job {job.id} is no longer on disk")
+            return 200, job.output
+        if parts == ['stats'] and method == 'GET':
+            return 200, self.stats()
+        if parts and parts[0] in ('jobs', 'stats'):
+            raise _HTTPError(405, f"{method} is not supported on {path}")
+        raise _HTTPError(404, f"No route {path}")
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, path, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise _HTTPError(400, "Malformed request line")
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY:
+            raise _HTTPError(413, f"Request bodies are limited to {MAX_BODY} bytes")
+        return method.upper(), path, await reader.readexactly(length) if length else b''
+
+    async def handle(self, reader, writer):
+        headers = {}
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                writer.close()
+                return
+            method, path, body = request
+            status, payload = self.route(method, path, body)
+            if isinstance(payload, str):
+                try:
+                    with open(payload, 'rb') as file:
+                        content = await asyncio.to_thread(file.read)
+                except FileNotFoundError:
+                    raise _HTTPError(404, f"{os.path.basename(payload)} is no longer on disk")
+                content_type = mimetypes.guess_type(payload)[0] or 'application/octet-stream'
+            else:
+                content, content_type = json.dumps(payload).encode(), 'application/json'
+        except _HTTPError as exc:
+            status, headers = exc.status, exc.headers
+            content, content_type = json.dumps({'error': str(exc)}).encode(), 'application/json'
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as exc:
+            traceback.print_exc()
+            status, headers = 500, {}
+            content = json.dumps({'error': f"{type(exc).__name__}: {exc}"}).encode()
+            content_type = 'application/json'
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(content)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + content)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def serve(self, host='127.0.0.1', port=SERVER_PORT):
+        self._queue = asyncio.PriorityQueue()
+        await asyncio.to_thread(self.start_services)
+        server = await asyncio.start_server(self.handle, host, port)
+        self.recover()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.max_running)]
+        address = server.sockets[0].getsockname()
+        print(f"Crew server running {', '.join(self.crews)} on http://{address[0]}:{address[1]}, "
+              f"{self.max_running} jobs at a time, writing to {self.jobs_dir}/")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP service running crew jobs from a prioritized queue')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='port to listen on')
+    parser.add_argument('--jobs-dir', default=JOBS_DIR, help='directory of the per-job outputs')
+    parser.add_argument('--crews', nargs='+', choices=SCRIPTS, default=list(SCRIPTS), help='crews to serve')
+    parser.add_argument('--max-running', type=int, default=MAX_RUNNING, help='jobs run at the same time')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED,
+                        help='jobs allowed to wait before submissions are refused')
+    args = parser.parse_args()
+
+    server = CrewServer(args.jobs_dir, args.max_running, args.max_queued, args.crews)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
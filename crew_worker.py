@@ -0,0 +1,196 @@
+import argparse
+import importlib
+import importlib.util
+import io
+import json
+import os
+import runpy
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+WORKER_SOCKET = os.getenv('CREW_WORKER_SOCKET', '.cache/crew-worker.sock')
+SCRIPTS = {
+    'newsletter': 'groq-agent.py',
+    'eeg': 'groq-eeg-agent.py',
+    'neuroscience': 'groq-neuroscience.py',
+}
+# Dependencies too slow to import per job; the scripts import them lazily, the worker up front
+WARM_MODULES = ('numpy', 'httpx', 'langchain_core', 'crewai', 'crewai_tools', 'langchain_groq', 'groq')
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Exit status telling the client to run the job itself
+EX_TEMPFAIL = 75
+
+
+def load_script(crew):
+    """
+    Import one of the crew scripts (their file names are not valid module
+    names) without running ``main()``; ``crew`` is a name in SCRIPTS or the
+    path of a script.
+    """
+    if crew in SCRIPTS:
+        name, path = crew, os.path.join(SCRIPT_DIR, SCRIPTS[crew])
+    else:
+        name, path = os.path.splitext(os.path.basename(crew))[0].replace('-', '_'), crew
+    spec = importlib.util.spec_from_file_location(f"crew_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _JobStream(io.TextIOBase):
+    """Text stream forwarding writes to the client as ``{"<name>": text}`` JSON lines."""
+
+    def __init__(self, file, name):
+        self.file = file
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.file.write((json.dumps({self.name: text}) + '\n').encode('utf-8'))
+            self.file.flush()
+        return len(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+class CrewWorker:
+    """
+    Long-lived process that keeps the crews' dependencies imported and their
+    scripts loaded, and runs jobs sent to it over a Unix socket.
+
+    Each job runs in a child forked from the warm worker, so it starts with
+    crewai and the LLM clients already imported, and costs a fork instead of
+    a cold interpreter start.
+    Jobs stay isolated from each other and from the worker, since whatever a
+    job mutates dies with its child. Module-level paths of the scripts (caches,
+    exports) resolve against the worker's working directory, so the worker only
+    accepts jobs submitted from that directory.
+    """
+
+    def __init__(self, socket_path=WORKER_SOCKET, crews=tuple(SCRIPTS), max_jobs=8):
+        self.socket_path = socket_path
+        self.crews = list(crews)
+        self.max_jobs = max_jobs
+        self.modules = {}
+
+    def warm(self):
+        for name in WARM_MODULES:
+            importlib.import_module(name)
+        for crew in self.crews:
+            self.modules[crew] = load_script(crew)
+
+    def serve_forever(self):
+        self.warm()
+        if os.path.dirname(self.socket_path):
+            os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = _WorkerServer(self.socket_path, _JobHandler)
+        server.worker = self
+        server.max_children = self.max_jobs
+        os.chmod(self.socket_path, 0o600)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"Crew worker serving {', '.join(self.crews)} on {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(self.socket_path)
+
+    def run_job(self, job, file):
+        """Run ``job`` (``{"crew", "argv", "cwd"}``) in this process, streaming its output into ``file``."""
+        stdout, stderr = _JobStream(file, 'stdout'), _JobStream(file, 'stderr')
+        if os.path.realpath(job.get('cwd') or '') != os.path.realpath(os.getcwd()):
+            stderr.write(f"Crew worker serves {os.getcwd()}, not {job.get('cwd')}\n")
+            code = EX_TEMPFAIL
+        elif job.get('crew') not in self.modules:
+            stderr.write(f"Crew worker has no crew {job.get('crew')!r}; it serves {', '.join(self.modules)}\n")
+            code = EX_TEMPFAIL
+        else:
+            sys.argv = [SCRIPTS[job['crew']]] + list(job.get('argv', []))
+            sys.stdout, sys.stderr = stdout, stderr
+            try:
+                self.modules[job['crew']].main()
+                code = 0
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        file.write((json.dumps({'exit': code}) + '\n').encode('utf-8'))
+        file.flush()
+
+
+class _WorkerServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        job = json.loads(self.rfile.readline())
+        self.server.worker.run_job(job, self.wfile)
+
+
+def submit(crew, argv=(), socket_path=WORKER_SOCKET):
+    """
+    Run a job on the worker, copying its output to this process's stdout and
+    stderr as it arrives, and return its exit status. Raises OSError when no
+    worker is listening.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        job = {'crew': crew, 'argv': list(argv), 'cwd': os.getcwd()}
+        connection.sendall((json.dumps(job) + '\n').encode('utf-8'))
+        for line in connection.makefile('rb'):
+            message = json.loads(line)
+            if 'exit' in message:
+                return message['exit']
+            for name, text in message.items():
+                stream = sys.stdout if name == 'stdout' else sys.stderr
+                stream.write(text)
+                stream.flush()
+    raise ConnectionError("Crew worker closed the connection before the job finished")
+
+
+def run_locally(crew, argv=()):
+    sys.argv = [SCRIPTS[crew]] + list(argv)
+    runpy.run_path(os.path.join(SCRIPT_DIR, SCRIPTS[crew]), run_name='__main__')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm worker process for the crew scripts')
+    parser.add_argument('--socket', default=WORKER_SOCKET, help='Unix socket the worker listens on')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='start a worker')
+    serve.add_argument('--crews', nargs='+', choices=SCRIPTS, default=list(SCRIPTS), help='crews to keep loaded')
+    serve.add_argument('--max-jobs', type=int, default=8, help='jobs run at the same time')
+    run = commands.add_parser('run', help='run a crew on the worker, or in this process if none is running')
+    run.add_argument('crew', choices=SCRIPTS)
+    run.add_argument('argv', nargs=argparse.REMAINDER, help='arguments for the crew script')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        CrewWorker(args.socket, args.crews, args.max_jobs).serve_forever()
+        return
+
+    try:
+        code = submit(args.crew, args.argv, args.socket)
+    except OSError:
+        code = EX_TEMPFAIL
+    if code == EX_TEMPFAIL:
+        run_locally(args.crew, args.argv)
+        code = 0
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
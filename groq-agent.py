@@ -1,7 +1,155 @@
-import pandas as pd
+import argparse
 import os
-from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
+import queue
+import re
+import time
+from checkpoint import CheckpointStore
+from context_compaction import ContextCompactor
+from pipeline import ChunkPipeline
+from task_graph import MAX_CONCURRENCY, TaskGraph, run_crew_tasks
+
+
+NEWSLETTER_PATH = 'weekly_ai_newsletter.md'
+# Params a crew server job may give run_job
+JOB_PARAMS = ('topic',)
+
+
+def build_llm(response_cache, model='llama3-8b-8192', streaming=False, callbacks=None):
+    """ChatGroq client backed by the on-disk response cache and the rate limiter of its model."""
+    from langchain_groq import ChatGroq
+    from model_router import model_limiter
+    from rate_limiter import rate_limited_client
+    from response_cache import LangChainResponseCache
+
+    return ChatGroq(
+            temperature=0, 
+            groq_api_key=os.getenv('GROQ_API_KEY'), 
+            model_name=model,
+            cache=LangChainResponseCache(response_cache),
+            http_client=rate_limited_client(model_limiter(model)),
+            max_retries=0,
+            streaming=streaming,
+            callbacks=callbacks,
+        )
+
+
+def build_agents(llm):
+    """The four newsletter agents of crews.toml, in the order their tasks run."""
+    from crew_registry import crew_spec
+
+    return list(crew_spec('newsletter').build_agents(llm=llm).values())
+
+
+def build_tasks(agents, topic=None):
+    """
+    The newsletter tasks for one set of agents, in order, and their
+    dependencies: each task reads the previous one's output, except the
+    compiler, which needs both the summaries and the analysis. With a
+    ``topic`` (a theme such as "AI in healthcare" or a date range such as
+    "2024-05-06 to 2024-05-12"), every task is focused on it.
+    """
+    from crew_registry import crew_spec
+
+    spec = crew_spec('newsletter')
+    focus = f"\n\nFocus this newsletter on: {topic}" if topic else ""
+    tasks, dependencies = spec.build_tasks(dict(zip((agent.name for agent in spec.agents), agents)), focus)
+    return list(tasks.values()), dependencies
+
+
+def run_newsletter(agents, topic=None, checkpoint=None, tracer=None, compactor=None, pipeline=None, router=None):
+    """
+    Run the newsletter tasks in order, each one receiving the outputs it builds on, and return the newsletter.
+
+    With ``pipeline``, a TokenStream attached to the agents, the tasks instead
+    run as overlapping stages of a ChunkPipeline over the collected news.
+    With a ModelRouter, each task runs on the model it routes the task to.
+    """
+    tasks, dependencies = build_tasks(agents, topic)
+    if tracer is not None:
+        tracer.instrument(agents, tasks)
+    if pipeline is not None:
+        return ChunkPipeline(tasks, dependencies, pipeline, checkpoint, tracer, compactor,
+                             router=router).run()
+    outputs = run_crew_tasks(
+        tasks, dependencies, max_concurrency=1, checkpoint=checkpoint, tracer=tracer,
+        compactor=compactor, router=router,
+    )
+    return outputs[-1]
+
+
+def slugify(topic):
+    return re.sub(r'[^a-z0-9]+', '_', topic.lower()).strip('_')[:60] or 'newsletter'
+
+
+def run_batch(topics, llm, output_dir, max_concurrency=MAX_CONCURRENCY, checkpoint=None, tracer=None,
+              compactor=None, router=None):
+    """
+    Write one newsletter per topic into ``output_dir``, plus an ``index.md`` summarising the batch.
+
+    Up to ``max_concurrency`` newsletters are written at once. Agents keep
+    per-run state, so each concurrent newsletter borrows its own set of agents
+    from a pool built once up front, all sharing ``llm``. A failing topic is
+    recorded in the index without stopping the others. Returns one record per
+    topic, in input order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(min(max_concurrency, len(topics)), 1)
+    agent_sets = queue.Queue()
+    for _ in range(workers):
+        agent_sets.put(build_agents(llm))
+
+    def newsletter_job(index, topic):
+        name = f"{index:02d}_{slugify(topic)}"
+        path = os.path.join(output_dir, f"{name}.md")
+        item_checkpoint = CheckpointStore(os.path.join(checkpoint.run_id, name)) if checkpoint else None
+
+        def run(upstream):
+            agents = agent_sets.get()
+            start = time.time()
+            try:
+                result = run_newsletter(agents, topic, item_checkpoint, tracer, compactor, router=router)
+                with open(path, 'w') as file:
+                    file.write(result)
+                error = None
+            except Exception as exc:
+                error = repr(exc)
+            finally:
+                agent_sets.put(agents)
+            return {'topic': topic, 'path': path, 'seconds': time.time() - start, 'error': error}
+        return name, run
+
+    graph = TaskGraph()
+    names = []
+    for index, topic in enumerate(topics):
+        name, run = newsletter_job(index, topic)
+        graph.add(name, run)
+        names.append(name)
+    results = graph.run(max_concurrency=workers)
+    records = [results[name] for name in names]
+
+    lines = ['# Newsletter batch', '', '| # | Topic | Newsletter | Status | Seconds |', '|---|---|---|---|---|']
+    for index, record in enumerate(records):
+        status = f"failed: {record['error']}" if record['error'] else 'ok'
+        link = f"[{os.path.basename(record['path'])}]({os.path.basename(record['path'])})" if not record['error'] else ''
+        lines.append(f"| {index} | {record['topic']} | {link} | {status} | {record['seconds']:.1f} |")
+    with open(os.path.join(output_dir, 'index.md'), 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    return records
+
+
+def run_job(params, output_dir, llm, checkpoint=None, tracer=None, compactor=None, router=None):
+    """Crew server job: write the newsletter on ``params['topic']``, if given, into ``output_dir`` and return its path."""
+    result = run_newsletter(build_agents(llm), params.get('topic'), checkpoint, tracer, compactor, router=router)
+    path = os.path.join(output_dir, NEWSLETTER_PATH)
+    with open(path, 'w') as file:
+        file.write(result)
+    return path
+
+
+def read_topics(path):
+    """Topics from a file, one per line; blank lines and lines starting with ``#`` are ignored."""
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith('#')]
 
 
 def main():
@@ -14,25 +162,75 @@ def main():
     and writes them to a markdown file.
 
     Steps:
-    1. Initialize the ChatGroq API with the specified model and API key.
+    1. Initialize the ChatGroq API with the specified model and API key, backed by the on-disk response cache.
     2. Display introductory text about the AI Newsletter Assistant.
-    3. Create and configure four AI agents:
+    3. Create and configure four AI agents from their definitions in crews.toml:
         - News_Collector_Agent: Gathers the latest AI news.
         - News_Summarizer_Agent: Summarizes the collected news.
         - Analysis_Agent: Provides analysis and insights on the news.
         - Newsletter_Compiler_Agent: Compiles the summaries and analysis into a newsletter format.
-    4. Define tasks for the agents to perform.
-    5. Create a Crew instance with the agents and tasks, and run the tasks.
-    6. Print the results and write them to an output markdown file.
+    4. Define tasks for the agents to perform, also from crews.toml.
+    5. Run the tasks in order, checkpointing each one so that an interrupted run
+       can be resumed with --resume <run-id>, and keeping the context passed
+       between tasks within a token budget.
+    6. Print the results and write them to an output markdown file, with a latency and
+       token trace of the run (JSONL and Chrome trace-event format) next to it.
+
+    With --topic (repeatable) or --batch <file>, one newsletter is compiled per
+    topic or date range instead, several at a time, into --output-dir together
+    with an index.md summarising the batch.
+
+    With --stream, tokens are printed and written into the markdown file as
+    they are generated; with --sse-port they are also served as Server-Sent
+    Events on http://127.0.0.1:<port>/events.
+
+    With --pipeline, each news item is summarized and analyzed as soon as it
+    has been collected, and the compiler merges its per-item drafts at the
+    end, so the stages overlap instead of running one after the other.
+
+    Each task runs on the model a ModelRouter picks for it: the small model
+    for light tasks, a larger one for analysis and long outputs, another when
+    one is saturated, with the latency and cost of every route logged to
+    .cache/routes.jsonl. --no-routing runs every task on llama3-8b-8192.
     """
 
-    model = 'llama3-8b-8192'
+    parser = argparse.ArgumentParser(description='CrewAI AI Newsletter Assistant')
+    parser.add_argument('--resume', metavar='RUN_ID', help='resume an interrupted run, replaying its completed tasks')
+    parser.add_argument('--topic', action='append', default=[], help='compile a newsletter on this topic or date range')
+    parser.add_argument('--batch', metavar='FILE', help='file with one topic or date range per line')
+    parser.add_argument('--output-dir', default='newsletters', help='directory for batch newsletters and index.md')
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY,
+                        help='number of batch newsletters compiled at once')
+    parser.add_argument('--stream', action='store_true', help='print and write the newsletter as it is generated')
+    parser.add_argument('--sse-port', type=int, help='also serve the token stream as Server-Sent Events on this port')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='overlap the stages, passing news on item by item as it is collected')
+    parser.add_argument('--no-routing', action='store_true', help='run every task on the default model')
+    args = parser.parse_args()
+    streaming = args.stream or args.sse_port is not None
+    if (streaming or args.pipeline) and (args.topic or args.batch):
+        parser.error("--stream, --sse-port and --pipeline compile a single newsletter, not a batch")
 
-    llm = ChatGroq(
-            temperature=0, 
-            groq_api_key=os.getenv('GROQ_API_KEY'), 
-            model_name=model
-        )
+    if args.resume and not CheckpointStore.exists(args.resume):
+        parser.error(f"no checkpoints found for run {args.resume}")
+    checkpoint = CheckpointStore(args.resume)
+    print(f"Run id: {checkpoint.run_id}")
+
+    # Heavy dependencies are imported only once the arguments are known to be valid
+    from crew_registry import PromptMeter, crew_spec
+    from model_router import ModelRouter
+    from rate_limiter import default_limiter
+    from response_cache import ResponseCache
+    from streaming import MarkdownStream, TokenStream, print_tokens, serve_events
+    from tracing import Tracer
+
+    response_cache = ResponseCache()
+    # Counts the prompt bytes the agents' shared prefix saves, on every model the tasks are routed to
+    prompt_meter = PromptMeter(crew_spec('newsletter').prefix)
+    llm = build_llm(response_cache, streaming=streaming or args.pipeline, callbacks=[prompt_meter])
+    router = None
+    if not args.no_routing:
+        router = ModelRouter(lambda model: build_llm(response_cache, model, streaming or args.pipeline))
 
     print('CrewAI AI Newsletter Assistant')
     multiline_text = """
@@ -43,88 +241,61 @@ def main():
 
     print(multiline_text)
 
-    News_Collector_Agent = Agent(
-        role='News_Collector_Agent',
-        goal="""Gather the latest AI news from various sources, ensuring coverage of major events, 
-                breakthroughs, and noteworthy research.""",
-        backstory="""You are an expert in tracking down the latest and most relevant AI news. 
-                Your goal is to collect up-to-date information on AI developments from reliable sources.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    News_Summarizer_Agent = Agent(
-        role='News_Summarizer_Agent',
-        goal="""Summarize the collected AI news, highlighting the key points and main takeaways.""",
-        backstory="""You specialize in distilling large amounts of information into concise and readable summaries. 
-                Your task is to make the news accessible and understandable for the newsletter readers.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    Analysis_Agent = Agent(
-        role='Analysis_Agent',
-        goal="""Provide analysis and insights on the summarized news, offering context and expert opinions.""",
-        backstory="""As an expert in AI, you provide in-depth analysis and context to help readers understand 
-                the significance of the news and its potential impact on the field.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    Newsletter_Compiler_Agent = Agent(
-        role='Newsletter_Compiler_Agent',
-        goal="""Compile the summaries and analysis into a well-structured newsletter format, ready for publication.""",
-        backstory="""You are skilled in creating engaging and visually appealing newsletters. 
-                Your goal is to ensure the final product is both informative and enjoyable to read.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    # Define the tasks for each agent
-    task_collect_news = Task(
-        description="""Collect the latest AI news from various sources, ensuring comprehensive coverage 
-            of major events, breakthroughs, and noteworthy research.""",
-        agent=News_Collector_Agent,
-        expected_output="A list of the latest AI news articles with source links."
-    )
-
-    task_summarize_news = Task(
-        description="""Summarize the collected AI news, highlighting the key points and main takeaways.""",
-        agent=News_Summarizer_Agent,
-        expected_output="A summarized list of the latest AI news articles."
-    )
-
-    task_analyze_news = Task(
-        description="""Provide analysis and insights on the summarized news, offering context and expert opinions.""",
-        agent=Analysis_Agent,
-        expected_output="An analysis of the summarized AI news articles with context and insights."
-    )
-
-    task_compile_newsletter = Task(
-        description="""Compile the summaries and analysis into a well-structured newsletter format, ready for publication.""",
-        agent=Newsletter_Compiler_Agent,
-        expected_output="A compiled AI newsletter with news summaries and analysis."
-    )
+    tracer = Tracer()
+    tracer.watch_cache(response_cache, 'llm_cache')
+    tracer.watch_retries(default_limiter())
+    compactor = ContextCompactor()
+    tracer.watch_context(compactor)
 
-    # Create a crew with the agents and tasks
-    crew = Crew(
-        agents=[News_Collector_Agent, News_Summarizer_Agent, Analysis_Agent, Newsletter_Compiler_Agent],
-        tasks=[task_collect_news, task_summarize_news, task_analyze_news, task_compile_newsletter],
-        verbose=False
-    )
+    topics = args.topic + (read_topics(args.batch) if args.batch else [])
+    if topics:
+        records = run_batch(topics, llm, args.output_dir, args.max_concurrency, checkpoint, tracer, compactor,
+                            router)
+        failed = [record for record in records if record['error']]
+        print(f"\n\nWrote {len(records) - len(failed)} newsletters to {args.output_dir} "
+              f"({len(failed)} failed), indexed in {os.path.join(args.output_dir, 'index.md')}")
+        output_path = os.path.join(args.output_dir, 'index.md')
+    elif streaming:
+        agents = build_agents(llm)
+        stream = TokenStream()
+        stream.attach(agents)
+        pipeline = stream if args.pipeline else None
+        stream.subscribe(MarkdownStream(NEWSLETTER_PATH))
+        if args.stream:
+            stream.subscribe(print_tokens)
+        if args.sse_port is not None:
+            serve_events(stream, args.sse_port)
+            print(f"Streaming tokens to http://127.0.0.1:{args.sse_port}/events")
+        # The subscribers do the work; MarkdownStream writes the finished newsletter
+        for _ in stream.events(lambda: run_newsletter(agents, checkpoint=checkpoint, tracer=tracer, compactor=compactor,
+                                                      pipeline=pipeline, router=router)):
+            pass
+        print(f'\n\nThese results have been exported to {NEWSLETTER_PATH}')
+        output_path = NEWSLETTER_PATH
+    else:
+        agents = build_agents(llm)
+        pipeline = None
+        if args.pipeline:
+            pipeline = TokenStream()
+            pipeline.attach(agents)
+        result = run_newsletter(agents, checkpoint=checkpoint, tracer=tracer, compactor=compactor, pipeline=pipeline,
+                                router=router)
 
-    # Run the tasks
-    result = crew.kickoff()
+        # Print the results and write them to an output markdown file
+        print(result)
+        with open(NEWSLETTER_PATH, "w") as file:
+            print(f'\n\nThese results have been exported to {NEWSLETTER_PATH}')
+            file.write(result)
+        output_path = NEWSLETTER_PATH
+    print(response_cache.summary())
+    print(compactor.summary())
+    print(prompt_meter.summary())
+    if router is not None:
+        print(router.summary())
 
-    # Print the results and write them to an output markdown file
-    print(result)
-    with open('weekly_ai_newsletter.md', "w") as file:
-        print('\n\nThese results have been exported to weekly_ai_newsletter.md')
-        file.write(result)
+    trace_paths = tracer.write(output_path)
+    print(tracer.summary())
+    print(f"Trace written to {trace_paths[0]} and {trace_paths[1]}")
 
 
 if __name__ == "__main__":
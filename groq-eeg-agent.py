@@ -1,7 +1,97 @@
-import pandas as pd
+import argparse
 import os
-from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
+from checkpoint import CheckpointStore
+from context_compaction import ContextCompactor
+from pipeline import ChunkPipeline
+from task_graph import run_crew_tasks
+
+
+REPORT_PATH = 'neural_data_processing_report.md'
+# Params a crew server job may give run_job, passed on to build_tasks
+JOB_PARAMS = ('data_dir', 'harmonize_sfreq', 'recording', 'sfreq', 'eog_channels')
+
+
+def build_tasks(llm, data_dir=None, harmonize_sfreq=None, recording=None, sfreq=None, eog_channels='',
+                output_dir=None):
+    """
+    The four processing tasks of crews.toml with their agents and tools, in
+    order, and their dependencies. With a ``data_dir``, the collection agent
+    catalogues its recordings; with a ``recording``, the other agents process
+    that file, writing their results, and the annotation store the annotation
+    agent records events in, next to it (or into ``output_dir``).
+    """
+    from annotations import ANNOTATIONS_PATH, AnnotationTool
+    from artifact_removal import ArtifactRemovalTool
+    from crew_registry import crew_spec
+    from eeg_preprocessing import PreprocessingTool
+    from neural_data import NeuralDataTool
+    from spectral_features import SpectralFeaturesTool
+
+    annotations_path = ANNOTATIONS_PATH if output_dir is None else os.path.join(output_dir, ANNOTATIONS_PATH)
+    if recording:
+        stem = os.path.splitext(recording)[0]
+        if output_dir is not None:
+            stem = os.path.join(output_dir, os.path.basename(stem))
+        annotations_path = f"{stem}_annotations.npz"
+
+    spec = crew_spec('eeg')
+    agents = spec.build_agents({
+        'neural_data': NeuralDataTool(data_dir=data_dir, sfreq=harmonize_sfreq) if data_dir else None,
+        'preprocessing': PreprocessingTool(),
+        'spectral_features': SpectralFeaturesTool(),
+        'annotations': AnnotationTool(path=annotations_path),
+        'artifact_removal': ArtifactRemovalTool(),
+    }, llm=llm)
+
+    collect_instructions = ""
+    if data_dir:
+        collect_instructions = f""" The recordings are in {data_dir}. 
+            Use your tool to catalogue them and inspect representative windows."""
+
+    clean_instructions = ""
+    annotate_instructions = ""
+    artifact_instructions = ""
+    if recording:
+        sampling = f", sampled at {sfreq} Hz" if sfreq else ""
+        clean_instructions = f""" The raw recording is {recording}{sampling}. 
+            Preprocess it with your tool, writing the result to {stem}_clean.npy, and report what was done."""
+        annotate_instructions = f""" The preprocessed recording is {stem}_clean.npy. 
+            Characterize it with your spectral features tool and include its band power, spectral entropy 
+            and coherence findings in the annotations. Record the events you identify (stimulus onsets, 
+            sleep stages, artifact spans) and the recording's metadata with your annotations tool under the 
+            recording name {os.path.basename(recording)}; they are stored in {annotations_path}."""
+        eog = f" Its EOG channels are {eog_channels}." if eog_channels else ""
+        artifact_instructions = f""" The preprocessed recording is {stem}_clean.npy.{eog} 
+            It is z-scored, so give thresholds in standard deviations. Remove artifacts from it with your tool, 
+            writing the result to {stem}_artifact_free.npy, and report what was found."""
+
+    tasks, dependencies = spec.build_tasks(agents, notes={
+        'collect_data': collect_instructions,
+        'clean_data': clean_instructions,
+        'annotate_data': annotate_instructions,
+        'remove_artifacts': artifact_instructions,
+    })
+    return list(tasks.values()), dependencies
+
+
+def run_job(params, output_dir, llm, checkpoint=None, tracer=None, compactor=None, router=None):
+    """
+    Crew server job: process the recordings given by ``params`` (``data_dir``,
+    ``harmonize_sfreq``, ``recording``, ``sfreq``, ``eog_channels``), writing
+    the processed files and the report into ``output_dir``; returns the
+    report's path.
+    """
+    tasks, dependencies = build_tasks(llm, output_dir=output_dir, **params)
+    if tracer is not None:
+        tracer.instrument([task.agent for task in tasks], tasks)
+    outputs = run_crew_tasks(
+        tasks, dependencies, max_concurrency=1, checkpoint=checkpoint, tracer=tracer, compactor=compactor,
+        router=router,
+    )
+    path = os.path.join(output_dir, REPORT_PATH)
+    with open(path, 'w') as file:
+        file.write(outputs[-1])
+    return path
 
 
 def main():
@@ -14,25 +104,80 @@ def main():
     and writes them to a markdown file.
 
     Steps:
-    1. Initialize the ChatGroq API with the specified model and API key.
+    1. Initialize the ChatGroq API with the specified model and API key, backed by the on-disk response cache.
     2. Display introductory text about the Neural Data Processing Assistant.
-    3. Create and configure the specialized AI agents:
-        - Data_Collection_Agent: Integrates various data sources.
-        - Data_Cleaning_Agent: Cleans and normalizes the data.
-        - Data_Annotation_Agent: Annotates the data with relevant metadata.
-        - Artifact_Removal_Agent: Identifies and removes artifacts from neural recordings.
-    4. Define tasks for the agents to perform.
-    5. Create a Crew instance with the agents and tasks, and run the tasks.
-    6. Print the results and write them to an output markdown file.
+    3. Create and configure the specialized AI agents from their definitions in crews.toml:
+        - Data_Collection_Agent: Integrates various data sources through the memory-mapped data catalog.
+        - Data_Cleaning_Agent: Cleans and normalizes the data with the NumPy preprocessing tool.
+        - Data_Annotation_Agent: Annotates the data with relevant metadata and its spectral features, recording
+          timed events and metadata in an indexed annotation store (<recording>_annotations.npz).
+        - Artifact_Removal_Agent: Identifies and removes artifacts from neural recordings with the parallel artifact engine.
+    4. Define tasks for the agents to perform, also from crews.toml.
+    5. Run the tasks in order, checkpointing each one so that an interrupted run
+       can be resumed with --resume <run-id>, and keeping the context passed
+       between tasks within a token budget.
+    6. Print the results and write them to an output markdown file, with a latency and
+       token trace of the run (JSONL and Chrome trace-event format) next to it.
+
+    With --stream, tokens are printed and written into the report as they are
+    generated; with --sse-port they are also served as Server-Sent Events on
+    http://127.0.0.1:<port>/events.
+
+    With --pipeline, each data source is cleaned, annotated and checked for
+    artifacts as soon as it has been integrated, and the artifact removal
+    agent merges its per-source results at the end, so the stages overlap
+    instead of running one after the other.
+
+    Each task runs on the model a ModelRouter picks for it: the small model
+    for light tasks, a larger one for analysis and long outputs, another when
+    one is saturated, with the latency and cost of every route logged to
+    .cache/routes.jsonl. --no-routing runs every task on llama3-8b-8192.
     """
 
-    model = 'llama3-8b-8192'
-
-    llm = ChatGroq(
-        temperature=0, 
-        groq_api_key=os.getenv('GROQ_API_KEY'), 
-        model_name=model
-    )
+    parser = argparse.ArgumentParser(description='CrewAI Neural Data Processing Assistant')
+    parser.add_argument('--resume', metavar='RUN_ID', help='resume an interrupted run, replaying its completed tasks')
+    parser.add_argument('--data-dir', help='directory of recordings (.npy, or raw binary with a JSON sidecar) to integrate')
+    parser.add_argument('--harmonize-sfreq', type=float, help='common sample rate to resample recordings to on access')
+    parser.add_argument('--recording', help='raw recording for the cleaning agent to preprocess')
+    parser.add_argument('--sfreq', type=float, help='sampling rate of --recording in Hz, if its header has none')
+    parser.add_argument('--eog-channels', default='', help='comma-separated EOG channels of --recording for blink removal')
+    parser.add_argument('--stream', action='store_true', help='print and write the report as it is generated')
+    parser.add_argument('--sse-port', type=int, help='also serve the token stream as Server-Sent Events on this port')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='overlap the stages, passing data on source by source as it is integrated')
+    parser.add_argument('--no-routing', action='store_true', help='run every task on the default model')
+    args = parser.parse_args()
+    streaming = args.stream or args.sse_port is not None
+
+    if args.resume and not CheckpointStore.exists(args.resume):
+        parser.error(f"no checkpoints found for run {args.resume}")
+    checkpoint = CheckpointStore(args.resume)
+    print(f"Run id: {checkpoint.run_id}")
+
+    # Heavy dependencies are imported only once the arguments are known to be valid
+    from langchain_groq import ChatGroq
+    from crew_registry import PromptMeter, crew_spec
+    from model_router import ModelRouter, model_limiter
+    from rate_limiter import default_limiter, rate_limited_client
+    from response_cache import LangChainResponseCache, ResponseCache
+    from streaming import MarkdownStream, TokenStream, print_tokens, serve_events
+    from tracing import Tracer
+
+    response_cache = ResponseCache()
+
+    def build_llm(model):
+        return ChatGroq(
+            temperature=0, 
+            groq_api_key=os.getenv('GROQ_API_KEY'), 
+            model_name=model,
+            cache=LangChainResponseCache(response_cache),
+            http_client=rate_limited_client(model_limiter(model)),
+            max_retries=0,
+            streaming=streaming or args.pipeline,
+        )
+
+    llm = build_llm('llama3-8b-8192')
+    router = None if args.no_routing else ModelRouter(build_llm)
 
     print('CrewAI Neural Data Processing Assistant')
     multiline_text = """
@@ -43,86 +188,62 @@ def main():
 
     print(multiline_text)
 
-    Data_Collection_Agent = Agent(
-        role='Data_Collection_Agent',
-        goal="""Integrate various neural data sources (EEG, MEG, fMRI, ECoG, single-neuron recordings).""",
-        backstory="""You are an expert in collecting and integrating neural data from multiple sources. 
-                Your goal is to gather and harmonize data to ensure consistency across datasets.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    Data_Cleaning_Agent = Agent(
-        role='Data_Cleaning_Agent',
-        goal="""Clean and normalize the collected neural data.""",
-        backstory="""You specialize in cleaning and normalizing data. 
-                Your task is to ensure the neural data is free of noise and standardized for analysis.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    Data_Annotation_Agent = Agent(
-        role='Data_Annotation_Agent',
-        goal="""Annotate the neural data with relevant metadata.""",
-        backstory="""As an expert in data annotation, you add necessary metadata to the neural data, 
-                making it more informative and easier to use for further analysis.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    Artifact_Removal_Agent = Agent(
-        role='Artifact_Removal_Agent',
-        goal="""Identify and remove artifacts from neural recordings.""",
-        backstory="""You specialize in artifact removal from neural recordings. 
-                Your task is to detect and eliminate any unwanted artifacts to ensure data integrity.""",
-        verbose=True,
-        allow_delegation=False,
-        llm=llm,
-    )
-
-    # Define the tasks for each agent
-    task_collect_data = Task(
-        description="""Integrate various neural data sources (EEG, MEG, fMRI, ECoG, single-neuron recordings).""",
-        agent=Data_Collection_Agent,
-        expected_output="A unified dataset integrating various neural data sources."
-    )
-
-    task_clean_data = Task(
-        description="""Clean and normalize the collected neural data.""",
-        agent=Data_Cleaning_Agent,
-        expected_output="A cleaned and normalized neural dataset."
-    )
-
-    task_annotate_data = Task(
-        description="""Annotate the neural data with relevant metadata.""",
-        agent=Data_Annotation_Agent,
-        expected_output="Annotated neural dataset with relevant metadata."
-    )
-
-    task_remove_artifacts = Task(
-        description="""Identify and remove artifacts from neural recordings.""",
-        agent=Artifact_Removal_Agent,
-        expected_output="Neural dataset free from artifacts."
-    )
-
-    # Create a crew with the agents and tasks
-    crew = Crew(
-        agents=[Data_Collection_Agent, Data_Cleaning_Agent, Data_Annotation_Agent, Artifact_Removal_Agent],
-        tasks=[task_collect_data, task_clean_data, task_annotate_data, task_remove_artifacts],
-        verbose=False
-    )
-
-    # Run the tasks
-    result = crew.kickoff()
-
-    # Print the results and write them to an output markdown file
-    print(result)
-    with open('neural_data_processing_report.md', "w") as file:
-        print('\n\nThese results have been exported to neural_data_processing_report.md')
-        file.write(result)
+    spec = crew_spec('eeg')
+    tasks, dependencies = build_tasks(llm, args.data_dir, args.harmonize_sfreq, args.recording, args.sfreq,
+                                      args.eog_channels)
+
+    # Run the tasks in order, each one receiving the previous task's output
+    tracer = Tracer()
+    tracer.watch_cache(response_cache, 'llm_cache')
+    tracer.watch_retries(default_limiter())
+    compactor = ContextCompactor()
+    tracer.watch_context(compactor)
+    tracer.instrument([task.agent for task in tasks], tasks)
+    prompt_meter = PromptMeter(spec.prefix)
+    prompt_meter.attach([task.agent for task in tasks])
+    stream = None
+    if streaming or args.pipeline:
+        stream = TokenStream()
+        stream.attach([task.agent for task in tasks])
+
+    def run():
+        if args.pipeline:
+            return ChunkPipeline(tasks, dependencies, stream, checkpoint, tracer, compactor,
+                                 router=router).run()
+        outputs = run_crew_tasks(
+            tasks, dependencies, max_concurrency=1, checkpoint=checkpoint, tracer=tracer,
+            compactor=compactor, router=router,
+        )
+        return outputs[-1]
+
+    if streaming:
+        stream.subscribe(MarkdownStream(REPORT_PATH))
+        if args.stream:
+            stream.subscribe(print_tokens)
+        if args.sse_port is not None:
+            serve_events(stream, args.sse_port)
+            print(f"Streaming tokens to http://127.0.0.1:{args.sse_port}/events")
+        # The subscribers do the work; MarkdownStream writes the finished report
+        for _ in stream.events(run):
+            pass
+        print(f'\n\nThese results have been exported to {REPORT_PATH}')
+    else:
+        result = run()
+
+        # Print the results and write them to an output markdown file
+        print(result)
+        with open(REPORT_PATH, "w") as file:
+            print(f'\n\nThese results have been exported to {REPORT_PATH}')
+            file.write(result)
+    print(response_cache.summary())
+    print(compactor.summary())
+    print(prompt_meter.summary())
+    if router is not None:
+        print(router.summary())
+
+    trace_paths = tracer.write(REPORT_PATH)
+    print(tracer.summary())
+    print(f"Trace written to {trace_paths[0]} and {trace_paths[1]}")
 
 
 if __name__ == "__main__":
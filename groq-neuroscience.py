@@ -1,457 +1,272 @@
+import argparse
 import os
-import pandas as pd
-from crewai import Agent, Task, Crew, Process
-from crewai_tools import SerperDevTool
-from groq import Groq
-
-# Set up environment variables
-os.environ["SERPER_API_KEY"] = "KEY"
-os.environ["OPENAI_API_KEY"] = "KEY"
-os.environ["GROQ_API_KEY"] = "KEY"
-
-# Initialize Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-
-# Function to perform a chat completion using Groq
+import threading
+from functools import lru_cache
+from checkpoint import CheckpointStore
+from context_compaction import ContextCompactor
+from sharding import SHARD_WORKERS, ShardExecutor, plan_shards
+from task_graph import MAX_CONCURRENCY, run_crew_tasks
+
+# Set up environment variables, keeping any keys already set (such as a crew server's)
+os.environ.setdefault("SERPER_API_KEY", "KEY")
+os.environ.setdefault("OPENAI_API_KEY", "KEY")
+os.environ.setdefault("GROQ_API_KEY", "KEY")
+
+# Every task appends a typed record (agent, output, cited sources, timings, tokens) to the result store,
+# from which the database is exported once the crew finishes
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', 'csv')  # csv, parquet or sqlite
+EXPORT_PATH = f"brain_knowledge_database.{EXPORT_FORMAT}"
+# Params a crew server job may give run_job
+JOB_PARAMS = ('project',)
+
+# Groq client per model, created on first use and sharing the model's process-wide rate limiter,
+# which also handles retries
+@lru_cache(maxsize=None)
+def get_groq_client(model):
+    from groq import Groq
+    from model_router import model_limiter
+    from rate_limiter import rate_limited_client
+    return Groq(api_key=os.environ.get("GROQ_API_KEY"), http_client=rate_limited_client(model_limiter(model)),
+                max_retries=0)
+
+# LangChain Groq model for the agents' tasks, on the same rate limiter as the Groq client of that model
+def build_llm(model):
+    from langchain_groq import ChatGroq
+    from model_router import model_limiter
+    from rate_limiter import rate_limited_client
+    return ChatGroq(temperature=0, groq_api_key=os.environ.get("GROQ_API_KEY"), model_name=model,
+                    http_client=rate_limited_client(model_limiter(model)), max_retries=0)
+
+# The router, caches, tools, crew and result store shared by every run of the process. setup() builds
+# them on first use, so that importing this script, --help and argument errors do not load crewai
+router = response_cache = search_tool = knowledge_index = crew_tools = None
+crew = agents = tasks = task_dependencies = task_descriptions = prompt_meter = result_store = None
+_ready = False
+_setup_lock = threading.Lock()
+
+def setup():
+    global router, response_cache, search_tool, knowledge_index, crew_tools
+    global crew, agents, tasks, task_dependencies, task_descriptions, prompt_meter, result_store, _ready
+    with _setup_lock:
+        if _ready:
+            return
+        from crewai_tools import SerperDevTool
+        from langchain_core.globals import set_llm_cache
+        from crew_registry import PromptMeter, crew_spec
+        from knowledge_index import KnowledgeIndex, KnowledgeSearchTool
+        from model_router import ModelRouter
+        from response_cache import LangChainResponseCache, ResponseCache
+        from result_store import ResultStore
+        from search_cache import cached_search_tool
+        from spectral_features import SpectralFeaturesTool
+
+        # Routes every task to a Groq model by its size, expected output and past quality, falling back
+        # to another model when one is saturated; override per agent with ROUTER_OVERRIDES="Role=model,...".
+        # With MODEL_ROUTING=0 (set by --no-routing, and so inherited by shard workers) every task runs on
+        # the default model
+        router = ModelRouter(build_llm) if os.getenv('MODEL_ROUTING', '1') != '0' else None
+
+        # On-disk cache of LLM responses, shared by the agents' LLM and the Groq helpers below
+        response_cache = ResponseCache()
+        set_llm_cache(LangChainResponseCache(response_cache))
+
+        # Creating a tool for web search, memoized and shared by every agent
+        search_tool = cached_search_tool(SerperDevTool())
+
+        # Findings of earlier runs, searchable by every agent before it researches or calls the LLM
+        knowledge_index = KnowledgeIndex()
+
+        # Agents and tasks as defined in crews.toml; the neurophysiologist gets a numerical backend for
+        # EEG/MEG recordings
+        crew_tools = {
+            'knowledge': KnowledgeSearchTool(index=knowledge_index),
+            'search': search_tool,
+            'spectral_features': SpectralFeaturesTool(),
+        }
+        crew = crew_spec('neuroscience').build(crew_tools)
+        agents = crew.agents
+        tasks = crew.tasks
+
+        # Counts the prompt bytes the agents' shared prefix saves
+        prompt_meter = PromptMeter(crew.spec.prefix)
+        prompt_meter.attach(agents)
+
+        result_store = ResultStore()
+        for task in tasks:
+            task.callback = knowledge_index.task_callback()
+
+        # Only these tasks consume other tasks' output; every other task runs concurrently
+        task_dependencies = crew.dependencies
+        task_descriptions = [task.description for task in tasks]
+        _ready = True
+
+# Function to perform a chat completion using Groq, on the model routed to
 def perform_groq_chat_completion(prompt):
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        model="llama3-8b-8192",
+    from groq_client import DEFAULT_MODEL
+    from response_cache import cache_key
+
+    setup()
+    messages = [
+        {"role": "user", "content": prompt}
+    ]
+    model = router.route_prompt(prompt) if router is not None else DEFAULT_MODEL
+
+    def complete():
+        chat_completion = get_groq_client(model).chat.completions.create(
+            messages=messages,
+            model=model,
+        )
+        return chat_completion.choices[0].message.content
+
+    return response_cache.get_or_set(cache_key(model, None, messages), complete)
+
+# Asyncio variant sharing the pooled connections of an AsyncChatClient
+async def perform_groq_chat_completion_async(prompt, async_client):
+    return await async_client.complete(prompt)
+
+# Function to complete many prompts concurrently, returning answers in input order
+def perform_groq_chat_completion_batch(prompts, max_in_flight=32):
+    from groq_client import complete_batch
+
+    setup()
+    return complete_batch(prompts, max_in_flight=max_in_flight, cache=response_cache)
+
+def export_results(run_id):
+    setup()
+    rows = result_store.export(EXPORT_PATH, format=EXPORT_FORMAT, run_id=run_id)
+    return f"Database of {rows} task results exported to {EXPORT_PATH}"
+
+# Tasks focused on one project of a sharded run, and their dependencies
+def project_tasks(project=None):
+    setup()
+    for task, description in zip(tasks, task_descriptions):
+        task.description = description if project is None else f"{description}\n\nProject: {project}"
+    return tasks, task_dependencies
+
+# Records of every task of a run (of every run if run_id is None), as dicts
+def collect_all_data(run_id=None):
+    setup()
+    return list(result_store.rows(run_id))
+
+
+# Run the crew for every project in worker processes, then aggregate their results into the database and index
+def run_sharded(projects, run_id, executor):
+    setup()
+    shards = plan_shards('neuroscience', tasks, task_dependencies, projects)
+    result_store.follow(EXPORT_PATH, format=EXPORT_FORMAT, run_id=run_id)
+    failed = []
+    for result in executor.run(shards, run_id):
+        if result.error:
+            failed.append(result.shard.name)
+            print(f"Shard {result.shard.name} failed:\n{result.error}")
+            continue
+        for record in result.records:
+            result_store.append(record)
+            knowledge_index.add(record.output, source=record.agent, task=record.description)
+        result_store.flush()
+    print(export_results(run_id))
+    print(f"Knowledge index: {len(knowledge_index)} chunks in {knowledge_index.directory}")
+    if failed:
+        print(f"{len(failed)} of {len(shards)} shards failed: {', '.join(failed)}; rerun with --resume {run_id}")
+
+
+# Crew server job: a fresh crew on the shared tools, focused on params['project'] if given, writing
+# its records and exported database into output_dir; returns the database's path
+def run_job(params, output_dir, llm, checkpoint=None, tracer=None, compactor=None, router=None):
+    from crew_registry import crew_spec
+    from result_store import ResultStore
+
+    setup()
+    project = params.get('project')
+    job_crew = crew_spec('neuroscience').build(crew_tools, llm=llm, focus=f"\n\nProject: {project}" if project else "")
+    for task in job_crew.tasks:
+        task.callback = knowledge_index.task_callback()
+    if tracer is not None:
+        tracer.instrument(job_crew.agents, job_crew.tasks)
+    store = ResultStore(os.path.join(output_dir, 'results'))
+    path = os.path.join(output_dir, EXPORT_PATH)
+    store.follow(path, format=EXPORT_FORMAT)
+    run_crew_tasks(
+        job_crew.tasks,
+        job_crew.dependencies,
+        inputs={'project_name': 'brain_knowledge_database'},
+        checkpoint=checkpoint,
+        tracer=tracer,
+        compactor=compactor,
+        results=store,
+        router=router,
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Brain knowledge database crew')
+    parser.add_argument('--resume', metavar='RUN_ID', help='resume an interrupted run, replaying its completed tasks')
+    parser.add_argument('--projects', nargs='+', metavar='PROJECT',
+                        help='run the crew once per project, sharded across worker processes')
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS, help='local worker processes for --projects')
+    parser.add_argument('--listen', default='127.0.0.1:0', metavar='HOST:PORT',
+                        help='address remote shard workers connect to (set SHARD_AUTHKEY)')
+    parser.add_argument('--no-routing', action='store_true', help='run every task on the default model')
+    args = parser.parse_args()
+
+    if args.no_routing:
+        # Read by setup(), and inherited by the shard workers
+        os.environ['MODEL_ROUTING'] = '0'
+
+    if args.resume and not CheckpointStore.exists(args.resume):
+        parser.error(f"no checkpoints found for run {args.resume}")
+    checkpoint = CheckpointStore(args.resume)
+    print(f"Run id: {checkpoint.run_id}")
+
+    if args.projects:
+        run_sharded(args.projects, checkpoint.run_id, ShardExecutor(args.workers, args.listen))
+        return
+
+    # Heavy dependencies are imported only once the arguments are known to be valid
+    from rate_limiter import default_limiter
+    from tracing import Tracer
+
+    setup()
+
+    # Trace per-agent latency, tokens and cache hits
+    tracer = Tracer()
+    tracer.watch_cache(response_cache, 'llm_cache')
+    tracer.watch_cache(search_tool.search_cache, 'search_cache')
+    tracer.watch_retries(default_limiter())
+    compactor = ContextCompactor()
+    tracer.watch_context(compactor)
+    tracer.instrument(agents, tasks)
+    # Each task's record is exported as soon as it finishes, not only at the end of the run
+    result_store.follow(EXPORT_PATH, format=EXPORT_FORMAT, run_id=checkpoint.run_id)
+
+    # Kickoff the project, running independent tasks in parallel
+    outputs = run_crew_tasks(
+        tasks,
+        task_dependencies,
+        inputs={'project_name': 'brain_knowledge_database'},
+        max_concurrency=MAX_CONCURRENCY,
+        checkpoint=checkpoint,
+        tracer=tracer,
+        compactor=compactor,
+        results=result_store,
+        router=router,
     )
-    return chat_completion.choices[0].message.content
-
-# Creating a tool for web search
-search_tool = SerperDevTool()
-
-# Define agents with their roles and tasks
-agents = []
-tasks = []
-
-# Neuroscientist Agent
-neuroscientist = Agent(
-    role='Neuroscientist',
-    goal='Analyze neural data to understand the mechanisms of consciousness.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a leading neuroscientist with expertise in analyzing neural data to study consciousness."
-        "Your goal is to uncover the neural correlates of consciousness through data analysis and research."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(neuroscientist)
-
-task_analyze_data = Task(
-    description="Analyze the neural data to understand the mechanisms of consciousness.",
-    expected_output="Detailed analysis and insights on the neural correlates of consciousness.",
-    tools=[search_tool],
-    agent=neuroscientist,
-)
-tasks.append(task_analyze_data)
-
-# Neuroanatomist Agent
-neuroanatomist = Agent(
-    role='Neuroanatomist',
-    goal='Provide detailed maps of brain regions, neural pathways, and connectivity.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in the structure of the brain, providing detailed maps of brain regions, neural pathways, and connectivity."
-        "Your goal is to map the anatomy of the brain comprehensively."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(neuroanatomist)
-
-task_map_brain = Task(
-    description="Map the detailed structure of the brain, including regions, neural pathways, and connectivity.",
-    expected_output="Detailed anatomical maps of the brain.",
-    tools=[search_tool],
-    agent=neuroanatomist,
-)
-tasks.append(task_map_brain)
-
-# Neurophysiologist Agent
-neurophysiologist = Agent(
-    role='Neurophysiologist',
-    goal='Study the electrical and chemical activities of the nervous system.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in the electrical and chemical activities of the nervous system."
-        "Your goal is to study brain function through techniques such as EEG, MEG, and electrophysiology."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(neurophysiologist)
-
-task_study_brain_function = Task(
-    description="Study brain function through techniques such as EEG, MEG, and electrophysiology.",
-    expected_output="Data on the electrical and chemical activities of the brain.",
-    tools=[search_tool],
-    agent=neurophysiologist,
-)
-tasks.append(task_study_brain_function)
-
-# Neuropsychologist Agent
-neuropsychologist = Agent(
-    role='Neuropsychologist',
-    goal='Study the relationship between brain function and behavior.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a researcher who studies the relationship between brain function and behavior."
-        "Your goal is to provide insights into cognitive processes and how brain injuries or diseases affect mental functions."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(neuropsychologist)
-
-task_study_behavior = Task(
-    description="Study the relationship between brain function and behavior.",
-    expected_output="Insights into cognitive processes and how brain injuries or diseases affect mental functions.",
-    tools=[search_tool],
-    agent=neuropsychologist,
-)
-tasks.append(task_study_behavior)
-
-# Neurologist Agent
-neurologist = Agent(
-    role='Neurologist',
-    goal='Diagnose and treat neurological disorders.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a medical doctor specializing in diagnosing and treating neurological disorders."
-        "Your goal is to contribute clinical knowledge and insights from patient data."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(neurologist)
-
-task_clinical_insights = Task(
-    description="Contribute clinical knowledge and insights from patient data.",
-    expected_output="Clinical data and insights on neurological disorders.",
-    tools=[search_tool],
-    agent=neurologist,
-)
-tasks.append(task_clinical_insights)
-
-# Cognitive Scientist Agent
-cognitive_scientist = Agent(
-    role='Cognitive Scientist',
-    goal='Study mental processes such as perception, memory, reasoning, and language.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a researcher who studies mental processes such as perception, memory, reasoning, and language."
-        "Your goal is to help bridge the gap between neural activity and cognitive functions."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(cognitive_scientist)
-
-task_study_mental_processes = Task(
-    description="Study mental processes such as perception, memory, reasoning, and language.",
-    expected_output="Data and insights on cognitive functions.",
-    tools=[search_tool],
-    agent=cognitive_scientist,
-)
-tasks.append(task_study_mental_processes)
-
-# Bioinformatics Specialist Agent
-bioinformatics_specialist = Agent(
-    role='Bioinformatics Specialist',
-    goal='Manage and analyze biological data.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in managing and analyzing biological data."
-        "Your goal is to design and maintain databases, develop algorithms for data integration, and ensure data quality and accessibility."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(bioinformatics_specialist)
-
-task_manage_data = Task(
-    description="Design and maintain databases, develop algorithms for data integration, and ensure data quality and accessibility.",
-    expected_output="Integrated and high-quality database of brain data.",
-    tools=[search_tool],
-    agent=bioinformatics_specialist,
-)
-tasks.append(task_manage_data)
-
-# Data Scientist Agent
-data_scientist = Agent(
-    role='Data Scientist',
-    goal='Process and interpret large datasets, uncovering patterns and insights.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a professional skilled in data analysis, machine learning, and statistical modeling."
-        "Your goal is to help process and interpret large datasets, uncovering patterns and insights."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(data_scientist)
-
-task_analyze_datasets = Task(
-    description="Process and interpret large datasets, uncovering patterns and insights.",
-    expected_output="Statistical analysis and machine learning models of brain data.",
-    tools=[search_tool],
-    agent=data_scientist,
-)
-tasks.append(task_analyze_datasets)
-
-# Computer Scientist Agent
-computer_scientist = Agent(
-    role='Computer Scientist',
-    goal='Build the infrastructure needed to store, manage, and analyze brain data.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a specialist in software development, database design, and computational modeling."
-        "Your goal is to build the infrastructure needed to store, manage, and analyze brain data."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(computer_scientist)
-
-task_build_infrastructure = Task(
-    description="Build the infrastructure needed to store, manage, and analyze brain data.",
-    expected_output="Database infrastructure for brain data.",
-    tools=[search_tool],
-    agent=computer_scientist,
-)
-tasks.append(task_build_infrastructure)
-
-# AI Researcher Agent
-ai_researcher = Agent(
-    role='AI Researcher',
-    goal='Develop models to simulate brain functions and analyze complex data patterns.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in AI and machine learning."
-        "Your goal is to develop models to simulate brain functions and analyze complex data patterns."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(ai_researcher)
-
-task_develop_models = Task(
-    description="Develop models to simulate brain functions and analyze complex data patterns.",
-    expected_output="AI models simulating brain functions.",
-    tools=[search_tool],
-    agent=ai_researcher,
-)
-tasks.append(task_develop_models)
-
-# Ethicist Agent
-ethicist = Agent(
-    role='Ethicist',
-    goal='Address the ethical considerations of collecting, storing, and using brain data.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a professional who addresses the ethical considerations of collecting, storing, and using brain data."
-        "Your goal is to ensure privacy, consent, and responsible use of information."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(ethicist)
-
-task_ensure_ethics = Task(
-    description="Ensure privacy, consent, and responsible use of brain data.",
-    expected_output="Ethical guidelines and compliance for brain data usage.",
-    tools=[search_tool],
-    agent=ethicist,
-)
-tasks.append(task_ensure_ethics)
-
-# Biostatistician Agent
-biostatistician = Agent(
-    role='Biostatistician',
-    goal='Apply statistical methods to biological data.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in applying statistical methods to biological data."
-        "Your goal is to design experiments, analyze data, and interpret results to ensure scientific rigor."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(biostatistician)
-
-task_apply_statistics = Task(
-    description="Apply statistical methods to biological data, design experiments, analyze data, and interpret results.",
-    expected_output="Statistical analysis and interpretation of brain data.",
-    tools=[search_tool],
-    agent=biostatistician,
-)
-tasks.append(task_apply_statistics)
-
-# Medical Imaging Specialist Agent
-medical_imaging_specialist = Agent(
-    role='Medical Imaging Specialist',
-    goal='Provide detailed images of the brain’s structure and function.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a professional skilled in MRI, fMRI, PET, and other imaging techniques."
-        "Your goal is to provide detailed images of the brain’s structure and function."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(medical_imaging_specialist)
-
-task_provide_images = Task(
-    description="Provide detailed images of the brain’s structure and function using MRI, fMRI, PET, and other imaging techniques.",
-    expected_output="Detailed brain images.",
-    tools=[search_tool],
-    agent=medical_imaging_specialist,
-)
-tasks.append(task_provide_images)
-
-# Geneticist Agent
-geneticist = Agent(
-    role='Geneticist',
-    goal='Study how genes influence brain development and function.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are an expert in genetics and genomics."
-        "Your goal is to provide insights into the genetic basis of neurological and psychiatric disorders."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(geneticist)
-
-task_study_genetics = Task(
-    description="Study how genes influence brain development and function.",
-    expected_output="Genetic data and insights on neurological and psychiatric disorders.",
-    tools=[search_tool],
-    agent=geneticist,
-)
-tasks.append(task_study_genetics)
-
-# Pharmacologist Agent
-pharmacologist = Agent(
-    role='Pharmacologist',
-    goal='Study the effects of drugs on the brain.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a researcher who studies the effects of drugs on the brain."
-        "Your goal is to contribute knowledge about neurochemistry and pharmacodynamics."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(pharmacologist)
-
-task_study_drug_effects = Task(
-    description="Study the effects of drugs on the brain.",
-    expected_output="Data on neurochemistry and pharmacodynamics.",
-    tools=[search_tool],
-    agent=pharmacologist,
-)
-tasks.append(task_study_drug_effects)
-
-# Software Engineer Agent
-software_engineer = Agent(
-    role='Software Engineer',
-    goal='Create the software tools and interfaces for data entry, retrieval, and visualization.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a developer who creates the software tools and interfaces for data entry, retrieval, and visualization."
-        "Your goal is to ensure the database is user-friendly and efficient."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(software_engineer)
-
-task_develop_tools = Task(
-    description="Create software tools and interfaces for data entry, retrieval, and visualization.",
-    expected_output="User-friendly software tools and interfaces for brain data.",
-    tools=[search_tool],
-    agent=software_engineer,
-)
-tasks.append(task_develop_tools)
-
-# Project Manager Agent
-project_manager = Agent(
-    role='Project Manager',
-    goal='Coordinate the project, managing timelines, budgets, and ensuring milestones are met.',
-    verbose=True,
-    memory=True,
-    backstory=(
-        "You are a professional who oversees the project, coordinating between different teams, managing timelines, budgets, and ensuring that milestones are met."
-        "Your goal is to ensure the project stays on track and that all teams collaborate effectively."
-    ),
-    tools=[search_tool],
-    allow_delegation=False
-)
-agents.append(project_manager)
-
-task_manage_project = Task(
-    description="Coordinate the project, managing timelines, budgets, and ensuring milestones are met.",
-    expected_output="A well-coordinated project with timelines, budgets, and milestones met.",
-    tools=[search_tool],
-    agent=project_manager,
-)
-tasks.append(task_manage_project)
-
-# Task to export the final database to a CSV file
-def export_to_csv(data):
-    df = pd.DataFrame(data)
-    df.to_csv('brain_knowledge_database.csv', index=False)
-    return "Database exported to brain_knowledge_database.csv"
-
-export_task = Task(
-    description="Export the collected data to a CSV file.",
-    expected_output="CSV file containing the entire knowledge of the human brain.",
-    tools=[search_tool],
-    agent=project_manager,
-    function=lambda: export_to_csv(collect_all_data())  # collect_all_data() is a placeholder for the actual data collection logic
-)
-
-# Forming the crew with the defined agents and tasks
-crew = Crew(
-    agents=agents,
-    tasks=tasks + [export_task],
-    process=Process.sequential
-)
-
-# Placeholder function for collecting all data from tasks
-def collect_all_data():
-    data = []
-    for task in tasks:
-        data.append({
-            "agent": task.agent.role,
-            "task_description": task.description,
-            "output": task.expected_output,
-        })
-    return data
-
-# Kickoff the project
-result = crew.kickoff(inputs={'project_name': 'brain_knowledge_database'})
-print(result)
+    result = outputs[-1]
+    print(result)
+    print(export_results(checkpoint.run_id))
+    print(response_cache.summary())
+    print(compactor.summary())
+    print(prompt_meter.summary())
+    print(search_tool.search_cache.summary())
+    if router is not None:
+        print(router.summary())
+    print(f"Knowledge index: {len(knowledge_index)} chunks in {knowledge_index.directory}")
+
+    trace_paths = tracer.write(EXPORT_PATH)
+    print(tracer.summary())
+    print(f"Trace written to {trace_paths[0]} and {trace_paths[1]}")
+
+
+if __name__ == "__main__":
+    main()
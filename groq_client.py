@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import httpx
+
+from rate_limiter import AsyncRateLimitedTransport
+from response_cache import cache_key
+
+DEFAULT_MODEL = 'llama3-8b-8192'
+
+
+class AsyncChatClient:
+    """
+    Asyncio client for the Groq chat-completions endpoint.
+
+    All requests share one pooled HTTP connection pool, so TLS setup is paid once
+    per connection instead of once per prompt, and at most ``max_in_flight``
+    requests are outstanding at any time. ``base_url`` (or ``GROQ_BASE_URL``) can
+    point the client at a local stand-in server that mimics the endpoint, and a
+    ``transport`` (such as an ``httpx.MockTransport``) replaces the network
+    altogether. When a ResponseCache is given, cached answers are returned
+    without a request.
+    Requests go through a RateLimiter (the process-wide one by default), which
+    also takes over retrying rate-limited requests from the Groq SDK.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model=DEFAULT_MODEL, max_in_flight=32, timeout=60.0, cache=None,
+                 limiter=None, transport=None):
+        from groq import AsyncGroq
+
+        self.model = model
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        self._http = httpx.AsyncClient(
+            transport=AsyncRateLimitedTransport(limiter, transport, limits=limits),
+            timeout=timeout,
+        )
+        self.client = AsyncGroq(
+            api_key=api_key or os.getenv('GROQ_API_KEY'),
+            base_url=base_url or os.getenv('GROQ_BASE_URL'),
+            http_client=self._http,
+            max_retries=0,
+        )
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def complete(self, prompt, model=None, **params):
+        model = model or self.model
+        messages = [
+            {"role": "user", "content": prompt}
+        ]
+        key = cache_key(model, params.get('temperature'), messages, params.get('tools'))
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        async with self._semaphore:
+            chat_completion = await self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                **params,
+            )
+        content = chat_completion.choices[0].message.content
+        if self.cache is not None:
+            self.cache.set(key, content)
+        return content
+
+    async def complete_batch(self, prompts, model=None, **params):
+        """Complete every prompt concurrently and return the answers in input order."""
+        return await asyncio.gather(*(self.complete(prompt, model, **params) for prompt in prompts))
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def complete_batch(prompts, model=DEFAULT_MODEL, max_in_flight=32, **client_options):
+    """Blocking helper that runs a batch of prompts on a fresh event loop."""
+    async def run():
+        async with AsyncChatClient(model=model, max_in_flight=max_in_flight, **client_options) as client:
+            return await client.complete_batch(prompts)
+    return asyncio.run(run())
@@ -0,0 +1,336 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Optional, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from pydantic import BaseModel, Field
+
+KNOWLEDGE_INDEX_DIR = os.getenv('KNOWLEDGE_INDEX_DIR', '.cache/knowledge_index')
+EMBEDDING_DIM = 1024
+# Corpus size from which searches probe an inverted-file index instead of scanning every vector
+ANN_THRESHOLD = int(os.getenv('KNOWLEDGE_ANN_THRESHOLD', '20000'))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text, max_chars=1200):
+    """Split ``text`` into chunks of at most about ``max_chars``, packing whole paragraphs, then sentences."""
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text.strip()):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(_SENTENCE_END.split(paragraph))
+
+    chunks, current = [], ''
+    for piece in filter(None, pieces):
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HashingEmbedder:
+    """
+    Embeds text by feature hashing of its word unigrams and bigrams.
+
+    Each n-gram is hashed to one of ``dim`` signed buckets with weight
+    ``1 + log(count)``, and vectors are L2-normalized, so dot products are
+    cosine similarities of the texts' vocabulary. Needs no model and no
+    network, and is stable across processes and runs.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        words = _WORD.findall(text.lower())
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                key = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, key % self.dim] += (1.0 + np.log(count)) * (1 if key & 0x80000000 else -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _spherical_kmeans(vectors, clusters, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = np.flatnonzero(~sums.any(axis=1))
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids
+
+
+def _nearest(vectors, centroids, block=8192):
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + block]) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), block)
+    ] or [np.zeros(0, dtype=np.int64)]).astype(np.int32)
+
+
+class KnowledgeIndex:
+    """
+    Persistent vector index over chunked crew outputs.
+
+    Text added to the index is split into chunks, embedded with a
+    HashingEmbedder and appended to files under ``directory``: the vectors to a
+    raw float32 file that is memory-mapped for search, and the chunks with
+    their metadata to a JSON-lines file. Adding never rewrites what is stored,
+    and chunks already present are skipped, so re-indexing the outputs of a
+    repeated run is free. Processes sharing ``directory`` (shard workers,
+    concurrent runs) append under an exclusive ``flock`` on ``index.lock``,
+    first loading what the others appended, so ids stay the row numbers of
+    the vectors file. Below ``ann_threshold`` chunks a search scans every
+    vector exactly; above it, an inverted-file index (spherical k-means
+    centroids, about ``4 * sqrt(n)`` lists) narrows the scan to the ``nprobe``
+    lists nearest the query. New chunks join the list of their nearest
+    centroid, and the centroids are only retrained when the corpus has grown
+    fourfold since they were trained.
+    """
+
+    def __init__(self, directory=KNOWLEDGE_INDEX_DIR, dim=EMBEDDING_DIM, ann_threshold=ANN_THRESHOLD, nprobe=8):
+        self.directory = directory
+        self.embedder = HashingEmbedder(dim)
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._chunks_path = os.path.join(directory, 'chunks.jsonl')
+        self._ivf_path = os.path.join(directory, 'ivf.npz')
+        self._assignments_path = os.path.join(directory, 'assignments.i32')
+        self._lock_path = os.path.join(directory, 'index.lock')
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.chunks = []
+        self._hashes = set()
+        self._chunks_offset = 0
+        self._matrix = None
+        self.centroids, self._trained = None, 0
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists = None
+        self._ivf_version = None
+        with self._file_lock():
+            self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index files, across processes."""
+        with open(self._lock_path, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Read the chunks and index state appended since the last load; call under ``_file_lock``."""
+        if os.path.exists(self._chunks_path):
+            with open(self._chunks_path, 'rb') as file:
+                file.seek(self._chunks_offset)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    chunk = json.loads(line)
+                    self.chunks.append(chunk)
+                    self._hashes.add(chunk['hash'])
+                    self._chunks_offset += len(line)
+        dim = self.embedder.dim
+        stored = os.path.getsize(self._vectors_path) // (4 * dim) if os.path.exists(self._vectors_path) else 0
+        if stored != len(self.chunks) or (os.path.exists(self._chunks_path)
+                                          and os.path.getsize(self._chunks_path) != self._chunks_offset):
+            # A crash between the two appends leaves one file ahead of the other; drop the unmatched tail
+            self.chunks = self.chunks[:stored]
+            self._hashes = {chunk['hash'] for chunk in self.chunks}
+            with open(self._chunks_path, 'w') as file:
+                file.writelines(json.dumps(chunk) + '\n' for chunk in self.chunks)
+            self._chunks_offset = os.path.getsize(self._chunks_path)
+            with open(self._vectors_path, 'ab') as file:
+                file.truncate(len(self.chunks) * 4 * dim)
+
+        if os.path.exists(self._ivf_path):
+            version = (os.stat(self._ivf_path).st_mtime_ns, os.path.getsize(self._assignments_path))
+            if version != self._ivf_version:
+                with np.load(self._ivf_path) as ivf:
+                    self.centroids, self._trained = ivf['centroids'], int(ivf['trained'])
+                self._assignments = np.fromfile(self._assignments_path, dtype=np.int32)[:len(self.chunks)]
+                self._ivf_version = version
+                self._lists = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def vectors(self):
+        """Memory-mapped (chunks, dim) matrix of the stored vectors."""
+        if self._matrix is None or len(self._matrix) != len(self.chunks):
+            if not self.chunks:
+                return np.zeros((0, self.embedder.dim), dtype=np.float32)
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                     shape=(len(self.chunks), self.embedder.dim))
+        return self._matrix
+
+    def add(self, text, source=None, **metadata):
+        """Index ``text``, recording ``source`` and ``metadata`` with each chunk; returns how many chunks were new."""
+        chunks = {}
+        for chunk in chunk_text(text):
+            chunks.setdefault(hashlib.sha1(" ".join(chunk.split()).lower().encode('utf-8')).hexdigest(), chunk)
+        vectors = dict(zip(chunks, self.embedder.embed(list(chunks.values()))))
+        with self._lock, self._file_lock():
+            self._load()
+            new = [
+                {'id': len(self.chunks) + i, 'hash': digest, 'text': chunks[digest], 'source': source,
+                 'added': time.time(), **metadata}
+                for i, digest in enumerate(digest for digest in chunks if digest not in self._hashes)
+            ]
+            if not new:
+                return 0
+
+            with open(self._vectors_path, 'ab') as file:
+                file.write(np.stack([vectors[chunk['hash']] for chunk in new]).tobytes())
+            with open(self._chunks_path, 'ab') as file:
+                data = b''.join(json.dumps(chunk).encode('utf-8') + b'\n' for chunk in new)
+                file.write(data)
+            self._chunks_offset += len(data)
+            self.chunks.extend(new)
+            self._hashes.update(chunk['hash'] for chunk in new)
+            self._update_ivf()
+            if os.path.exists(self._ivf_path):
+                self._ivf_version = (os.stat(self._ivf_path).st_mtime_ns, os.path.getsize(self._assignments_path))
+            return len(new)
+
+    def _update_ivf(self):
+        count = len(self.chunks)
+        if count < self.ann_threshold:
+            return
+        if self.centroids is None or count >= 4 * self._trained:
+            self.train()
+            return
+        labels = _nearest(self.vectors()[len(self._assignments):], self.centroids)
+        with open(self._assignments_path, 'ab') as file:
+            file.write(labels.tobytes())
+        self._assignments = np.concatenate([self._assignments, labels])
+        self._lists = None
+
+    def train(self, sample=65536):
+        """(Re)build the inverted-file index over every stored vector."""
+        vectors = self.vectors()
+        count = len(vectors)
+        clusters = max(1, min(int(4 * np.sqrt(count)), count))
+        rng = np.random.default_rng(0)
+        training = vectors[np.sort(rng.choice(count, min(count, max(sample, 32 * clusters)), replace=False))]
+        self.centroids = _spherical_kmeans(np.asarray(training), clusters)
+        self._assignments = _nearest(vectors, self.centroids)
+        self._trained = count
+        self._assignments.tofile(self._assignments_path)
+        np.savez(self._ivf_path, centroids=self.centroids, trained=count)
+        self._lists = None
+
+    def _candidates(self, query):
+        if self.centroids is None or len(self.chunks) < self.ann_threshold:
+            return None
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind='stable')
+            bounds = np.searchsorted(self._assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+        probed = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+        candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probed])
+        # Chunks added after the last assignment was persisted are always scanned
+        unassigned = np.arange(len(self._assignments), len(self.chunks))
+        return np.sort(np.concatenate([candidates, unassigned]))
+
+    def search(self, query, k=5, min_score=0.0, source=None):
+        """The ``k`` chunks most similar to ``query``, best first, as dicts with a ``score``."""
+        with self._lock:
+            if not self.chunks:
+                return []
+            vector = self.embedder.embed([query])[0]
+            candidates = self._candidates(vector)
+            vectors = self.vectors()
+            if candidates is None:
+                candidates = np.arange(len(self.chunks))
+                scores = np.asarray(vectors @ vector)
+            else:
+                scores = np.asarray(vectors[candidates] @ vector)
+            if source is not None:
+                keep = np.array([self.chunks[i]['source'] == source for i in candidates], dtype=bool)
+                candidates, scores = candidates[keep], scores[keep]
+            top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+            top = top[np.argsort(scores[top])[::-1]]
+            return [
+                {**self.chunks[candidates[i]], 'score': float(scores[i])}
+                for i in top if scores[i] >= min_score
+            ]
+
+    def task_callback(self):
+        """Build a crewai ``Task(callback=...)`` that indexes the task's output under its agent's role."""
+        def callback(output):
+            self.add(output.raw_output, source=output.agent, task=output.description)
+        return callback
+
+
+class KnowledgeSearchSchema(BaseModel):
+    query: str = Field(..., description="What you want to know, in a sentence or a few keywords")
+    k: Optional[int] = Field(5, description="Number of findings to return")
+
+
+class KnowledgeSearchTool(BaseTool):
+    name: str = "Search prior findings"
+    description: str = (
+        "Searches the knowledge base of findings produced by earlier crew runs and returns the most relevant "
+        "passages with their source. Use it before researching or writing about a topic, and build on what "
+        "is already known instead of regenerating it."
+    )
+    args_schema: Type[BaseModel] = KnowledgeSearchSchema
+    index: Any = None
+    min_score: float = 0.2
+
+    def _run(self, query, k=5):
+        hits = self.index.search(query, k=k or 5, min_score=self.min_score)
+        if not hits:
+            return "No prior findings on this topic."
+        return "\n\n".join(f"[{hit['score']:.2f}] {hit['source'] or 'unknown'}: {hit['text']}" for hit in hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the crew knowledge index')
+    parser.add_argument('query')
+    parser.add_argument('-k', type=int, default=5, help='number of results')
+    parser.add_argument('--directory', default=KNOWLEDGE_INDEX_DIR, help='index directory')
+    args = parser.parse_args()
+
+    index = KnowledgeIndex(args.directory)
+    start = time.perf_counter()
+    hits = index.search(args.query, k=args.k)
+    elapsed = time.perf_counter() - start
+    for hit in hits:
+        print(f"[{hit['score']:.3f}] {hit['source']}: {hit['text'][:300]}")
+    print(f"{len(hits)} of {len(index)} chunks in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
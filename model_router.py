@@ -0,0 +1,304 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from context_compaction import count_tokens
+from groq_client import DEFAULT_MODEL
+from rate_limiter import default_limiter, named_limiter
+from tracing import _token_usage
+
+# Context window in tokens, and USD per million input and output tokens
+ModelSpec = namedtuple('ModelSpec', 'context_window input_cost output_cost')
+MODELS = {
+    'llama3-8b-8192': ModelSpec(8192, 0.05, 0.08),
+    'gemma-7b-it': ModelSpec(8192, 0.07, 0.07),
+    'mixtral-8x7b-32768': ModelSpec(32768, 0.24, 0.24),
+    'llama3-70b-8192': ModelSpec(8192, 0.59, 0.79),
+}
+SMALL_MODEL = os.getenv('ROUTER_SMALL_MODEL', DEFAULT_MODEL)
+LARGE_MODEL = os.getenv('ROUTER_LARGE_MODEL', 'llama3-70b-8192')
+LONG_CONTEXT_MODEL = os.getenv('ROUTER_LONG_CONTEXT_MODEL', 'mixtral-8x7b-32768')
+# Models to try, in order, when a route's model is saturated
+FALLBACKS = {
+    'llama3-8b-8192': ['gemma-7b-it', 'llama3-70b-8192'],
+    'gemma-7b-it': ['llama3-8b-8192', 'llama3-70b-8192'],
+    'llama3-70b-8192': ['mixtral-8x7b-32768', 'llama3-8b-8192'],
+    'mixtral-8x7b-32768': ['llama3-70b-8192'],
+}
+# A model whose rate limiter would hold a request back longer than this is saturated
+SATURATION_SECONDS = float(os.getenv('ROUTER_SATURATION_SECONDS', '5'))
+ROUTE_LOG = os.getenv('ROUTE_LOG', '.cache/routes.jsonl')
+
+# Tasks that call for reasoning rather than bookkeeping
+_HEAVY = re.compile(
+    r"\b(analy[sz]\w*|statistic\w*|insight\w*|interpret\w*|model(?:s|ing)?|algorithm\w*|machine learning|"
+    r"infer\w*|hypothes\w*|mechanism\w*|evaluat\w*)\b", re.IGNORECASE)
+# Expected outputs that run long
+_LONG_OUTPUT = re.compile(r"\b(comprehensive|detailed|report|newsletter|database|in-depth|full)\b", re.IGNORECASE)
+
+
+def parse_overrides(value):
+    """Per-agent models from ``Role=model,Other Role=model``."""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        role, _, model = item.partition('=')
+        overrides[role.strip()] = model.strip()
+    return overrides
+
+
+def model_limiter(model):
+    """
+    The process-wide RateLimiter of ``model``; Groq limits each model separately.
+
+    The default model keeps the default limiter, and every limiter has the
+    limits set by ``rate_limiter.configure_limiters`` and shares its
+    listeners, so a Tracer watching the default limiter counts every retry.
+    """
+    if model == DEFAULT_MODEL:
+        return default_limiter()
+    return named_limiter(model)
+
+
+class RoutingPolicy:
+    """
+    Chooses a model for a task from its size and the quality of past routes.
+
+    In order: an agent with an override gets its model; a prompt plus expected
+    output that would not fit the small model's window goes to the
+    long-context model; analytic tasks and those expected to produce long
+    output go to the large model, as do agents whose results on the small
+    model have scored below ``min_quality`` on average over at least
+    ``min_samples`` routes; everything else goes to the small model.
+    """
+
+    def __init__(self, small=SMALL_MODEL, large=LARGE_MODEL, long_context=LONG_CONTEXT_MODEL, overrides=None,
+                 long_output_tokens=1500, heavy_output_tokens=1024, min_quality=0.6, min_samples=3):
+        self.small = small
+        self.large = large
+        self.long_context = long_context
+        self.overrides = parse_overrides(os.getenv('ROUTER_OVERRIDES')) if overrides is None else overrides
+        self.long_output_tokens = long_output_tokens
+        self.heavy_output_tokens = heavy_output_tokens
+        self.min_quality = min_quality
+        self.min_samples = min_samples
+
+    def output_tokens(self, expected_output):
+        return self.long_output_tokens if _LONG_OUTPUT.search(expected_output or '') else 400
+
+    def choose(self, role, description, expected_output='', prompt_tokens=0, quality=None):
+        """``(model, reason)`` for a task of agent ``role``; ``quality`` maps models to the role's mean scores."""
+        if role in self.overrides:
+            return self.overrides[role], 'override'
+        output = self.output_tokens(expected_output)
+        if prompt_tokens + output > 0.9 * MODELS[self.small].context_window:
+            return self.long_context, 'context'
+        if _HEAVY.search(description) or output >= self.heavy_output_tokens:
+            return self.large, 'heavy'
+        mean, samples = (quality or {}).get(self.small, (1.0, 0))
+        if samples >= self.min_samples and mean < self.min_quality:
+            return self.large, 'quality'
+        return self.small, 'light'
+
+
+# Token usage of the LLM calls made for the route being executed in this context
+_route_usage = contextvars.ContextVar('route_usage', default=None)
+
+
+class _UsageHandler(BaseCallbackHandler):
+    def on_llm_end(self, response, **kwargs):
+        usage = _route_usage.get()
+        if usage is not None:
+            prompt, completion = _token_usage(response)
+            usage['prompt_tokens'] += prompt
+            usage['completion_tokens'] += completion
+
+
+def is_rate_limited(exc):
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status == 429 or 'rate limit' in str(exc).lower()
+
+
+class ModelRouter:
+    """
+    Routes each crewai task to a model chosen by a RoutingPolicy.
+
+    Before a task runs, its agent's LLM is swapped for one built by
+    ``llm_factory(model)`` (and given the callbacks of the agent's own LLM, so
+    tracing and streaming carry over), then restored. A model is saturated
+    when its rate limiter would hold the request back more than
+    ``saturation`` seconds, or for a minute after a task on it failed with a
+    rate-limit error; the route then falls back to the first unsaturated model
+    in ``fallbacks``, or the least saturated one, and a task that fails on a
+    rate limit is retried on its fallback. Every route is appended to
+    ``log_path`` as a JSON line with its model, reason, latency, tokens, cost
+    and a quality score, and the scores of earlier runs feed the policy.
+    Quality defaults to a proxy (0 for a failed task, low for a near-empty
+    answer); ``score`` records a real judgment instead.
+    """
+
+    def __init__(self, llm_factory, policy=None, fallbacks=FALLBACKS, saturation=SATURATION_SECONDS,
+                 log_path=ROUTE_LOG, cooldown=60.0):
+        self.llm_factory = llm_factory
+        self.policy = policy or RoutingPolicy()
+        self.fallbacks = fallbacks
+        self.saturation = saturation
+        self.log_path = log_path
+        self.cooldown = cooldown
+        self.routes = []
+        self._llms = {}
+        self._cooling = {}
+        self._agent_locks = {}
+        self._latest = {}
+        self._usage_handler = _UsageHandler()
+        self._lock = threading.Lock()
+        self._quality = defaultdict(list)
+        if log_path and os.path.exists(log_path):
+            latest = {}
+            with open(log_path) as file:
+                for line in file:
+                    if line.endswith('\n'):
+                        route = json.loads(line)
+                        scores = self._quality[route['agent'], route['model']]
+                        if route.get('rescored') and route['task'] in latest:
+                            scores[latest[route['task']]] = route['quality']
+                        else:
+                            latest[route['task']] = len(scores)
+                            scores.append(route['quality'])
+
+    def llm(self, model, home=None):
+        """The LLM for ``model``, carrying the callbacks of the agent's own LLM ``home``."""
+        with self._lock:
+            key = model, id(home)
+            if key not in self._llms:
+                llm = self.llm_factory(model)
+                llm.callbacks = list(getattr(home, 'callbacks', None) or []) + [self._usage_handler]
+                self._llms[key] = llm
+            return self._llms[key]
+
+    def quality(self, role):
+        """Mean quality score and route count of each model for agent ``role``."""
+        with self._lock:
+            return {model: (sum(scores) / len(scores), len(scores))
+                    for (agent, model), scores in self._quality.items() if agent == role and scores}
+
+    def _wait(self, model, tokens):
+        if self._cooling.get(model, 0) > time.monotonic():
+            return float('inf')
+        return model_limiter(model).expected_wait(tokens)
+
+    def route(self, role, description, expected_output='', prompt_tokens=0, exclude=()):
+        """``(model, reason, fallback_from)`` for a task, falling back from saturated models."""
+        model, reason = self.policy.choose(role, description, expected_output, prompt_tokens, self.quality(role))
+        if reason == 'override':
+            return model, reason, None
+        tokens = prompt_tokens + self.policy.output_tokens(expected_output)
+        candidates = [model] + [m for m in self.fallbacks.get(model, []) if m != model]
+        candidates = [m for m in candidates if m not in exclude] or candidates
+        waits = {}
+        for candidate in candidates:
+            spec = MODELS.get(candidate)
+            if candidate != model and spec is not None and tokens > 0.9 * spec.context_window:
+                continue
+            waits[candidate] = self._wait(candidate, tokens)
+            if waits[candidate] <= self.saturation:
+                break
+        chosen = min(waits, key=lambda candidate: (waits[candidate] > self.saturation, waits[candidate]))
+        return chosen, reason, (model if chosen != model else None)
+
+    def route_prompt(self, prompt, max_tokens=None):
+        """Model for a raw chat completion of ``prompt``."""
+        model, _, _ = self.route('', prompt, '', count_tokens(prompt) + (max_tokens or 0))
+        return model
+
+    def execute(self, name, task, context):
+        """Run crewai ``task`` (named ``name``) with ``context`` on the model routed to, and log the route."""
+        agent = task.agent
+        prompt_tokens = count_tokens(f"{task.description}\n{task.expected_output or ''}\n{context}")
+        exclude = []
+        with self._lock:
+            agent_lock = self._agent_locks.setdefault(id(agent), threading.Lock())
+        while True:
+            model, reason, fallback_from = self.route(agent.role, task.description, task.expected_output,
+                                                      prompt_tokens, exclude)
+            usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+            token = _route_usage.set(usage)
+            start = time.monotonic()
+            # An agent holds one LLM at a time, so its tasks take turns while it is swapped
+            with agent_lock:
+                home = agent.llm
+                agent.llm = self.llm(model, home)
+                try:
+                    output = task.execute(context=context)
+                except Exception as exc:
+                    self._log(name, agent.role, model, reason, fallback_from, time.monotonic() - start, usage,
+                              False, 0.0)
+                    if not is_rate_limited(exc) or len(exclude) >= len(self.fallbacks.get(model, [])):
+                        raise
+                    self._cooling[model] = time.monotonic() + self.cooldown
+                    exclude.append(model)
+                    continue
+                finally:
+                    agent.llm = home
+                    _route_usage.reset(token)
+            quality = 1.0 if count_tokens(output) >= 20 else 0.3
+            self._log(name, agent.role, model, reason, fallback_from, time.monotonic() - start, usage, True, quality)
+            return output
+
+    def _log(self, name, role, model, reason, fallback_from, seconds, usage, ok, quality):
+        spec = MODELS.get(model, ModelSpec(0, 0.0, 0.0))
+        route = {
+            'time': time.time(),
+            'task': name,
+            'agent': role,
+            'model': model,
+            'reason': reason,
+            'fallback_from': fallback_from,
+            'seconds': round(seconds, 3),
+            **usage,
+            'cost_usd': (usage['prompt_tokens'] * spec.input_cost + usage['completion_tokens'] * spec.output_cost) / 1e6,
+            'ok': ok,
+            'quality': quality,
+        }
+        with self._lock:
+            self.routes.append(route)
+            scores = self._quality[role, model]
+            self._latest[name] = route, scores, len(scores)
+            scores.append(quality)
+            self._write(route)
+
+    def _write(self, route):
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            with open(self.log_path, 'a') as file:
+                file.write(json.dumps(route) + '\n')
+
+    def score(self, name, quality):
+        """Replace the proxy quality of task ``name``'s latest route with a real score in [0, 1]."""
+        with self._lock:
+            if name in self._latest:
+                route, scores, index = self._latest[name]
+                route['quality'] = scores[index] = quality
+                self._write({**route, 'time': time.time(), 'rescored': True})
+
+    def summary(self):
+        totals = defaultdict(lambda: defaultdict(float))
+        for route in self.routes:
+            key = f"{route['model']} ({route['reason']}{', fallback' if route['fallback_from'] else ''}" \
+              f"{'' if route['ok'] else ', failed'})"
+            for metric in ('seconds', 'prompt_tokens', 'completion_tokens', 'cost_usd'):
+                totals[key][metric] += route[metric]
+            totals[key]['routes'] += 1
+        lines = ["Model routes:"]
+        for key, total in sorted(totals.items()):
+            tokens = total['prompt_tokens'] + total['completion_tokens']
+            lines.append(
+                f"  {key}: {int(total['routes'])} tasks, {total['seconds'] / total['routes']:.1f} s/task, "
+                f"{int(tokens)} tokens, ${total['cost_usd']:.4f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,245 @@
+import json
+import os
+from typing import Optional, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from pydantic import BaseModel, Field
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def write_sidecar(path, sfreq, channels, samples, dtype='float32', modality='eeg', layout='channels_first',
+                  offset=0, units=None):
+    """
+    Describe a raw binary recording with a JSON sidecar next to it.
+
+    ``layout`` is ``channels_first`` for files stored as (channels, samples) and
+    ``samples_first`` for interleaved (samples, channels) files; ``offset`` is
+    the number of header bytes to skip at the start of the binary file.
+    """
+    header = {
+        'modality': modality,
+        'sfreq': float(sfreq),
+        'channels': list(channels),
+        'samples': int(samples),
+        'dtype': np.dtype(dtype).str,
+        'layout': layout,
+        'offset': int(offset),
+        'units': units,
+    }
+    with open(sidecar_path(path), 'w') as file:
+        json.dump(header, file, indent=2)
+    return header
+
+
+class Recording:
+    """
+    A memory-mapped recording and its header.
+
+    Nothing is read from disk until samples are indexed: ``data`` is always a
+    (channels, samples) view of the mapped file, and ``window`` slices it by
+    time and channel without copying whenever the selection is contiguous.
+    ``sfreq`` is None when the header gives no sampling rate (a ``.npy``
+    without a sidecar); anything measured in seconds then needs one given.
+    """
+
+    def __init__(self, path, header, data=None):
+        self.path = path
+        self.header = header
+        self.sfreq = float(header['sfreq']) if header.get('sfreq') else None
+        self.channels = list(header['channels'])
+        self.modality = header.get('modality', 'eeg')
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            samples_first = self.header.get('layout', 'channels_first') == 'samples_first'
+            shape = (len(self.channels), self.header['samples'])
+            mapped = np.memmap(self.path, dtype=np.dtype(self.header['dtype']), mode='r',
+                               offset=self.header.get('offset', 0), shape=shape[::-1] if samples_first else shape)
+            self._data = mapped.T if samples_first else mapped
+        return self._data
+
+    @property
+    def n_samples(self):
+        return self.header['samples']
+
+    @property
+    def duration(self):
+        return self.n_samples / self.require_sfreq()
+
+    def require_sfreq(self, sfreq=None):
+        """``sfreq`` if given, else the header's sampling rate; a ValueError if neither is known."""
+        if sfreq:
+            return float(sfreq)
+        if self.sfreq is None:
+            raise ValueError(f"{os.path.basename(self.path)} has no sampling rate in its header; "
+                             "give its sampling_rate")
+        return self.sfreq
+
+    def channel_indices(self, channels=None):
+        """Indices of ``channels`` given by name or index; a slice when they form an evenly spaced run."""
+        if channels is None:
+            return slice(None)
+        indices = [self.channels.index(c) if isinstance(c, str) else int(c) for c in channels]
+        if len(indices) == 1:
+            return slice(indices[0], indices[0] + 1)
+        step = indices[1] - indices[0]
+        if step > 0 and indices == list(range(indices[0], indices[-1] + 1, step)):
+            return slice(indices[0], indices[-1] + 1, step)
+        return indices
+
+    def sample_range(self, start=None, stop=None):
+        if start is not None or stop is not None:
+            self.require_sfreq()
+        first = 0 if start is None else max(int(round(start * self.sfreq)), 0)
+        last = self.n_samples if stop is None else min(int(round(stop * self.sfreq)), self.n_samples)
+        return first, max(first, last)
+
+    def window(self, start=None, stop=None, channels=None):
+        """Samples between ``start`` and ``stop`` seconds for ``channels``, as a (channels, samples) array."""
+        first, last = self.sample_range(start, stop)
+        return self.data[self.channel_indices(channels), first:last]
+
+    def resampled_window(self, sfreq, start=None, stop=None, channels=None):
+        """
+        Like ``window`` but at ``sfreq``, computed from just the samples the window covers.
+
+        Upsampling interpolates linearly; downsampling first applies a boxcar
+        average over one output period to limit aliasing.
+        """
+        if sfreq == self.require_sfreq():
+            return np.asarray(self.window(start, stop, channels))
+        selection = self.channel_indices(channels)
+        start = 0.0 if start is None else max(start, 0.0)
+        stop = self.duration if stop is None else min(stop, self.duration)
+        times = start + np.arange(max(int(np.floor((stop - start) * sfreq)), 0)) / sfreq
+        if not len(times):
+            return np.empty((self.data[selection, :0].shape[0], 0))
+
+        width = max(int(round(self.sfreq / sfreq)), 1) if sfreq < self.sfreq else 1
+        position = times * self.sfreq
+        first = max(int(np.floor(position[0])) - width, 0)
+        last = min(int(np.ceil(position[-1])) + width + 1, self.n_samples)
+        source = np.asarray(self.data[selection, first:last], dtype=np.float64)
+
+        if width > 1:
+            padded = np.pad(source, ((0, 0), (width // 2, width - 1 - width // 2)), mode='edge')
+            cumulative = np.cumsum(np.pad(padded, ((0, 0), (1, 0))), axis=1)
+            source = (cumulative[:, width:] - cumulative[:, :-width]) / width
+
+        position = np.clip(position - first, 0, source.shape[1] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, source.shape[1] - 1)
+        fraction = position - lower
+        return source[:, lower] * (1 - fraction) + source[:, upper] * fraction
+
+    def describe(self):
+        timing = f"{self.sfreq:g} Hz, {self.duration:.1f} s" if self.sfreq else \
+            f"unknown sampling rate, {self.n_samples} samples"
+        return (
+            f"{os.path.basename(self.path)}: {self.modality}, {len(self.channels)} channels, "
+            f"{timing}, {np.dtype(self.header['dtype']).name}"
+        )
+
+
+def open_recording(path):
+    """Open a ``.npy`` array or a raw binary file with a JSON sidecar as a memory-mapped Recording."""
+    header = {}
+    if os.path.exists(sidecar_path(path)):
+        with open(sidecar_path(path)) as file:
+            header = json.load(file)
+
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+        header.setdefault('channels', [str(i) for i in range(data.shape[0])])
+        header.update(samples=data.shape[1], dtype=data.dtype.str, layout='channels_first')
+        return Recording(path, header, data)
+
+    if not header:
+        raise FileNotFoundError(f"No sidecar header {sidecar_path(path)} for raw recording {path}")
+    return Recording(path, header)
+
+
+class DataCatalog:
+    """
+    All recordings in a directory, harmonized to a common sample rate on access.
+
+    A recording is any ``.npy`` file or any file with a JSON sidecar. Windows are
+    resampled to ``sfreq`` only when they are read, so opening a catalog of
+    tens of gigabytes costs a directory listing and a few small JSON reads.
+    """
+
+    def __init__(self, directory, sfreq=None):
+        self.directory = directory
+        self.sfreq = sfreq
+        self._recordings = {}
+
+    def names(self):
+        names = set()
+        for entry in os.listdir(self.directory):
+            stem, extension = os.path.splitext(entry)
+            if extension == '.npy':
+                names.add(entry)
+            elif extension != '.json' and os.path.exists(os.path.join(self.directory, stem + '.json')):
+                names.add(entry)
+        return sorted(names)
+
+    def open(self, name):
+        if name not in self._recordings:
+            self._recordings[name] = open_recording(os.path.join(self.directory, name))
+        return self._recordings[name]
+
+    def window(self, name, start=None, stop=None, channels=None):
+        recording = self.open(name)
+        if self.sfreq is None:
+            return recording.window(start, stop, channels)
+        return recording.resampled_window(self.sfreq, start, stop, channels)
+
+
+class NeuralDataToolSchema(BaseModel):
+    recording: Optional[str] = Field(None, description="Recording file name; omit to list every recording")
+    start: Optional[float] = Field(None, description="Window start in seconds")
+    stop: Optional[float] = Field(None, description="Window end in seconds")
+    channels: Optional[str] = Field(None, description="Comma-separated channel names or indices")
+
+
+class NeuralDataTool(BaseTool):
+    name: str = "Neural data catalog"
+    description: str = (
+        "Lists the neural recordings (EEG, MEG, fMRI, ECoG, single-neuron) available for integration, or, "
+        "given a recording name and optional time window and channels, summarizes that window per channel "
+        "at the harmonized sample rate."
+    )
+    args_schema: Type[BaseModel] = NeuralDataToolSchema
+    data_dir: str
+    sfreq: Optional[float] = None
+
+    def _run(self, recording=None, start=None, stop=None, channels=None):
+        catalog = DataCatalog(self.data_dir, self.sfreq)
+        if not recording:
+            names = catalog.names()
+            if not names:
+                return f"No recordings found in {self.data_dir}"
+            return "\n".join(catalog.open(name).describe() for name in names)
+
+        info = catalog.open(recording)
+        selected = [c.strip() for c in channels.split(',')] if channels else None
+        if selected:
+            selected = [int(c) if c.isdigit() and c not in info.channels else c for c in selected]
+        try:
+            window = np.asarray(catalog.window(recording, start, stop, selected), dtype=np.float64)
+        except ValueError as exc:
+            return str(exc)
+        names = [info.channels[i] for i in np.arange(len(info.channels))[info.channel_indices(selected)]]
+        rate = self.sfreq or info.sfreq
+        extent = f"{window.shape[1] / rate:.2f} s at {rate:g} Hz" if rate else f"{window.shape[1]} samples"
+        lines = [f"{info.describe()}; window {extent}"]
+        for name, row in zip(names, window):
+            if row.size:
+                lines.append(f"{name}: mean {row.mean():.3g}, std {row.std():.3g}, min {row.min():.3g}, max {row.max():.3g}")
+        return "\n".join(lines)
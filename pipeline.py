@@ -0,0 +1,250 @@
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from task_graph import current_task, task_name
+
+# Smallest chunk of upstream output handed to a downstream stage, in characters
+PIPELINE_CHUNK_CHARS = int(os.getenv('PIPELINE_CHUNK_CHARS', '600'))
+# crewai agents stream their reasoning first; only what follows this marker is the task's output
+FINAL_ANSWER = 'Final Answer:'
+
+PART_NOTE = (
+    "\n\nThe context is part {part} of the input, handed over while the rest is still being produced. "
+    "Process only this part; the parts are combined afterwards."
+)
+RECONCILE_NOTE = (
+    "\n\nThe context holds your results for each part of the input, produced separately. Merge them into one "
+    "coherent final result: keep every distinct item, remove repetitions and make the structure consistent."
+)
+
+# A blank line, or a line break before a list item, ends an item of output
+_BOUNDARY = re.compile(r"\n[ \t]*\n|\n(?=[ \t]*(?:[-*+]|\d+[.)])\s)")
+
+
+def split_chunks(text, min_chars=PIPELINE_CHUNK_CHARS):
+    """Split ``text`` at item boundaries into chunks of at least ``min_chars`` (but the last)."""
+    chunks = []
+    Chunker(chunks.append, min_chars, marker=None).close(text)
+    return chunks
+
+
+class Chunker:
+    """
+    Cuts streamed text into chunks as it arrives.
+
+    Tokens are fed in as they are generated; a chunk is emitted at the first
+    item boundary (blank line or list item) past ``min_chars`` characters, so
+    a news item or a data source is handed on as soon as it is complete.
+    With a ``marker``, text is only chunked after it, skipping the agent's
+    reasoning that precedes its final answer. ``close`` emits the rest.
+    """
+
+    def __init__(self, emit, min_chars=PIPELINE_CHUNK_CHARS, marker=FINAL_ANSWER):
+        self.emit = emit
+        self.min_chars = min_chars
+        self.marker = marker
+        self.buffer = ''
+        self.position = None if marker else 0
+        self.emitted = 0
+
+    def feed(self, text):
+        self.buffer += text
+        if self.position is None:
+            found = self.buffer.find(self.marker)
+            if found < 0:
+                return
+            self.position = found + len(self.marker)
+        self._drain()
+
+    def _drain(self, final=False):
+        while True:
+            pending = self.buffer[self.position:]
+            cut = next((match.start() for match in _BOUNDARY.finditer(pending, self.min_chars)), None)
+            if cut is None and final:
+                cut = len(pending)
+            if cut is None:
+                return
+            self.position += cut
+            if pending[:cut].strip():
+                self.emit(pending[:cut].strip())
+                self.emitted += 1
+            if final and self.position >= len(self.buffer):
+                return
+
+    def close(self, output):
+        """Emit what is left; if nothing was streamed, chunk the task's ``output`` instead."""
+        if self.position is None or not self.emitted and not self.buffer[self.position:].strip():
+            self.buffer, self.position = output, 0
+        self._drain(final=True)
+
+
+class ChunkPipeline:
+    """
+    Runs a chain of crewai tasks as overlapping stages over chunks of output.
+
+    The first task's output is streamed through ``stream`` (a TokenStream
+    attached to the agents, whose LLM must stream) and cut into chunks by a
+    Chunker as it is generated. Every other task runs as its own stage, in its
+    own thread, once per chunk: chunk ``i`` of a stage is made from chunk
+    ``i`` of each of its upstream tasks, as soon as they exist. So the
+    collector's first items are being summarized while it is still writing
+    the rest, and the total time approaches that of the slowest stage rather
+    than the sum of all of them. The last task then reconciles its per-chunk
+    results in one final pass. ``dependencies`` are ``(task, [upstream
+    tasks])`` pairs as for ``run_crew_tasks``, and every task must depend,
+    directly or not, on the first. Later stages get rate-limiter priority, so
+    chunks drain through the pipeline instead of piling up. With a
+    CheckpointStore, each completed stage is saved, and on resume replayed as
+    chunks of its saved output. With a ModelRouter, every chunk is routed on
+    its own.
+    """
+
+    def __init__(self, tasks, dependencies, stream, checkpoint=None, tracer=None, compactor=None,
+                 min_chars=PIPELINE_CHUNK_CHARS, router=None):
+        self.tasks = tasks
+        self.names = [task_name(index, task) for index, task in enumerate(tasks)]
+        names = {id(task): name for task, name in zip(tasks, self.names)}
+        self.upstream = {name: [] for name in self.names}
+        for task, upstream in dependencies:
+            self.upstream[names[id(task)]] = [names[id(dep)] for dep in upstream]
+        for index, name in enumerate(self.names):
+            if bool(index) != bool(self.upstream[name]) or any(
+                    self.names.index(dep) >= index for dep in self.upstream[name]):
+                raise ValueError(f"Task {name} does not fit a pipeline fed by {self.names[0]}")
+
+        self.stream = stream
+        self.checkpoint = checkpoint
+        self.tracer = tracer
+        self.compactor = compactor
+        self.min_chars = min_chars
+        self.router = router
+        self.chunks = {name: [] for name in self.names}
+        self.done = set()
+        self.failed = False
+        self.result = None
+        self._condition = threading.Condition()
+
+    def _emit(self, name, chunk):
+        with self._condition:
+            self.chunks[name].append(chunk)
+            self._condition.notify_all()
+
+    def _finish(self, name, failed=False):
+        with self._condition:
+            self.done.add(name)
+            self.failed = self.failed or failed
+            self._condition.notify_all()
+
+    def _inputs(self, name, index):
+        """Chunk ``index`` of each upstream task, waiting for them; None once the upstream tasks are exhausted."""
+        with self._condition:
+            while True:
+                if self.failed:
+                    return None
+                upstream = self.upstream[name]
+                ready = {dep: self.chunks[dep][index] for dep in upstream if len(self.chunks[dep]) > index}
+                if all(dep in ready or dep in self.done for dep in upstream):
+                    return ready or None
+                self._condition.wait()
+
+    def _execute(self, task, name, label, context, note, rank):
+        from rate_limiter import priority as request_priority
+
+        description = task.description
+        task.description = description + note
+        token = current_task.set(name)
+        span = self.tracer.span('task', label, agent=task.agent.role) if self.tracer else nullcontext()
+        try:
+            with request_priority(rank), span:
+                if self.router is None:
+                    return task.execute(context=context)
+                return self.router.execute(label, task, context)
+        finally:
+            current_task.reset(token)
+            task.description = description
+
+    def _replay(self, task, name):
+        record = self.checkpoint.load(name, task.description) if self.checkpoint is not None else None
+        if record is not None:
+            print(f"Replaying {name} from checkpoint {self.checkpoint.run_id}")
+        return record
+
+    def _run_source(self, task, name):
+        record = self._replay(task, name)
+        if record is not None:
+            for chunk in split_chunks(record['output'], self.min_chars):
+                self._emit(name, chunk)
+            return
+
+        chunker = Chunker(lambda chunk: self._emit(name, chunk), self.min_chars)
+
+        def collect(event):
+            if event.kind == 'token' and event.task == name:
+                chunker.feed(event.text)
+
+        self.stream.subscribe(collect)
+        try:
+            output = self._execute(task, name, name, '', '', 0)
+        finally:
+            self.stream.unsubscribe(collect)
+        chunker.close(output)
+        if self.checkpoint is not None:
+            self.checkpoint.save(name, task.description, output, '')
+
+    def _run_stage(self, task, name, rank):
+        last = rank == len(self.tasks) - 1
+        record = self._replay(task, name)
+        if record is not None:
+            if last:
+                self.result = record['output']
+            else:
+                for chunk in split_chunks(record['output'], self.min_chars):
+                    self._emit(name, chunk)
+            return
+
+        outputs = []
+        while (upstream := self._inputs(name, len(outputs))) is not None:
+            output = self._execute(task, name, f"{name}#{len(outputs)}", "\n\n".join(upstream.values()),
+                                   PART_NOTE.format(part=len(outputs) + 1), rank)
+            outputs.append(output)
+            if not last:
+                self._emit(name, output)
+        if self.failed:
+            return
+
+        context = ''
+        if not last or len(outputs) == 1:
+            output = "\n\n".join(outputs)
+        else:
+            parts = {f"part {index + 1}": part for index, part in enumerate(outputs)}
+            context = self.compactor.compact(name, task.description, parts) if self.compactor else \
+                "\n\n".join(parts.values())
+            output = self._execute(task, name, f"{name}#reconcile", context, RECONCILE_NOTE, rank)
+        if last:
+            self.result = output
+        if self.checkpoint is not None:
+            self.checkpoint.save(name, task.description, output, context)
+
+    def _run(self, index):
+        task, name = self.tasks[index], self.names[index]
+        try:
+            if index == 0:
+                self._run_source(task, name)
+            else:
+                self._run_stage(task, name, index)
+        except BaseException:
+            self._finish(name, failed=True)
+            raise
+        self._finish(name)
+
+    def run(self):
+        """Run every stage and return the last task's reconciled output."""
+        with ThreadPoolExecutor(max_workers=len(self.tasks)) as pool:
+            stages = [pool.submit(contextvars.copy_context().run, self._run, index) for index in range(len(self.tasks))]
+            for stage in stages:
+                stage.result()
+        return self.result
@@ -0,0 +1,297 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+GROQ_RPM = float(os.getenv('GROQ_RPM', '30'))
+GROQ_TPM = float(os.getenv('GROQ_TPM', '30000'))
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '6'))
+
+# Scheduling priority of requests made from the current context; higher goes first
+request_priority = contextvars.ContextVar('request_priority', default=0)
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value):
+    """Seconds in a rate-limit reset header such as ``2m59.56s``, ``7.66s`` or ``120ms``."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        matches = _DURATION.findall(value)
+        return sum(float(amount) * _UNITS[unit] for amount, unit in matches) if matches else None
+
+
+@contextmanager
+def priority(value):
+    token = request_priority.set(value)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class _Bucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for one API quota, shared by every client in the process.
+
+    Separate buckets enforce the requests-per-minute and tokens-per-minute
+    budgets. Waiting requests are admitted strictly by priority (then arrival
+    order), so critical-path tasks are not starved by bulk work. Rate-limit
+    response headers pull the local token estimate down to what the server
+    reports, and a 429 or ``retry-after`` pauses every caller, not just the one
+    that was rejected, so the process settles at the quota ceiling instead of
+    bursting into it repeatedly. Each retry calls every one of ``listeners``.
+    """
+
+    def __init__(self, requests_per_minute=GROQ_RPM, tokens_per_minute=GROQ_TPM, max_retries=GROQ_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0):
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.blocked_until = 0.0
+        self.listeners = []
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _enqueue(self, priority):
+        ticket = (-priority, next(self._sequence))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _try_acquire(self, ticket, tokens):
+        """Admit ``ticket`` if it is first in line and the budgets allow; otherwise return seconds to wait."""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        if self._waiting[0] != ticket:
+            return 0.05
+        wait = max(self.blocked_until - now, self.requests.wait_for(1), self.tokens.wait_for(tokens))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        self.requests.level -= 1
+        self.tokens.level -= min(tokens, self.tokens.capacity)
+        return 0.0
+
+    def _abandon(self, ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._condition.notify_all()
+
+    def acquire(self, tokens, priority=None):
+        with self._condition:
+            ticket = self._enqueue(request_priority.get() if priority is None else priority)
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, tokens)
+                    if not wait:
+                        self._condition.notify_all()
+                        return
+                    self._condition.wait(wait)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, tokens, priority=None):
+        with self._condition:
+            ticket = self._enqueue(request_priority.get() if priority is None else priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(ticket, tokens)
+                    if not wait:
+                        self._condition.notify_all()
+                        return
+                    first = self._waiting[0] == ticket
+                await asyncio.sleep(wait if first else min(wait, 0.05))
+        except BaseException:
+            with self._condition:
+                self._abandon(ticket)
+            raise
+
+    def expected_wait(self, tokens):
+        """Rough seconds a new request of ``tokens`` would wait, behind the requests already queued."""
+        with self._condition:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return max(self.blocked_until - now, self.requests.wait_for(len(self._waiting) + 1),
+                       self.tokens.wait_for(tokens))
+
+    def update(self, headers):
+        """Adapt to ``x-ratelimit-*`` headers from a response."""
+        with self._condition:
+            now = time.monotonic()
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            if remaining_tokens is not None:
+                self.tokens.refill(now)
+                self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+            if headers.get('x-ratelimit-remaining-requests') == '0':
+                reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+                if reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+    def retry_delay(self, headers, attempt):
+        """Delay before retry ``attempt``: the server's ``retry-after`` if given, else jittered exponential backoff."""
+        delay = parse_duration(headers.get('retry-after')) or parse_duration(headers.get('x-ratelimit-reset-tokens'))
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        with self._condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        for listener in self.listeners:
+            listener()
+        return delay
+
+
+def estimate_tokens(request):
+    """Rough token cost of a chat-completions request: prompt bytes / 4 plus the completion budget."""
+    content = request.content or b''
+    completion = 256
+    try:
+        completion = json.loads(content).get('max_tokens') or completion
+    except (ValueError, AttributeError):
+        pass
+    return len(content) // 4 + completion
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+_limiter_options = {}
+_named_limiters = {}
+
+
+def _default():
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = RateLimiter(**_limiter_options)
+    return _default_limiter
+
+
+def default_limiter():
+    """The process-wide limiter for the Groq quota."""
+    with _default_limiter_lock:
+        return _default()
+
+
+def named_limiter(name):
+    """
+    The process-wide limiter of the separate quota ``name``, such as a
+    model's, with the configured limits. It shares the default limiter's
+    listeners, so whatever watches the default limiter sees its retries too.
+    """
+    with _default_limiter_lock:
+        if name not in _named_limiters:
+            limiter = RateLimiter(**_limiter_options)
+            limiter.listeners = _default().listeners
+            _named_limiters[name] = limiter
+        return _named_limiters[name]
+
+
+def configure_limiters(requests_per_minute=GROQ_RPM, tokens_per_minute=GROQ_TPM, quota_share=1.0, **options):
+    """
+    Set the limits of every limiter of the process, the default one and the
+    named ones, to ``quota_share`` of the given quotas; ``options`` are passed
+    on to RateLimiter. The limiters are replaced, so configure them before
+    building clients. Returns the new default limiter.
+    """
+    global _default_limiter
+    with _default_limiter_lock:
+        _limiter_options.clear()
+        _limiter_options.update(requests_per_minute=requests_per_minute * quota_share,
+                                tokens_per_minute=tokens_per_minute * quota_share, **options)
+        _default_limiter = None
+        _named_limiters.clear()
+        return _default()
+
+
+def _should_retry(response):
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that admits requests through a RateLimiter and retries 429s and 5xx with backoff."""
+
+    def __init__(self, limiter=None, transport=None):
+        self.limiter = limiter or default_limiter()
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            response = self.transport.handle_request(request)
+            self.limiter.update(response.headers)
+            if not _should_retry(response) or attempt >= self.limiter.max_retries:
+                return response
+            response.read()
+            response.close()
+            time.sleep(self.limiter.retry_delay(response.headers, attempt))
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Asyncio counterpart of RateLimitedTransport."""
+
+    def __init__(self, limiter=None, transport=None, **transport_options):
+        self.limiter = limiter or default_limiter()
+        self.transport = transport or httpx.AsyncHTTPTransport(**transport_options)
+
+    async def handle_async_request(self, request):
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            await self.limiter.acquire_async(tokens)
+            response = await self.transport.handle_async_request(request)
+            self.limiter.update(response.headers)
+            if not _should_retry(response) or attempt >= self.limiter.max_retries:
+                return response
+            await response.aread()
+            await response.aclose()
+            await asyncio.sleep(self.limiter.retry_delay(response.headers, attempt))
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def rate_limited_client(limiter=None, **client_options):
+    """An ``httpx.Client`` for ``Groq(http_client=...)`` / ``ChatGroq(http_client=...)`` sharing the limiter."""
+    return httpx.Client(transport=RateLimitedTransport(limiter), **client_options)
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.cache/llm_responses.sqlite')
+CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '0')) or None
+CACHE_BYPASS = os.getenv('LLM_CACHE_BYPASS', '') not in ('', '0')
+
+
+def cache_key(model, temperature, messages, tools=None):
+    """Content address of a chat request: a hash of everything that determines the answer."""
+    payload = json.dumps(
+        {'model': model, 'temperature': temperature, 'messages': messages, 'tools': tools},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent key/value store for LLM responses, backed by a SQLite file.
+
+    Entries older than ``ttl`` seconds are treated as missing, and once more than
+    ``max_entries`` are stored the least recently used ones are evicted. With
+    ``bypass`` set, lookups always miss but fresh responses are still written, so
+    a bypassed run refreshes the cache for the next one. Every lookup calls each
+    of ``listeners`` with whether it hit. A process forked from the one that
+    opened the cache reopens the database on first use rather than sharing the
+    parent's connection.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, bypass=CACHE_BYPASS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.listeners = []
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    @property
+    def _db(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._connection
+
+    def get(self, key):
+        value = self._get(key)
+        for listener in self.listeners:
+            listener(value is not None)
+        return value
+
+    def _get(self, key):
+        with self._lock:
+            if self.bypass:
+                self.misses += 1
+                return None
+            row = self._db.execute('SELECT value, created FROM entries WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, now, now),
+            )
+            self._evict()
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for ``key``, calling ``compute()`` and storing its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _evict(self):
+        (count,) = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)',
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def summary(self):
+        stats = self.stats()
+        return f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries in {self.path}"
+
+
+class LangChainResponseCache(BaseCache):
+    """
+    Adapter exposing a ResponseCache as a LangChain cache, for ``ChatGroq(cache=...)``.
+
+    LangChain's ``llm_string`` already encodes the model, temperature and bound
+    tools, and ``prompt`` the serialized messages, so together they form the key.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _key(self, prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        value = self.cache.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        return [loads(generation) for generation in json.loads(value)]
+
+    def update(self, prompt, llm_string, return_val):
+        value = json.dumps([dumps(generation) for generation in return_val])
+        self.cache.set(self._key(prompt, llm_string), value)
+
+    def clear(self, **kwargs):
+        self.cache.clear()
@@ -0,0 +1,325 @@
+import csv
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+
+import numpy as np
+
+RESULTS_DIR = os.getenv('RESULTS_DIR', '.results')
+RESULT_BATCH_SIZE = int(os.getenv('RESULT_BATCH_SIZE', '16'))
+EXPORT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.sqlite': 'sqlite', '.db': 'sqlite'}
+
+_URL = re.compile(r"https?://[^\s)\]>\"'`]+")
+
+
+def cited_sources(text):
+    """URLs cited in ``text``, in order of first appearance."""
+    return list(dict.fromkeys(url.rstrip('.,;:') for url in _URL.findall(text or '')))
+
+
+@dataclass
+class TaskRecord:
+    """Outcome of one crewai task in one run."""
+
+    run_id: str
+    task: str
+    agent: str
+    description: str
+    output: str
+    sources: str
+    started: float
+    finished: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_calls: int = 0
+    tool_calls: int = 0
+    replayed: bool = False
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+    @classmethod
+    def from_task(cls, run_id, name, task, output, started, finished, metrics=None, replayed=False):
+        """Record of crewai ``task``, run as ``name``, from its output and Tracer span metrics."""
+        metrics = metrics or {}
+        return cls(
+            run_id=run_id,
+            task=name,
+            agent=task.agent.role if task.agent is not None else '',
+            description=task.description,
+            output=output,
+            sources="\n".join(cited_sources(output)),
+            started=started,
+            finished=finished,
+            prompt_tokens=int(metrics.get('prompt_tokens', 0)),
+            completion_tokens=int(metrics.get('completion_tokens', 0)),
+            llm_calls=int(metrics.get('llm_calls', 0)),
+            tool_calls=int(metrics.get('tool_calls', 0)),
+            replayed=replayed,
+        )
+
+
+COLUMNS = [(field.name, field.type) for field in fields(TaskRecord)]
+_DTYPES = {int: np.int64, float: np.float64, bool: np.bool_}
+
+
+def _encode(records):
+    """Column arrays for ``records``; strings as Arrow-style UTF-8 data plus int64 offsets."""
+    arrays = {}
+    for name, kind in COLUMNS:
+        values = [getattr(record, name) for record in records]
+        if kind is str:
+            encoded = [value.encode('utf-8') for value in values]
+            arrays[f'{name}.offsets'] = np.concatenate([[0], np.cumsum([len(value) for value in encoded])]).astype(np.int64)
+            arrays[f'{name}.data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        else:
+            arrays[name] = np.asarray(values, dtype=_DTYPES[kind])
+    return arrays
+
+
+class Segment:
+    """One immutable segment of a ResultStore, read column by column."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.rows = len(arrays['started'])
+
+    def column(self, name):
+        """Numeric columns as arrays, string columns as lists of str."""
+        if name in self.arrays:
+            return self.arrays[name]
+        offsets, data = self.arrays[f'{name}.offsets'], self.arrays[f'{name}.data'].tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.rows)]
+
+    def mask(self, run_id=None):
+        if run_id is None:
+            return np.ones(self.rows, dtype=bool)
+        return np.array([value == run_id for value in self.column('run_id')], dtype=bool)
+
+
+class ResultStore:
+    """
+    Append-only columnar store of TaskRecords.
+
+    Records are buffered and written every ``batch_size`` records, and on
+    ``flush``, as an immutable segment: one ``.npz`` file holding a column per
+    field, with strings laid out as in Arrow (UTF-8 bytes plus offsets).
+    Segments are written to a temporary name and renamed, so readers never see
+    a partial segment, and named by their creation time and a random suffix,
+    so writers sharing the directory (forked jobs, concurrent runs) never
+    replace each other's. A task already recorded for a run is not recorded again,
+    so replaying a resumed run does not duplicate its results. Exports stream
+    one segment at a time to CSV, Parquet (requires pyarrow) or SQLite, so
+    their memory use does not grow with the number of results; ``follow`` keeps
+    an export up to date as segments are written, so an interrupted run still
+    leaves the results of its finished tasks in it.
+    """
+
+    def __init__(self, directory=RESULTS_DIR, batch_size=RESULT_BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self._buffer = []
+        self._keys = None
+        self._following = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment-*.npz')))
+
+    def append(self, record):
+        """Buffer ``record``; returns False if its run already has a record for the task."""
+        with self._lock:
+            if self._keys is None:
+                self._keys = {
+                    key for segment in self._read_segments()
+                    for key in zip(segment.column('run_id'), segment.column('task'))
+                }
+            key = (record.run_id, record.task)
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+            return True
+
+    def record_task(self, run_id, name, task, output, started, finished, metrics=None, replayed=False):
+        """Append the TaskRecord of a crewai task; see ``TaskRecord.from_task``."""
+        return self.append(TaskRecord.from_task(run_id, name, task, output, started, finished, metrics, replayed))
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        path = os.path.join(self.directory, f"segment-{time.time_ns():020d}-{uuid.uuid4().hex[:12]}.npz")
+        arrays = _encode(self._buffer)
+        with open(path + '.tmp', 'wb') as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        self._buffer = []
+        if self._following is not None:
+            self._export_segment(Segment(arrays))
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    close = flush
+
+    def _read_segments(self):
+        for path in self.segment_paths():
+            with np.load(path) as data:
+                yield Segment({name: data[name] for name in data.files})
+
+    def segments(self, run_id=None):
+        """``(segment, mask)`` for every segment holding records of ``run_id`` (of every run if None)."""
+        self.flush()
+        return self._segments(run_id)
+
+    def _segments(self, run_id):
+        for segment in self._read_segments():
+            mask = segment.mask(run_id)
+            if mask.any():
+                yield segment, mask
+
+    def records(self, run_id=None):
+        self.flush()
+        return self._records(self._segments(run_id))
+
+    @staticmethod
+    def _records(segments):
+        for segment, mask in segments:
+            columns = {name: segment.column(name) for name, _ in COLUMNS}
+            for row in np.flatnonzero(mask):
+                yield TaskRecord(**{name: kind(columns[name][row]) for name, kind in COLUMNS})
+
+    def rows(self, run_id=None):
+        """Records as dicts, with their ``duration``."""
+        for record in self.records(run_id):
+            yield {**asdict(record), 'duration': record.duration}
+
+    def export(self, path, format=None, run_id=None):
+        """Write the records of ``run_id`` to ``path``, in the format its extension implies; returns the row count."""
+        format = _export_format(path, format)
+        with self._lock:
+            self._flush()
+            return self._export(path, format, run_id)
+
+    def follow(self, path, format=None, run_id=None):
+        """
+        Export the records of ``run_id`` to ``path`` now, and again each time a
+        segment is written: CSV and SQLite exports get the segment's records
+        appended, Parquet files, which cannot be appended to, are rewritten.
+        Returns the row count of the first export.
+        """
+        format = _export_format(path, format)
+        with self._lock:
+            self._flush()
+            rows = self._export(path, format, run_id)
+            self._following = (path, format, run_id)
+        return rows
+
+    def _export(self, path, format, run_id):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        rows = getattr(self, f'_export_{format}')(path + '.tmp', self._segments(run_id))
+        os.replace(path + '.tmp', path)
+        return rows
+
+    def _export_segment(self, segment):
+        path, format, run_id = self._following
+        if format == 'parquet':
+            self._export(path, format, run_id)
+            return
+        mask = segment.mask(run_id)
+        if mask.any():
+            getattr(self, f'_export_{format}')(path, [(segment, mask)], append=True)
+
+    def _export_csv(self, path, segments, append=False):
+        rows = 0
+        with open(path, 'a' if append else 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=[name for name, _ in COLUMNS] + ['duration'])
+            if not append:
+                writer.writeheader()
+            for record in self._records(segments):
+                writer.writerow({**asdict(record), 'duration': record.duration})
+                rows += 1
+            file.flush()
+            os.fsync(file.fileno())
+        return rows
+
+    def _export_parquet(self, path, segments):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = 0
+        writer = None
+        try:
+            for segment, mask in segments:
+                columns = {}
+                for name, kind in COLUMNS:
+                    if kind is str:
+                        offsets, data = segment.arrays[f'{name}.offsets'], segment.arrays[f'{name}.data']
+                        columns[name] = pa.LargeStringArray.from_buffers(
+                            segment.rows, pa.py_buffer(offsets), pa.py_buffer(data)
+                        )
+                    else:
+                        columns[name] = pa.array(segment.arrays[name])
+                columns['duration'] = pa.array(segment.arrays['finished'] - segment.arrays['started'])
+                table = pa.table(columns).filter(pa.array(mask))
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            schema = pa.schema([(name, pa.large_string() if kind is str else pa.from_numpy_dtype(_DTYPES[kind]))
+                                for name, kind in COLUMNS] + [('duration', pa.float64())])
+            pq.write_table(schema.empty_table(), path)
+        return rows
+
+    def _export_sqlite(self, path, segments, append=False):
+        types = {str: 'TEXT', int: 'INTEGER', float: 'REAL', bool: 'INTEGER'}
+        names = [name for name, _ in COLUMNS] + ['duration']
+        db = sqlite3.connect(path)
+        try:
+            if not append:
+                columns = ", ".join(f"{name} {types[kind]}" for name, kind in COLUMNS)
+                db.execute(f"CREATE TABLE task_results ({columns}, duration REAL, PRIMARY KEY (run_id, task))")
+            rows = 0
+            for segment, mask in segments:
+                data = {name: segment.column(name) for name, _ in COLUMNS}
+                data['duration'] = segment.arrays['finished'] - segment.arrays['started']
+                selected = np.flatnonzero(mask)
+                db.executemany(
+                    f"INSERT INTO task_results ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                    ([_sql_value(data[name][row]) for name in names] for row in selected),
+                )
+                rows += len(selected)
+            db.commit()
+        finally:
+            db.close()
+        return rows
+
+
+def _export_format(path, format=None):
+    format = format or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if format not in EXPORT_FORMATS.values():
+        raise ValueError(f"Unsupported export format for {path}; use one of {', '.join(EXPORT_FORMATS)}")
+    return format
+
+
+def _sql_value(value):
+    return value.item() if isinstance(value, np.generic) else value
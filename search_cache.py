@@ -0,0 +1,133 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Type
+
+from crewai_tools import BaseTool
+from pydantic import BaseModel, Field
+
+from response_cache import ResponseCache
+
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', '.cache/search_results.sqlite')
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', str(7 * 24 * 3600)))
+
+
+def normalize_query(query):
+    """Case-fold, drop surrounding punctuation and collapse whitespace, so near-identical queries share a result."""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return query.strip(' ?!.,;:')
+
+
+class SearchCache:
+    """
+    Memoizing front for a search backend.
+
+    Queries are normalized before lookup. Results live in an in-memory LRU with
+    expiry and, when a ``store`` is given, in a persistent ResponseCache shared
+    between runs. Concurrent lookups of the same query while it is in flight wait
+    for the one outstanding backend request instead of issuing their own. Every
+    lookup calls each of ``listeners`` with whether it was served without a
+    backend request.
+    """
+
+    def __init__(self, search, max_entries=1024, ttl=SEARCH_CACHE_TTL, store=None):
+        self.search = search
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.listeners = []
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, query):
+        result, hit = self._lookup(query)
+        for listener in self.listeners:
+            listener(hit)
+        return result
+
+    def _lookup(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.time() - entry[0] <= self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], True
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = self.store.get(key) if self.store is not None else None
+            hit = result is not None
+            if not hit:
+                result = self.search(query)
+                if self.store is not None:
+                    self.store.set(key, result)
+                with self._lock:
+                    self.misses += 1
+            else:
+                with self._lock:
+                    self.hits += 1
+            self._remember(key, result)
+            future.set_result(result)
+            return result, hit
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def summary(self):
+        return f"Search cache: {self.hits} hits, {self.misses} misses, {self.coalesced} coalesced"
+
+
+class SearchQuerySchema(BaseModel):
+    search_query: str = Field(..., description="Mandatory search query you want to use to search the internet")
+
+
+class CachedSearchTool(BaseTool):
+    name: str = "Search the internet"
+    description: str = "A tool that can be used to search the internet with a search_query."
+    args_schema: Type[BaseModel] = SearchQuerySchema
+    search_cache: Any = None
+
+    def _run(self, **kwargs):
+        query = kwargs.get('search_query') or kwargs.get('query')
+        return self.search_cache.lookup(query)
+
+
+def cached_search_tool(tool, path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL, max_entries=1024):
+    """Wrap a search tool such as SerperDevTool in a persistent, coalescing SearchCache."""
+    store = ResponseCache(path, ttl=ttl) if path else None
+    return CachedSearchTool(
+        name=tool.name,
+        description=tool.description,
+        search_cache=SearchCache(
+            lambda query: tool.run(search_query=query),
+            max_entries=max_entries,
+            ttl=ttl,
+            store=store,
+        ),
+    )
@@ -0,0 +1,272 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import re
+import secrets
+import traceback
+from collections import namedtuple
+from multiprocessing.managers import BaseManager
+
+SHARD_AUTHKEY = os.getenv('SHARD_AUTHKEY')
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', str(os.cpu_count() or 1)))
+LOOPBACK = ('127.0.0.1', 'localhost', '::1')
+
+# One unit of work: the tasks ``tasks`` (by name) of ``crew``, focused on ``project``
+Shard = namedtuple('Shard', 'index name crew project tasks')
+# ``outputs`` maps task names to outputs; ``error`` is the worker's traceback if the shard failed
+ShardResult = namedtuple('ShardResult', 'shard outputs records error')
+
+
+def independent_groups(tasks, dependencies):
+    """Names of the tasks of each connected component of the dependency graph, in task order."""
+    from task_graph import task_name
+
+    names = [task_name(index, task) for index, task in enumerate(tasks)]
+    ids = {id(task): name for task, name in zip(tasks, names)}
+    parent = {name: name for name in names}
+
+    def root(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for task, upstream in dependencies:
+        for dep in upstream:
+            parent[root(ids[id(dep)])] = root(ids[id(task)])
+
+    groups = {}
+    for name in names:
+        groups.setdefault(root(name), []).append(name)
+    return list(groups.values())
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:60] or "project"
+
+
+def plan_shards(crew, tasks, dependencies, projects):
+    """One Shard per independent task group of the crew and per project, in that order."""
+    groups = independent_groups(tasks, dependencies)
+    shards, slugs = [], set()
+    for project in projects:
+        slug = _slug(project)
+        if slug in slugs:
+            slug = f"{slug}-{len(slugs)}"
+        slugs.add(slug)
+        for number, group in enumerate(groups):
+            name = slug if len(groups) == 1 else f"{slug}-{number}"
+            shards.append(Shard(len(shards), name, crew, project, tuple(group)))
+    return shards
+
+
+_jobs = queue.Queue()
+_results = queue.Queue()
+
+
+def _job_queue():
+    return _jobs
+
+
+def _result_queue():
+    return _results
+
+
+class ShardQueue(BaseManager):
+    """Job and result queues shared over TCP by a ShardExecutor and its workers."""
+
+
+ShardQueue.register('jobs', callable=_job_queue)
+ShardQueue.register('results', callable=_result_queue)
+
+
+class _ShardRecords(list):
+    """
+    Stand-in for a ResultStore collecting the TaskRecords of a shard, under
+    the coordinator's run id and the crew's own task names prefixed with the
+    shard's, so the coordinator can append them to its store as they are.
+    """
+
+    def __init__(self, run_id, shard, names):
+        super().__init__()
+        self.run_id = run_id
+        self.prefix = shard.name
+        self.names = names
+
+    def record_task(self, run_id, name, task, output, started, finished, metrics=None, replayed=False):
+        from result_store import TaskRecord
+
+        self.append(TaskRecord.from_task(self.run_id, f"{self.prefix}/{self.names[name]}", task, output,
+                                         started, finished, metrics, replayed))
+
+    def flush(self):
+        pass
+
+
+def run_shard(shard, run_id, crews):
+    """
+    Run ``shard`` in this process and return its ShardResult.
+
+    ``crews`` caches the crew scripts this worker has loaded, with the Tracer
+    and ContextCompactor of each; ``shard.crew`` is a crew name or a script
+    path, as ``load_script`` takes. A crew script must define
+    ``project_tasks(project)``, returning its tasks focused on ``project`` and
+    their dependencies; a ``router`` it defines routes the tasks to models.
+    """
+    from checkpoint import CheckpointStore
+    from context_compaction import ContextCompactor
+    from crew_worker import load_script
+    from task_graph import run_crew_tasks, task_name
+    from tracing import Tracer
+
+    if shard.crew not in crews:
+        crews[shard.crew] = (load_script(shard.crew), Tracer(), ContextCompactor())
+    module, tracer, compactor = crews[shard.crew]
+
+    tasks, dependencies = module.project_tasks(shard.project)
+    names = {id(task): task_name(index, task) for index, task in enumerate(tasks)}
+    selected = [task for task in tasks if names[id(task)] in shard.tasks]
+    chosen = {id(task) for task in selected}
+    for task in selected:
+        # Task callbacks write to stores shared with other workers; the coordinator aggregates instead
+        task.callback = None
+    tracer.instrument(module.agents, selected)
+
+    records = _ShardRecords(run_id, shard, {task_name(index, task): names[id(task)]
+                                            for index, task in enumerate(selected)})
+    outputs = run_crew_tasks(
+        selected,
+        [(task, upstream) for task, upstream in dependencies if id(task) in chosen],
+        checkpoint=CheckpointStore(os.path.join(run_id, shard.name)),
+        tracer=tracer,
+        compactor=compactor,
+        results=records,
+        router=getattr(module, 'router', None),
+    )
+    outputs = {names[id(task)]: output for task, output in zip(selected, outputs)}
+    return ShardResult(shard, outputs, sorted(records, key=lambda record: record.task), None)
+
+
+def work(address, authkey, quota_share=1.0):
+    """
+    Run shards from the ShardExecutor at ``address`` until it shuts down.
+
+    ``quota_share`` is the fraction of the Groq rate limits (GROQ_RPM,
+    GROQ_TPM) this worker may use; workers sharing an API key should split it.
+    """
+    import rate_limiter
+
+    rate_limiter.configure_limiters(quota_share=quota_share)
+    manager = ShardQueue(address=address, authkey=authkey)
+    manager.connect()
+    jobs, results = manager.jobs(), manager.results()
+    crews = {}
+    while True:
+        try:
+            job = jobs.get(timeout=1)
+        except queue.Empty:
+            continue
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        run_id, shard = job
+        try:
+            result = run_shard(shard, run_id, crews)
+        except Exception:
+            result = ShardResult(shard, {}, [], traceback.format_exc())
+        try:
+            results.put(result)
+        except (EOFError, OSError):
+            return
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class ShardExecutor:
+    """
+    Runs shards in worker processes and gathers their results in shard order.
+
+    The executor serves a job queue and a result queue on ``address``
+    (``host:port``; port 0 picks a free one) and starts ``workers`` local
+    worker processes, which split the Groq rate limits between them. To add
+    workers on other machines, listen on a reachable interface and run
+    ``sharding.py work --connect host:port`` there with the same SHARD_AUTHKEY
+    (and a ``--quota-share`` if they use the same API key). A failed shard
+    does not stop the others; its result carries the traceback.
+    """
+
+    def __init__(self, workers=SHARD_WORKERS, address='127.0.0.1:0', authkey=SHARD_AUTHKEY):
+        self.workers = workers
+        self.address = parse_address(address)
+        if authkey is None and self.address[0] not in LOOPBACK:
+            raise ValueError("Set SHARD_AUTHKEY to accept workers from other machines")
+        self.authkey = authkey.encode() if authkey else secrets.token_bytes(16)
+
+    def run(self, shards, run_id):
+        """Run every shard of ``run_id`` and return their ShardResults in shard order."""
+        context = multiprocessing.get_context('spawn')
+        manager = ShardQueue(address=self.address, authkey=self.authkey, ctx=context)
+        manager.start()
+        local = []
+        try:
+            jobs, results = manager.jobs(), manager.results()
+            for shard in shards:
+                jobs.put((run_id, shard))
+            if self.address[0] not in LOOPBACK:
+                print(f"Waiting for shard workers on {manager.address[0]}:{manager.address[1]}")
+
+            count = min(self.workers, len(shards))
+            for _ in range(count):
+                process = context.Process(target=work, args=(manager.address, self.authkey, 1 / count), daemon=True)
+                process.start()
+                local.append(process)
+
+            gathered = {}
+            while len(gathered) < len(shards):
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    # Only when every worker is local can their exit mean the work will never finish
+                    if local and self.address[0] in LOOPBACK and not any(process.is_alive() for process in local):
+                        missing = [shard.name for shard in shards if shard.index not in gathered]
+                        raise RuntimeError(f"Shard workers exited before finishing {', '.join(missing)}")
+                    continue
+                gathered[result.shard.index] = result
+                print(f"Shard {result.shard.name} {'failed' if result.error else 'done'} "
+                      f"({len(gathered)}/{len(shards)})")
+
+            for _ in local:
+                jobs.put(None)
+            for process in local:
+                process.join(timeout=10)
+            return [gathered[shard.index] for shard in shards]
+        finally:
+            for process in local:
+                if process.is_alive():
+                    process.terminate()
+            manager.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shard worker: runs crew shards for a ShardExecutor')
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('work', help='run shards from an executor until it finishes')
+    worker.add_argument('--connect', required=True, metavar='HOST:PORT', help='address of the executor')
+    worker.add_argument('--quota-share', type=float, default=1.0,
+                        help='fraction of the Groq rate limits this worker may use')
+    args = parser.parse_args()
+
+    if not SHARD_AUTHKEY:
+        parser.error("SHARD_AUTHKEY must match the executor's")
+    work(parse_address(args.connect), SHARD_AUTHKEY.encode(), args.quota_share)
+
+
+if __name__ == "__main__":
+    # Run from the importable module, so the results sent back are pickled as sharding.ShardResult
+    import sharding
+    sharding.main()
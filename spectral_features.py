@@ -0,0 +1,330 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import BaseModel, Field
+
+from neural_data import open_recording
+
+BANDS = {
+    'delta': (1.0, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 13.0),
+    'beta': (13.0, 30.0),
+    'gamma': (30.0, 80.0),
+}
+SPECTRAL_CACHE_MB = float(os.getenv('SPECTRAL_CACHE_MB', '256'))
+
+
+class SpectraCache:
+    """Thread-safe LRU cache of arrays, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self._bytes += value.nbytes
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return value
+
+
+# Shared by every analyzer, so repeated tool calls on the same recording reuse each other's spectra
+SPECTRA_CACHE = SpectraCache(int(SPECTRAL_CACHE_MB * 2 ** 20))
+
+
+class SpectralAnalyzer:
+    """
+    Welch spectral features of (channels, samples) recordings.
+
+    Recordings are cut into Hann-windowed segments of ``segment_seconds``
+    overlapping by ``overlap``, on a grid anchored at the first sample, and the
+    segments of every channel are transformed with one batched FFT over a
+    strided view: no per-channel or per-segment Python loop. The spectra are
+    computed ``chunk_segments`` segments at a time, reading only those samples
+    of the selected channels, and kept in a SpectraCache under the caller's
+    ``key``, so analyses of overlapping or repeated windows of a recording only
+    transform the segments they have not seen. The PSD and the cross-spectral
+    sums are accumulated chunk by chunk, so memory does not grow with the
+    length of the window. From them come absolute and relative band power,
+    spectral entropy, peak frequency and the magnitude-squared coherence of
+    every channel pair averaged per band. Coherence is quadratic in channels,
+    so its sums are accumulated one strip of ``channel_block`` channels at a
+    time, with batched cross-spectral matrix products over the in-band
+    frequencies only, and each window's result is cached too.
+    """
+
+    def __init__(self, sfreq, segment_seconds=2.0, overlap=0.5, bands=BANDS, channel_block=64, chunk_segments=16,
+                 cache=None):
+        self.sfreq = sfreq
+        self.nperseg = max(int(round(segment_seconds * sfreq)), 8)
+        self.step = max(int(round(self.nperseg * (1 - overlap))), 1)
+        self.window = np.hanning(self.nperseg + 1)[:-1]
+        self.scale = 1.0 / (sfreq * np.sum(self.window ** 2))
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1.0 / sfreq)
+        self.bands = {name: (low, min(high, sfreq / 2)) for name, (low, high) in bands.items() if low < sfreq / 2}
+        self.masks = np.array([(self.freqs >= low) & (self.freqs < high) for low, high in self.bands.values()])
+        self.channel_block = channel_block
+        self.chunk_segments = chunk_segments
+        self.cache = SPECTRA_CACHE if cache is None else cache
+
+    def _params(self):
+        return self.sfreq, self.nperseg, self.step
+
+    def _chunk(self, data, key, chunk, total, channels=slice(None)):
+        first = chunk * self.chunk_segments
+        count = min(self.chunk_segments, total - first)
+
+        def compute():
+            start = first * self.step
+            x = np.asarray(data[channels, start:start + (count - 1) * self.step + self.nperseg], dtype=np.float64)
+            segments = sliding_window_view(x, self.nperseg, axis=1)[:, ::self.step][:, :count]
+            segments = segments - segments.mean(axis=2, keepdims=True)
+            return np.fft.rfft(segments * self.window, axis=2).astype(np.complex64)
+
+        if key is None:
+            return compute()
+        return self.cache.get((key, self._params(), chunk, count), compute)
+
+    def segment_range(self, samples, start=0, stop=None):
+        """Indices ``(first, last)`` of the grid segments lying within samples ``start:stop``."""
+        stop = samples if stop is None else min(stop, samples)
+        total = (samples - self.nperseg) // self.step + 1 if samples >= self.nperseg else 0
+        first = -(-max(start, 0) // self.step)
+        last = min((stop - self.nperseg) // self.step + 1, total) if stop >= self.nperseg else 0
+        return first, max(first, last), total
+
+    def _segments(self, data, start, stop):
+        first, last, total = self.segment_range(data.shape[1], start, stop)
+        if last <= first:
+            raise ValueError(f"Window of {(stop or data.shape[1]) - start} samples is shorter than one "
+                             f"{self.nperseg}-sample segment")
+        return first, last, total
+
+    def _chunks(self, data, key, first, last, total, channels=slice(None)):
+        """Spectra of segments ``first:last``, one (channels, segments, freqs) chunk at a time."""
+        size = self.chunk_segments
+        for chunk in range(first // size, (last - 1) // size + 1):
+            spectra = self._chunk(data, key, chunk, total, channels)
+            yield spectra[:, max(first - chunk * size, 0):last - chunk * size]
+
+    def spectra(self, data, key=None, start=0, stop=None, channels=slice(None)):
+        """FFTs of the windowed segments within samples ``start:stop``, as a (channels, segments, freqs) array."""
+        parts = list(self._chunks(data, key, *self._segments(data, start, stop), channels))
+        return np.concatenate(parts, axis=1) if len(parts) > 1 else parts[0]
+
+    def psd(self, spectra):
+        """One-sided power spectral density (units^2/Hz) of each channel, averaged over segments."""
+        return self._one_sided(np.mean(spectra.real ** 2 + spectra.imag ** 2, axis=1, dtype=np.float64))
+
+    def _one_sided(self, power):
+        power = power * self.scale
+        power[:, 1:] *= 2
+        if self.nperseg % 2 == 0:
+            power[:, -1] /= 2
+        return power
+
+    def band_power(self, psd):
+        """Absolute power in each band, as a (channels, bands) array."""
+        return psd @ self.masks.T * (self.freqs[1] - self.freqs[0])
+
+    def spectral_entropy(self, psd):
+        """Shannon entropy of each channel's PSD over the analysed bands, normalized to [0, 1]."""
+        analysed = psd[:, self.masks.any(axis=0)]
+        p = analysed / np.maximum(analysed.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.sum(np.where(p > 0, p * np.log(p), 0.0), axis=1)
+        return entropy / np.log(analysed.shape[1])
+
+    def peak_frequency(self, psd, band='alpha'):
+        """Frequency of the largest PSD value in ``band`` for each channel."""
+        mask = self.masks[list(self.bands).index(band)]
+        return self.freqs[mask][np.argmax(psd[:, mask], axis=1)]
+
+    def _accumulate(self, data, key, first, last, total, channels, coherence):
+        """
+        Power spectra summed over segments ``first:last``, a (channels, freqs)
+        array, and if ``coherence`` the band coherence of every channel pair.
+        Cross spectra are summed for one strip of ``channel_block`` rows against
+        the channels after them per pass over the chunks, so at most
+        (in-band freqs, channel_block, channels) sums are held at once.
+        """
+        count = _channel_count(data, channels)
+        used = self.masks.any(axis=0)
+        masks = self.masks[:, used].astype(np.float32)
+        counts = masks.sum(axis=1)
+        power, block = None, self.channel_block
+        result = np.empty((count, count, len(masks)), dtype=np.float32) if coherence else None
+        for i in range(0, count if coherence else 1, block):
+            cross = None
+            for spectra in self._chunks(data, key, first, last, total, channels):
+                if i == 0:
+                    sums = np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=1, dtype=np.float64)
+                    power = sums if power is None else power + sums
+                if coherence:
+                    x = spectra[:, :, used].transpose(2, 0, 1)
+                    products = x[:, i:i + block] @ x[:, i:].conj().transpose(0, 2, 1)
+                    cross = products.astype(np.complex128) if cross is None else cross + products
+            if coherence:
+                in_band = power[:, used].T
+                denominator = in_band[:, i:i + block, None] * in_band[:, None, i:]
+                msc = np.divide(cross.real ** 2 + cross.imag ** 2, denominator,
+                                out=np.zeros(denominator.shape), where=denominator > 0)
+                bands = (np.tensordot(masks, msc, axes=(1, 0)).transpose(1, 2, 0) / counts).astype(np.float32)
+                result[i:i + block, i:] = bands
+                result[i:, i:i + block] = bands.transpose(1, 0, 2)
+        return power, result
+
+    def coherence(self, data, key=None, start=0, stop=None, channels=slice(None)):
+        """Magnitude-squared coherence of every channel pair, averaged per band: a (channels, channels, bands) array."""
+        first, last, total = self._segments(data, start, stop)
+
+        def compute():
+            return self._accumulate(data, key, first, last, total, channels, True)[1]
+
+        if key is None:
+            return compute()
+        return self.cache.get((key, self._params(), (first, last), 'coherence'), compute)
+
+    def features(self, data, key=None, start=0, stop=None, coherence=True, channels=slice(None)):
+        """
+        PSD, band powers, entropy, alpha peak and (optionally) band coherence
+        of samples ``start:stop`` of ``channels`` (indices or a slice), which
+        are read from ``data`` one chunk of segments at a time.
+        """
+        first, last, total = self._segments(data, start, stop)
+        coherence = coherence and _channel_count(data, channels) > 1
+        computed = {}
+
+        def compute():
+            computed['power'], result = self._accumulate(data, key, first, last, total, channels, True)
+            return result
+
+        if coherence:
+            computed['coherence'] = compute() if key is None else self.cache.get(
+                (key, self._params(), (first, last), 'coherence'), compute)
+        if 'power' not in computed:
+            computed['power'], _ = self._accumulate(data, key, first, last, total, channels, False)
+        psd = self._one_sided(computed['power'] / (last - first))
+        power = self.band_power(psd)
+        features = {
+            'freqs': self.freqs,
+            'psd': psd,
+            'segments': last - first,
+            'band_power': power,
+            'relative_power': power / np.maximum(power.sum(axis=1, keepdims=True), np.finfo(float).tiny),
+            'entropy': self.spectral_entropy(psd),
+        }
+        if 'alpha' in self.bands:
+            features['alpha_peak'] = self.peak_frequency(psd)
+        if coherence:
+            features['coherence'] = computed['coherence']
+        return features
+
+
+def _channel_count(data, channels):
+    return len(range(data.shape[0])[channels]) if isinstance(channels, slice) else len(channels)
+
+
+def summarize(features, bands, channels, top=5):
+    """Compact text summary of ``features`` for an LLM: per-band statistics and the channels and pairs that stand out."""
+    power, relative, entropy = features['band_power'], features['relative_power'], features['entropy']
+    lines = [f"{len(channels)} channels, {features['segments']} segments per channel"]
+    for index, band in enumerate(bands):
+        low, high = bands[band]
+        strongest = np.argsort(relative[:, index])[::-1][:3]
+        lines.append(
+            f"{band} ({low:g}-{high:g} Hz): mean power {power[:, index].mean():.3g}, "
+            f"relative {relative[:, index].mean():.1%} (range {relative[:, index].min():.1%}-"
+            f"{relative[:, index].max():.1%}); highest in "
+            + ", ".join(f"{channels[c]} {relative[c, index]:.1%}" for c in strongest)
+        )
+    lowest = np.argsort(entropy)[:3]
+    lines.append(
+        f"Spectral entropy: mean {entropy.mean():.3f}, min {entropy.min():.3f}, max {entropy.max():.3f}; "
+        "most peaked " + ", ".join(f"{channels[c]} {entropy[c]:.3f}" for c in lowest)
+    )
+    if 'alpha_peak' in features:
+        peaks = features['alpha_peak']
+        lines.append(f"Alpha peak frequency: median {np.median(peaks):.2f} Hz (IQR {np.percentile(peaks, 25):.2f}-"
+                     f"{np.percentile(peaks, 75):.2f} Hz)")
+
+    if 'coherence' in features:
+        coherence = features['coherence']
+        upper = np.triu_indices(len(channels), k=1)
+        for index, band in enumerate(bands):
+            values = coherence[:, :, index][upper]
+            order = np.argsort(values)[::-1][:top]
+            hubs = np.argsort((coherence[:, :, index].sum(axis=1) - 1) / (len(channels) - 1))[::-1][:3]
+            lines.append(
+                f"{band} coherence: mean {values.mean():.3f}; top pairs "
+                + ", ".join(f"{channels[upper[0][p]]}-{channels[upper[1][p]]} {values[p]:.2f}" for p in order)
+                + "; most connected " + ", ".join(channels[c] for c in hubs)
+            )
+    return "\n".join(lines)
+
+
+class SpectralFeaturesToolSchema(BaseModel):
+    input_path: str = Field(..., description="Path of a .npy recording or a raw recording with a JSON sidecar")
+    sampling_rate: Optional[float] = Field(None, description="Sampling rate in Hz, if not given by the recording header")
+    start: Optional[float] = Field(None, description="Window start in seconds; omit for the start of the recording")
+    stop: Optional[float] = Field(None, description="Window end in seconds; omit for the end of the recording")
+    channels: Optional[str] = Field(None, description="Comma-separated channel names or indices; omit for all")
+    coherence: bool = Field(True, description="Also compute coherence between every pair of channels")
+    segment_seconds: float = Field(2.0, description="Welch segment length in seconds; sets the frequency resolution")
+
+
+class SpectralFeaturesTool(BaseTool):
+    name: str = "Spectral features of neural recording"
+    description: str = (
+        "Computes Welch power spectra of a neural recording (EEG, MEG, ECoG) over an optional time window and "
+        "channel selection, and summarizes band power (delta, theta, alpha, beta, gamma), spectral entropy, "
+        "alpha peak frequency and the coherence between channel pairs per band."
+    )
+    args_schema: Type[BaseModel] = SpectralFeaturesToolSchema
+
+    def _run(self, input_path, sampling_rate=None, start=None, stop=None, channels=None, coherence=True,
+             segment_seconds=2.0):
+        recording = open_recording(input_path)
+        try:
+            recording.sfreq = recording.require_sfreq(sampling_rate)
+        except ValueError as exc:
+            return str(exc)
+        selected = [c.strip() for c in channels.split(',')] if channels else None
+        if selected:
+            selected = [int(c) if c.isdigit() and c not in recording.channels else c for c in selected]
+        selection = recording.channel_indices(selected)
+        names = [recording.channels[i] for i in np.arange(len(recording.channels))[selection]]
+        first, last = recording.sample_range(start, stop)
+
+        stat = os.stat(input_path)
+        key = (os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size, str(selection))
+        analyzer = SpectralAnalyzer(recording.sfreq, segment_seconds)
+        try:
+            # The memmap is read one chunk of segments of the selected channels at a time, never copied whole
+            features = analyzer.features(recording.data, key, first, last, coherence, selection)
+        except ValueError as exc:
+            return str(exc)
+        header = (f"{recording.describe()}; window {first / recording.sfreq:.1f}-{last / recording.sfreq:.1f} s, "
+                  f"{analyzer.freqs[1]:.2f} Hz resolution")
+        return header + "\n" + summarize(features, analyzer.bands, names)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import queue
+import sys
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from task_graph import current_task
+
+# kind is 'task' (a task produced its first output), 'token', 'done' (text is the result) or 'error'
+StreamEvent = namedtuple('StreamEvent', 'kind task text')
+
+
+class TokenStream(BaseCallbackHandler):
+    """
+    LangChain callback handler publishing LLM tokens as they are generated.
+
+    Attach it to the agents' LLM (created with ``streaming=True``) and every
+    token is published as a StreamEvent tagged with the task that produced it,
+    to every subscriber, in order. Responses that arrive whole, such as cache
+    hits, are published as a single token. The history of the stream is kept,
+    so late subscribers can catch up. ``events`` and ``aevents`` run a crew in
+    the background and iterate over its stream from a loop or a coroutine.
+    """
+
+    def __init__(self):
+        self.history = []
+        self.subscribers = []
+        self._tasks = set()
+        self._streamed = set()
+        self._lock = threading.Lock()
+
+    def attach(self, agents):
+        for agent in agents:
+            callbacks = list(agent.llm.callbacks or [])
+            if self not in callbacks:
+                agent.llm.callbacks = callbacks + [self]
+
+    def subscribe(self, callback, replay=False):
+        with self._lock:
+            if replay:
+                for event in self.history:
+                    callback(event)
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self.subscribers.remove(callback)
+
+    def publish(self, kind, task=None, text=''):
+        event = StreamEvent(kind, task, text)
+        with self._lock:
+            self.history.append(event)
+            for callback in self.subscribers:
+                callback(event)
+
+    def _token(self, text):
+        task = current_task.get()
+        if task not in self._tasks:
+            self._tasks.add(task)
+            self.publish('task', task)
+        self.publish('token', task, text)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        self._streamed.add(run_id)
+        self._token(token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id in self._streamed:
+            self._streamed.discard(run_id)
+            return
+        text = "".join(generation.text for generations in response.generations for generation in generations)
+        if text:
+            self._token(text)
+
+    def events(self, run):
+        """Call ``run()`` in a background thread and yield its StreamEvents until it finishes, re-raising its error."""
+        events = queue.Queue()
+        self.subscribe(events.put)
+        outcome = _BackgroundRun(self, run)
+        outcome.start()
+        try:
+            while True:
+                event = events.get()
+                yield event
+                if event.kind in ('done', 'error'):
+                    break
+        finally:
+            self.unsubscribe(events.put)
+        outcome.join()
+        if outcome.error is not None:
+            raise outcome.error
+
+    async def aevents(self, run):
+        """Asyncio counterpart of ``events``."""
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def deliver(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        self.subscribe(deliver)
+        outcome = _BackgroundRun(self, run)
+        outcome.start()
+        try:
+            while True:
+                event = await events.get()
+                yield event
+                if event.kind in ('done', 'error'):
+                    break
+        finally:
+            self.unsubscribe(deliver)
+        await asyncio.to_thread(outcome.join)
+        if outcome.error is not None:
+            raise outcome.error
+
+
+class _BackgroundRun(threading.Thread):
+    """Thread calling ``run()`` and publishing its result or error on ``stream``."""
+
+    def __init__(self, stream, run):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.target = run
+        self.error = None
+
+    def run(self):
+        try:
+            result = self.target()
+        except BaseException as exc:
+            self.error = exc
+            self.stream.publish('error', None, repr(exc))
+        else:
+            self.stream.publish('done', None, result if isinstance(result, str) else str(result))
+
+
+class MarkdownStream:
+    """
+    Stream subscriber writing tokens into a markdown file as they arrive, under
+    a heading per task, so the report can be followed while the crew runs. The
+    finished result replaces the progress when the stream is done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+
+    def __call__(self, event):
+        if self._file is None:
+            return
+        if event.kind == 'task':
+            self._file.write(f"\n\n## {event.task}\n\n")
+        elif event.kind == 'token':
+            self._file.write(event.text)
+        elif event.kind == 'done':
+            self._file.close()
+            self._file = None
+            with open(self.path + '.tmp', 'w') as file:
+                file.write(event.text)
+            os.replace(self.path + '.tmp', self.path)
+            return
+        elif event.kind == 'error':
+            self._file.close()
+            self._file = None
+            return
+        self._file.flush()
+
+
+def print_tokens(event, file=None):
+    """Stream subscriber echoing tokens to stdout."""
+    file = file or sys.stdout
+    if event.kind == 'task':
+        file.write(f"\n\n===== {event.task} =====\n")
+    elif event.kind == 'token':
+        file.write(event.text)
+    file.flush()
+
+
+class _EventSourceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/events'):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        events = queue.Queue()
+        self.server.stream.subscribe(events.put, replay=True)
+        try:
+            while True:
+                event = events.get()
+                data = json.dumps({'task': event.task, 'text': event.text})
+                self.wfile.write(f"event: {event.kind}\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                if event.kind in ('done', 'error'):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.stream.unsubscribe(events.put)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_events(stream, port, host='127.0.0.1'):
+    """
+    Serve ``stream`` as Server-Sent Events on ``http://host:port/events`` from
+    a background thread. Each client first receives the stream so far. Returns
+    the server; call ``shutdown()`` on it to stop.
+    """
+    server = ThreadingHTTPServer((host, port), _EventSourceHandler)
+    server.daemon_threads = True
+    server.stream = stream
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
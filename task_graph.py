@@ -0,0 +1,241 @@
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Upper bound on tasks talking to Groq at the same time
+MAX_CONCURRENCY = int(os.getenv('CREW_MAX_CONCURRENCY', '4'))
+
+# Name of the crewai task being executed in the current context
+current_task = contextvars.ContextVar('current_task', default=None)
+
+
+class TaskGraph:
+    """
+    A set of named jobs and the jobs each of them depends on.
+
+    Every job is a callable taking one argument: a dict mapping the names of its
+    dependencies to their results, in the order the dependencies were declared.
+    Jobs whose dependencies have all finished run concurrently on a bounded
+    thread pool, longest remaining path first, so the total run time approaches
+    the length of the critical path instead of the sum of all jobs. Jobs run in
+    a copy of the caller's context, so context variables such as the current
+    tracing span carry over into the worker threads, and with their remaining
+    path length as rate-limiter priority, so critical-path jobs get their API
+    requests through first when the quota is contended.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.dependencies = {}
+        self.costs = {}
+
+    def add(self, name, fn, depends_on=(), cost=1):
+        if name in self.nodes:
+            raise ValueError(f"Duplicate task name: {name}")
+        self.nodes[name] = fn
+        self.dependencies[name] = list(depends_on)
+        self.costs[name] = cost
+
+    def dependents(self):
+        children = {name: [] for name in self.nodes}
+        for name, deps in self.dependencies.items():
+            for dep in deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Task {name} depends on unknown task {dep}")
+                children[dep].append(name)
+        return children
+
+    def topological_order(self):
+        children = self.dependents()
+        pending = {name: len(deps) for name, deps in self.dependencies.items()}
+        order = [name for name, count in pending.items() if count == 0]
+        for name in order:
+            for child in children[name]:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    order.append(child)
+        if len(order) != len(self.nodes):
+            cyclic = sorted(name for name, count in pending.items() if count > 0)
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(cyclic)}")
+        return order
+
+    def remaining_costs(self):
+        """Cost of the longest path from each task to the end of the graph, inclusive."""
+        children = self.dependents()
+        remaining = {}
+        for name in reversed(self.topological_order()):
+            tail = max((remaining[child] for child in children[name]), default=0)
+            remaining[name] = self.costs[name] + tail
+        return remaining
+
+    def critical_path(self):
+        remaining = self.remaining_costs()
+        children = self.dependents()
+        roots = [name for name, deps in self.dependencies.items() if not deps]
+        if not roots:
+            return []
+        path = [max(roots, key=remaining.get)]
+        while children[path[-1]]:
+            path.append(max(children[path[-1]], key=remaining.get))
+        return path
+
+    def run(self, max_concurrency=MAX_CONCURRENCY):
+        """Run every job once its dependencies finish and return a dict of results by name."""
+        children = self.dependents()
+        priority = self.remaining_costs()
+        pending = {name: set(deps) for name, deps in self.dependencies.items()}
+        ready = [name for name, deps in pending.items() if not deps]
+        running = {}
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            while ready or running:
+                ready.sort(key=priority.get, reverse=True)
+                while ready and len(running) < max_concurrency:
+                    name = ready.pop(0)
+                    upstream = {dep: results[dep] for dep in self.dependencies[name]}
+                    job = pool.submit(contextvars.copy_context().run, _run_job, self.nodes[name], upstream,
+                                      priority[name])
+                    running[job] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    for child in children[name]:
+                        pending[child].discard(name)
+                        if not pending[child]:
+                            ready.append(child)
+
+        return results
+
+
+def _run_job(fn, upstream, rank):
+    # Imported here so that the crew scripts can import this module without loading httpx
+    from rate_limiter import priority as request_priority
+
+    with request_priority(rank):
+        return fn(upstream)
+
+
+def task_name(index, task):
+    """Stable name for a crewai task, e.g. ``07_data_scientist``."""
+    role = task.agent.role if task.agent is not None else 'task'
+    return f"{index:02d}_{role.lower().replace(' ', '_')}"
+
+
+def sequential_dependencies(tasks):
+    """Dependencies that make each task consume the output of the one before it, like ``Process.sequential``."""
+    return [(task, [previous]) for previous, task in zip(tasks, tasks[1:])]
+
+
+def build_task_graph(tasks, dependencies=(), checkpoint=None, tracer=None, compactor=None, results=None,
+                     router=None):
+    """
+    Build a TaskGraph over crewai tasks.
+
+    ``dependencies`` is a list of ``(task, [upstream tasks])`` pairs; tasks that
+    do not appear in it start immediately. Each task receives the outputs of its
+    upstream tasks, joined in declaration order, as its context. With a
+    CheckpointStore, tasks already completed in that run are replayed from disk
+    and every newly completed task is saved to it. With a Tracer, every task
+    executed (not replayed) runs inside a ``task`` span. With a ContextCompactor, the joined context is
+    kept within its token budget. With a ResultStore, every task appends a
+    TaskRecord of its output, timings and (with a Tracer) token counts to it,
+    under the checkpoint's run id. With a ModelRouter, every task runs on the
+    model the router picks for it.
+    """
+    names = {id(task): task_name(index, task) for index, task in enumerate(tasks)}
+    upstream = {id(task): [names[id(dep)] for dep in deps] for task, deps in dependencies}
+
+    graph = TaskGraph()
+    for task in tasks:
+        name = names[id(task)]
+        graph.add(name, _task_runner(task, name, checkpoint, tracer, compactor, results, router),
+                  upstream.get(id(task), ()))
+    return graph
+
+
+def run_crew_tasks(tasks, dependencies=(), inputs=None, max_concurrency=MAX_CONCURRENCY, checkpoint=None,
+                   tracer=None, compactor=None, results=None, router=None):
+    """Run crewai tasks as a dependency graph and return their outputs in task order."""
+    if inputs:
+        for task in tasks:
+            task.interpolate_inputs(inputs)
+            task.agent.interpolate_inputs(inputs)
+
+    graph = build_task_graph(tasks, dependencies, checkpoint, tracer, compactor, results, router)
+    try:
+        if tracer is None:
+            outputs = graph.run(max_concurrency=max_concurrency)
+        else:
+            with tracer.span('run', 'crew', tasks=len(tasks), max_concurrency=max_concurrency):
+                outputs = graph.run(max_concurrency=max_concurrency)
+    finally:
+        if results is not None:
+            results.flush()
+    return [outputs[task_name(index, task)] for index, task in enumerate(tasks)]
+
+
+def _task_runner(task, name, checkpoint, tracer, compactor=None, results=None, router=None):
+    if tracer is None and results is None:
+        return _execute_task(task, name, checkpoint, compactor, router)
+    execute = _execute_task(task, name, checkpoint, compactor, router, replay=False)
+
+    def run(upstream):
+        output = _replay(task, name, checkpoint)
+        replayed = output is not None
+        started = time.time()
+        if replayed:
+            # No span, so the trace only counts the work done in this run
+            metrics = None
+        elif tracer is None:
+            output, metrics = execute(upstream), None
+        else:
+            with tracer.span('task', name, agent=task.agent.role) as span:
+                output = execute(upstream)
+            metrics = span.metrics
+        if results is not None:
+            run_id = checkpoint.run_id if checkpoint is not None else ''
+            # Written as soon as the task finishes, so an interrupted run keeps it
+            if results.record_task(run_id, name, task, output, started, time.time(), metrics, replayed):
+                results.flush()
+        return output
+    return run
+
+
+def _replay(task, name, checkpoint):
+    """The output ``checkpoint`` holds for the task, or None if it has not completed in that run."""
+    if checkpoint is None:
+        return None
+    record = checkpoint.load(name, task.description)
+    if record is None:
+        return None
+    print(f"Replaying {name} from checkpoint {checkpoint.run_id}")
+    return record['output']
+
+
+def _execute_task(task, name, checkpoint, compactor=None, router=None, replay=True):
+    def run(upstream):
+        # Checked before compacting the context, which a replayed task does not need
+        output = _replay(task, name, checkpoint) if replay else None
+        if output is not None:
+            return output
+        if compactor is None:
+            context = "\n\n".join(upstream.values())
+        else:
+            context = compactor.compact(name, task.description, upstream)
+
+        token = current_task.set(name)
+        try:
+            if router is None:
+                output = task.execute(context=context)
+            else:
+                output = router.execute(name, task, context)
+        finally:
+            current_task.reset(token)
+        if checkpoint is not None:
+            checkpoint.save(name, task.description, output, context)
+        return output
+    return run
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from artifact_removal import ArtifactRemovalTool
+from neural_data import write_sidecar
+
+CHANNELS = ['Fp1', 'Fp2', 'Cz', 'VEOG']
+
+
+@pytest.fixture
+def raw_path(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 10, (len(CHANNELS), 5000)).astype(np.float32)
+    data[:2] += 0.5 * data[3]  # blinks leaking into the frontal channels
+    path = str(tmp_path / 'raw.dat')
+    data.tofile(path)
+    write_sidecar(path, 250.0, CHANNELS, data.shape[1])
+    return path
+
+
+def test_eog_channels_by_name_or_index(raw_path, tmp_path):
+    for eog in ('VEOG', '3'):
+        report = ArtifactRemovalTool()._run(raw_path, str(tmp_path / f'clean-{eog}.npy'), eog_channels=eog)
+        assert 'regressed out using channels VEOG' in report
+
+
+@pytest.mark.parametrize('eog', ['HEOG', 'VEOG, EOG2', '4'])
+def test_unknown_eog_channels_are_reported(raw_path, tmp_path, eog):
+    output = str(tmp_path / 'clean.npy')
+    report = ArtifactRemovalTool()._run(raw_path, output, eog_channels=eog)
+    assert report.startswith('Unknown EOG channels')
+    assert 'Fp1, Fp2, Cz, VEOG' in report
+    assert not (tmp_path / 'clean.npy').exists()
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import types
+
+from crew_server import CrewServer
+
+
+class FakeWriter:
+    """Stand-in for the StreamWriter of a connection, keeping what the server writes."""
+
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def server(tmp_path):
+    crew_server = CrewServer(jobs_dir=str(tmp_path), crews=['eeg'])
+    crew_server.modules['eeg'] = types.SimpleNamespace(JOB_PARAMS=('recording', 'sfreq'))
+    return crew_server
+
+
+def request(crew_server, method, path, body=None):
+    """Status and JSON body the server answers ``method`` on ``path`` with."""
+    async def send():
+        crew_server._queue = asyncio.PriorityQueue()
+        content = json.dumps(body).encode() if body is not None else b''
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(content)}\r\n\r\n".encode() + content)
+        reader.feed_eof()
+        writer = FakeWriter()
+        await crew_server.handle(reader, writer)
+        return writer.data
+    head, _, content = asyncio.run(send()).partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_valid_submission_is_queued(tmp_path):
+    status, job = request(server(tmp_path), 'POST', '/jobs', {'crew': 'eeg', 'params': {'sfreq': 250.0}})
+    assert status == 202 and job['status'] == 'queued'
+
+
+def test_malformed_submissions_are_rejected(tmp_path):
+    crew_server = server(tmp_path)
+    for body in [{'crew': ['eeg']}, {'crew': {'eeg': 1}}, {'crew': None},
+                 {'crew': 'eeg', 'params': ['sfreq']}, {'crew': 'eeg', 'params': {'sfreq': [250]}},
+                 {'crew': 'eeg', 'params': {'recording': {'path': 'x'}}}, {'crew': 'eeg', 'priority': '1'},
+                 {'crew': 'eeg', 'params': {'epochs': 2}}, ['eeg']]:
+        status, answer = request(crew_server, 'POST', '/jobs', body)
+        assert status == 400, body
+        assert 'error' in answer
+    assert crew_server.jobs == {}
+
+
+def test_missing_output_file_is_not_found(tmp_path):
+    crew_server = server(tmp_path)
+    _, job = request(crew_server, 'POST', '/jobs', {'crew': 'eeg'})
+    crew_server.jobs[job['id']].status = 'done'
+    crew_server.jobs[job['id']].output = str(tmp_path / job['id'] / 'report.md')
+    status, answer = request(crew_server, 'GET', f"/jobs/{job['id']}/output")
+    assert status == 404 and 'error' in answer
+
+
+def test_unexpected_error_answers_500(tmp_path):
+    crew_server = server(tmp_path)
+    # No router: start_services was never run
+    status, answer = request(crew_server, 'GET', '/stats')
+    assert status == 500 and 'AttributeError' in answer['error']
@@ -0,0 +1,37 @@
+import numpy as np
+
+from eeg_preprocessing import Preprocessor
+
+SFREQ = 250.0
+
+
+def recording(channels=8, seconds=20, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SFREQ)) / SFREQ
+    signal = np.sin(2 * np.pi * 10 * t) + 0.5 * np.sin(2 * np.pi * 50 * t) + 0.5 * t
+    return (rng.uniform(0.5, 2.0, (channels, 1)) * signal + rng.normal(0, 0.2, (channels, len(t)))).astype(np.float32)
+
+
+def preprocess(data):
+    # Small chunks, so every chunk reads context that overlaps its neighbours
+    out, _ = Preprocessor(SFREQ, chunk_size=1024, workers=2).run(data)
+    return out
+
+
+def test_float64_input_is_left_unchanged_and_matches_float32():
+    data32 = recording()
+    data64 = data32.astype(np.float64)
+    original = data64.copy()
+    expected = preprocess(data32)
+    np.testing.assert_array_equal(data64, original)
+    np.testing.assert_allclose(preprocess(data64), expected, atol=1e-5)
+    np.testing.assert_array_equal(data64, original)
+
+
+def test_read_only_memmap_input(tmp_path):
+    data32 = recording()
+    path = str(tmp_path / 'raw.npy')
+    np.save(path, data32.astype(np.float64))
+    mapped = np.load(path, mmap_mode='r')
+    np.testing.assert_allclose(preprocess(mapped), preprocess(data32), atol=1e-5)
+    np.testing.assert_array_equal(np.load(path), data32.astype(np.float64))
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import random
+
+import httpx
+
+from groq_client import AsyncChatClient
+from rate_limiter import RateLimiter
+
+
+class FakeChatCompletions:
+    """Stand-in for the chat-completions endpoint answering each prompt with ``echo: <prompt>`` after a random delay."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+
+    async def __call__(self, request):
+        prompt = json.loads(request.content)['messages'][0]['content']
+        self.requests += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.random.uniform(0.001, 0.02))
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(200, json={
+            'id': f'chatcmpl-{self.requests}',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': json.loads(request.content)['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': f'echo: {prompt}'}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        })
+
+
+def run_batch(prompts, backend, max_in_flight):
+    async def run():
+        async with AsyncChatClient(api_key='test', base_url='http://groq.test', max_in_flight=max_in_flight,
+                                   limiter=RateLimiter(1e6, 1e9), transport=httpx.MockTransport(backend)) as client:
+            return await client.complete_batch(prompts)
+    return asyncio.run(run())
+
+
+def test_batch_returns_answers_in_input_order():
+    prompts = [f'prompt {i}' for i in range(50)]
+    backend = FakeChatCompletions()
+    assert run_batch(prompts, backend, max_in_flight=8) == [f'echo: {prompt}' for prompt in prompts]
+    assert backend.requests == len(prompts)
+
+
+def test_batch_keeps_at_most_max_in_flight_requests_outstanding():
+    backend = FakeChatCompletions()
+    run_batch([f'prompt {i}' for i in range(40)], backend, max_in_flight=4)
+    assert 1 < backend.peak <= 4
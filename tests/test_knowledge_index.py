@@ -0,0 +1,43 @@
+import multiprocessing
+
+import numpy as np
+
+from knowledge_index import KnowledgeIndex
+
+
+def finding(number):
+    return f"Finding {number}: gamma synchrony over region {number * 7} rises during task {number * 13}."
+
+
+def add_findings(directory, numbers, start):
+    index = KnowledgeIndex(directory)
+    start.wait()
+    for number in numbers:
+        index.add(finding(number), source='worker')
+
+
+def test_processes_appending_to_one_index(tmp_path):
+    directory = str(tmp_path / 'index')
+    earlier = KnowledgeIndex(directory)
+    earlier.add(finding(-1), source='earlier')
+
+    context = multiprocessing.get_context('fork')
+    start = context.Event()
+    # Both workers also add findings 0-19, which must be stored once
+    workers = [context.Process(target=add_findings, args=(directory, list(range(20)) + list(range(lo, lo + 40)), start))
+               for lo in (100, 200)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    # An index opened before the workers ran picks up their chunks on its next add
+    assert earlier.add(finding(-2), source='earlier') == 1
+    index = KnowledgeIndex(directory)
+    assert len(index) == len(earlier) == 1 + 20 + 80 + 1
+    assert [chunk['id'] for chunk in index.chunks] == list(range(len(index)))
+    assert len({chunk['hash'] for chunk in index.chunks}) == len(index)
+    np.testing.assert_allclose(index.vectors(), index.embedder.embed([chunk['text'] for chunk in index.chunks]))
+    assert index.search(finding(120), k=1)[0]['text'] == finding(120)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import httpx
+
+from rate_limiter import RateLimitedTransport, RateLimiter, parse_duration
+
+
+class FakeQuota:
+    """Stand-in API answering 429 to the first ``rejections`` requests, then 200."""
+
+    def __init__(self, rejections, headers=None):
+        self.rejections = rejections
+        self.headers = headers or {}
+        self.times = []
+
+    def __call__(self, request):
+        self.times.append(time.monotonic())
+        if len(self.times) <= self.rejections:
+            return httpx.Response(429, headers=self.headers, json={'error': 'rate limited'})
+        return httpx.Response(200, json={'ok': True})
+
+
+def client(limiter, backend):
+    return httpx.Client(transport=RateLimitedTransport(limiter, httpx.MockTransport(backend)))
+
+
+def test_429_is_retried_after_retry_after():
+    limiter = RateLimiter(1e6, 1e9)
+    retries = []
+    limiter.listeners.append(lambda: retries.append(1))
+    backend = FakeQuota(2, {'retry-after': '0.05'})
+    response = client(limiter, backend).post('http://groq.test/chat', json={'messages': []})
+    assert response.status_code == 200
+    assert len(backend.times) == 3 and len(retries) == 2
+    assert all(later - earlier >= 0.05 for earlier, later in zip(backend.times, backend.times[1:]))
+
+
+def test_retries_stop_after_max_retries():
+    backend = FakeQuota(10, {'retry-after': '0.001'})
+    response = client(RateLimiter(1e6, 1e9, max_retries=2), backend).post('http://groq.test/chat', json={})
+    assert response.status_code == 429
+    assert len(backend.times) == 3
+
+
+def test_backoff_is_jittered_and_exponential_without_retry_after():
+    limiter = RateLimiter(1e6, 1e9, base_delay=1.0, max_delay=8.0)
+    for attempt, full in enumerate([1.0, 2.0, 4.0, 8.0, 8.0]):
+        delays = {limiter.retry_delay({}, attempt) for _ in range(20)}
+        assert all(full / 2 <= delay <= full for delay in delays)
+        assert len(delays) > 1
+
+
+def test_exhausted_request_quota_pauses_every_caller_until_reset():
+    limiter = RateLimiter(1e6, 1e9)
+    limiter.update({'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '150ms',
+                    'x-ratelimit-remaining-tokens': '10'})
+    assert limiter.tokens.level <= 10
+    start = time.monotonic()
+    limiter.acquire(1)
+    assert time.monotonic() - start >= 0.14
+
+
+def test_waiting_requests_are_admitted_by_priority_then_arrival():
+    limiter = RateLimiter(1e6, 1e9)
+    limiter.blocked_until = time.monotonic() + 0.3
+    admitted = []
+
+    def request(name, priority):
+        limiter.acquire(1, priority=priority)
+        admitted.append(name)
+
+    threads = []
+    for name, priority in [('bulk-1', 0), ('critical', 10), ('bulk-2', 0), ('urgent', 5)]:
+        thread = threading.Thread(target=request, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ['critical', 'urgent', 'bulk-1', 'bulk-2']
+
+
+def test_parse_duration():
+    assert parse_duration('2m59.56s') == 179.56
+    assert parse_duration('120ms') == 0.12
+    assert parse_duration('7') == 7.0
+    assert parse_duration(None) is None
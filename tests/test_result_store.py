@@ -0,0 +1,58 @@
+import csv
+import sqlite3
+
+import pytest
+
+from result_store import ResultStore, TaskRecord
+
+
+def record(run_id, task, output='finding'):
+    return TaskRecord(run_id, task, 'Researcher', f'{task} description', output, '', 0.0, 1.5)
+
+
+def read_csv(path):
+    with open(path, newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_followed_csv_gets_each_flushed_record_of_its_run(tmp_path):
+    store = ResultStore(str(tmp_path / 'results'), batch_size=16)
+    store.append(record('earlier', 'task_0'))
+    path = str(tmp_path / 'results.csv')
+    assert store.follow(path, run_id='run') == 0
+    assert read_csv(path) == []
+    for index in range(3):
+        store.append(record('run', f'task_{index}'))
+        store.append(record('other', f'task_{index}'))
+        store.flush()
+        # On disk after every flush, without waiting for a final export
+        assert [row['task'] for row in read_csv(path)] == [f'task_{i}' for i in range(index + 1)]
+    assert read_csv(path)[0]['duration'] == '1.5'
+
+
+def test_follow_exports_records_written_before_an_interruption(tmp_path):
+    directory, path = str(tmp_path / 'results'), str(tmp_path / 'results.csv')
+    interrupted = ResultStore(directory, batch_size=1)
+    interrupted.append(record('run', 'task_0'))
+    resumed = ResultStore(directory, batch_size=1)
+    assert resumed.follow(path, run_id='run') == 1
+    assert not resumed.append(record('run', 'task_0'))
+    resumed.append(record('run', 'task_1'))
+    assert [row['task'] for row in read_csv(path)] == ['task_0', 'task_1']
+
+
+@pytest.mark.parametrize('extension', ['sqlite', 'parquet'])
+def test_followed_database_formats(tmp_path, extension):
+    if extension == 'parquet':
+        pq = pytest.importorskip('pyarrow.parquet')
+    store = ResultStore(str(tmp_path / 'results'), batch_size=1)
+    path = str(tmp_path / f'results.{extension}')
+    store.follow(path)
+    store.append(record('run', 'task_0'))
+    store.append(record('run', 'task_1', output='see https://example.org/paper.'))
+    if extension == 'sqlite':
+        with sqlite3.connect(path) as db:
+            rows = db.execute("SELECT task, output FROM task_results ORDER BY task").fetchall()
+    else:
+        rows = sorted(zip(*pq.read_table(path, columns=['task', 'output']).to_pydict().values()))
+    assert rows == [('task_0', 'finding'), ('task_1', 'see https://example.org/paper.')]
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from response_cache import ResponseCache
+from search_cache import SearchCache
+
+
+class FakeSearch:
+    """Stand-in search backend counting its requests; requests block until ``release`` is set."""
+
+    def __init__(self):
+        self.queries = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, query):
+        self.queries.append(query)
+        self.release.wait(5)
+        return f"results for {query.lower().strip(' ?')}"
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_concurrent_identical_lookups_share_one_request():
+    backend = FakeSearch()
+    backend.release.clear()
+    cache = SearchCache(backend)
+    queries = ['EEG consciousness', 'eeg  consciousness?', ' EEG Consciousness ', 'eeg consciousness'] * 2
+    results = [None] * len(queries)
+
+    def lookup(index):
+        results[index] = cache.lookup(queries[index])
+
+    threads = [threading.Thread(target=lookup, args=(index,)) for index in range(len(queries))]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.coalesced == len(queries) - 1)
+    backend.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(backend.queries) == 1
+    assert results == ['results for eeg consciousness'] * len(queries)
+    assert (cache.misses, cache.coalesced) == (1, len(queries) - 1)
+
+
+def test_failed_request_is_not_cached():
+    calls = []
+
+    def failing(query):
+        calls.append(query)
+        raise RuntimeError('search backend down')
+
+    cache = SearchCache(failing)
+    for _ in range(2):
+        try:
+            cache.lookup('neural correlates of consciousness')
+        except RuntimeError:
+            pass
+    assert len(calls) == 2
+
+
+def test_lru_evicts_least_recently_used_and_expires_entries():
+    backend = FakeSearch()
+    cache = SearchCache(backend, max_entries=2, ttl=None)
+    cache.lookup('a')
+    cache.lookup('b')
+    cache.lookup('a')
+    cache.lookup('c')  # evicts b, the least recently used
+    cache.lookup('a')
+    cache.lookup('b')
+    assert backend.queries == ['a', 'b', 'c', 'b']
+
+    expiring = SearchCache(backend, ttl=0.05)
+    expiring.lookup('d')
+    time.sleep(0.1)
+    expiring.lookup('d')
+    assert backend.queries.count('d') == 2
+
+
+def test_results_persist_between_runs(tmp_path):
+    path = str(tmp_path / 'search.sqlite')
+    backend = FakeSearch()
+    SearchCache(backend, store=ResponseCache(path)).lookup('EEG consciousness')
+    later = SearchCache(backend, store=ResponseCache(path))
+    assert later.lookup('eeg consciousness') == 'results for eeg consciousness'
+    assert len(backend.queries) == 1 and later.hits == 1
@@ -0,0 +1,65 @@
+import os
+
+from crew_worker import load_script
+from sharding import ShardExecutor, plan_shards
+
+# A crew of three tasks: a writer building on a researcher, and an independent reviewer
+FAKE_CREW = '''
+import os
+from types import SimpleNamespace
+
+
+class Task:
+    def __init__(self, role, description):
+        self.agent = SimpleNamespace(role=role, llm=SimpleNamespace(callbacks=None), tools=[])
+        self.description = description
+        self.tools = []
+        self.callback = None
+
+    def execute(self, context=None):
+        if 'Project: Broken' in self.description:
+            raise RuntimeError('task failed')
+        return f"{self.agent.role} on {self.description.split('Project: ')[-1]} in {os.getpid()}; read [{context}]"
+
+
+def project_tasks(project=None):
+    researcher = Task('Researcher', f'Research. Project: {project}')
+    writer = Task('Writer', f'Write. Project: {project}')
+    reviewer = Task('Reviewer', f'Review. Project: {project}')
+    return [researcher, writer, reviewer], [(writer, [researcher])]
+
+
+agents = [task.agent for task in project_tasks()[0]]
+'''
+
+
+def test_shards_run_in_local_workers_and_merge_in_shard_order(tmp_path, monkeypatch):
+    monkeypatch.setenv('CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    crew = str(tmp_path / 'fake-crew.py')
+    with open(crew, 'w') as file:
+        file.write(FAKE_CREW)
+    tasks, dependencies = load_script(crew).project_tasks()
+    shards = plan_shards(crew, tasks, dependencies, ['Alpha', 'Beta', 'Broken'])
+    assert [(shard.name, shard.tasks) for shard in shards] == [
+        (f'{project}-{group}', tasks)
+        for project in ('alpha', 'beta', 'broken')
+        for group, tasks in enumerate([('00_researcher', '01_writer'), ('02_reviewer',)])
+    ]
+
+    results = ShardExecutor(workers=2).run(shards, 'run-1')
+
+    assert [result.shard for result in results] == shards
+    assert all('RuntimeError: task failed' in result.error for result in results[4:])
+    merged = {record.task: record for result in results[:4] for record in result.records}
+    assert sorted(merged) == sorted(f'{shard.name}/{task}' for shard in shards[:4] for task in shard.tasks)
+    assert {record.run_id for record in merged.values()} == {'run-1'}
+    outputs = {result.shard.name: result.outputs for result in results}
+    for project in ('Alpha', 'Beta'):
+        slug = project.lower()
+        research, writing = outputs[f'{slug}-0']['00_researcher'], outputs[f'{slug}-0']['01_writer']
+        assert research.startswith(f'Researcher on {project} in ')
+        # The writer ran in the same shard as the research it builds on, and was given it as context
+        assert writing.startswith(f'Writer on {project} in ') and research in writing
+        assert merged[f'{slug}-0/01_writer'].output == writing
+    pids = {output.split(' in ')[1].split(';')[0] for shard in shards[:4] for output in outputs[shard.name].values()}
+    assert str(os.getpid()) not in pids
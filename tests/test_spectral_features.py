@@ -0,0 +1,59 @@
+import tracemalloc
+
+import numpy as np
+
+from spectral_features import SpectraCache, SpectralAnalyzer
+
+SFREQ = 250.0
+
+
+def recording(channels=10, seconds=60, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SFREQ)) / SFREQ
+    data = rng.normal(size=(channels, len(t)))
+    data[:channels // 2] += 2 * np.sin(2 * np.pi * 10 * t)  # a shared alpha rhythm
+    return data.astype(np.float32)
+
+
+def whole_window_coherence(analyzer, spectra):
+    """Band coherence computed from every segment spectrum at once."""
+    used = analyzer.masks.any(axis=0)
+    x = spectra[:, :, used].astype(np.complex128)
+    cross = np.einsum('isf,jsf->ijf', x, x.conj())
+    power = np.einsum('isf,isf->if', x, x.conj()).real
+    msc = np.abs(cross) ** 2 / (power[:, None] * power[None, :])
+    masks = analyzer.masks[:, used]
+    return (msc @ masks.T) / masks.sum(axis=1)
+
+
+def test_chunked_features_match_whole_window(tmp_path):
+    data = recording()
+    path = str(tmp_path / 'raw.npy')
+    np.save(path, data)
+    mapped = np.load(path, mmap_mode='r')
+    channels = [0, 3, 5, 9, 2]
+    for key in (None, 'recording'):
+        analyzer = SpectralAnalyzer(SFREQ, channel_block=2, cache=SpectraCache(1 << 30))
+        features = analyzer.features(mapped, key, 300, 12000, channels=channels)
+        spectra = analyzer.spectra(data[channels], start=300, stop=12000)
+        assert features['segments'] == spectra.shape[1]
+        np.testing.assert_allclose(features['psd'], analyzer.psd(spectra), rtol=1e-5)
+        np.testing.assert_allclose(features['coherence'], whole_window_coherence(analyzer, spectra), atol=1e-5)
+    # Channels 0 and 2 share the alpha rhythm, channel 5 does not
+    alpha = features['coherence'][:, :, list(analyzer.bands).index('alpha')]
+    assert alpha[0, 4] > 10 * alpha[0, 2]
+
+
+def test_long_memmapped_recording_is_read_a_chunk_at_a_time(tmp_path):
+    path = str(tmp_path / 'raw.npy')
+    np.save(path, recording(channels=32, seconds=20 * 60))
+    mapped = np.load(path, mmap_mode='r')
+    analyzer = SpectralAnalyzer(SFREQ, channel_block=16)
+    tracemalloc.start()
+    try:
+        analyzer.features(mapped, channels=list(range(0, 32, 3)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # The selected channels alone are 16 MB as float32, and their segment spectra several times that
+    assert peak < 8 * 2 ** 20
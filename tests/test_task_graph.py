@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from checkpoint import CheckpointStore
+from result_store import ResultStore
+from task_graph import run_crew_tasks
+from tracing import Tracer
+
+
+class FakeTask:
+    """Stand-in crewai task counting its executions."""
+
+    def __init__(self, role):
+        self.agent = SimpleNamespace(role=role)
+        self.description = f'{role} task'
+        self.executions = 0
+
+    def execute(self, context=None):
+        self.executions += 1
+        return f'{self.agent.role} output'
+
+
+class CountingCompactor:
+    def __init__(self):
+        self.compacted = []
+
+    def compact(self, name, description, upstream):
+        self.compacted.append(name)
+        return "\n\n".join(upstream.values())
+
+
+@pytest.mark.parametrize('traced', [True, False])
+def test_replayed_tasks_skip_compaction_and_tracing(tmp_path, traced):
+    tasks = [FakeTask('Researcher'), FakeTask('Writer')]
+    dependencies = [(tasks[1], [tasks[0]])]
+    checkpoint = CheckpointStore('run', root=str(tmp_path / 'checkpoints'))
+    # The first run completes only the researcher's task
+    run_crew_tasks(tasks[:1], checkpoint=checkpoint)
+
+    compactor, tracer = CountingCompactor(), Tracer() if traced else None
+    store = ResultStore(str(tmp_path / 'results'))
+    outputs = run_crew_tasks(tasks, dependencies, checkpoint=checkpoint, tracer=tracer, compactor=compactor,
+                             results=store)
+
+    assert outputs == ['Researcher output', 'Writer output']
+    assert [task.executions for task in tasks] == [1, 1]
+    assert compactor.compacted == ['01_writer']
+    if traced:
+        assert [span.name for span in tracer.spans if span.kind == 'task'] == ['01_writer']
+    assert [(record.task, record.replayed) for record in store.records('run')] == [
+        ('00_researcher', True), ('01_writer', False)]
+
+
+def test_replay_without_tracer_or_results_skips_compaction(tmp_path):
+    task = FakeTask('Researcher')
+    checkpoint = CheckpointStore('run', root=str(tmp_path / 'checkpoints'))
+    run_crew_tasks([task], checkpoint=checkpoint)
+    compactor = CountingCompactor()
+    assert run_crew_tasks([task], checkpoint=checkpoint, compactor=compactor) == ['Researcher output']
+    assert task.executions == 1 and compactor.compacted == []
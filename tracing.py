@@ -0,0 +1,247 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed unit of work (run, task, LLM call or tool call) and the metrics accumulated under it."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, name, parent=None, **attributes):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.metrics = defaultdict(float)
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def ancestors(self):
+        span = self
+        while span is not None:
+            yield span
+            span = span.parent
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'parent': self.parent.id if self.parent else None,
+            'kind': self.kind,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.duration,
+            'thread': self.thread,
+            'attributes': self.attributes,
+            'metrics': dict(self.metrics),
+        }
+
+
+class Tracer:
+    """
+    Records where time and tokens go in a crew run.
+
+    Task spans come from the task runner, LLM spans from a LangChain callback
+    handler attached to every agent's LLM, and tool spans from instrumented
+    tools. Each finished LLM or tool span adds its duration, token usage and
+    call count to every enclosing span, so a task span ends up with its wall
+    time split into LLM time, tool time and the remainder. Cache lookups and
+    retries are counted against whichever span is current in the calling thread.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.origin = time.time()
+        self.handler = TracingCallbackHandler(self)
+        self._lock = threading.Lock()
+
+    def start_span(self, kind, name, **attributes):
+        return Span(kind, name, _current_span.get(), **attributes)
+
+    def finish_span(self, span, **metrics):
+        span.end = time.time()
+        for key, value in metrics.items():
+            span.metrics[key] += value
+        if span.kind in ('llm', 'tool'):
+            totals = {f'{span.kind}_seconds': span.duration, f'{span.kind}_calls': 1, **metrics}
+            for ancestor in span.ancestors():
+                if ancestor is not span:
+                    for key, value in totals.items():
+                        ancestor.metrics[key] += value
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, kind, name, **attributes):
+        span = self.start_span(kind, name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes['error'] = repr(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish_span(span)
+
+    def count(self, metric, value=1):
+        """Add ``value`` to ``metric`` on the current span and everything enclosing it."""
+        span = _current_span.get()
+        if span is not None:
+            for ancestor in span.ancestors():
+                ancestor.metrics[metric] += value
+
+    def watch_cache(self, cache, prefix):
+        """Count hits and misses of a ResponseCache or SearchCache as ``<prefix>_hits`` / ``<prefix>_misses``."""
+        cache.listeners.append(lambda hit: self.count(f'{prefix}_hits' if hit else f'{prefix}_misses'))
+
+    def watch_context(self, compactor):
+        """Count a ContextCompactor's context sizes as ``context_tokens`` and ``context_tokens_saved``."""
+        def record(before, after):
+            self.count('context_tokens', after)
+            self.count('context_tokens_saved', before - after)
+        compactor.listeners.append(record)
+
+    def watch_retries(self, limiter):
+        """Count the retries of a RateLimiter as ``retries``."""
+        limiter.listeners.append(lambda: self.count('retries'))
+
+    def instrument_tool(self, tool):
+        if tool.__dict__.get('_traced'):
+            return tool
+        run = tool._run
+
+        def traced_run(*args, **kwargs):
+            with self.span('tool', tool.name):
+                return run(*args, **kwargs)
+
+        object.__setattr__(tool, '_run', traced_run)
+        object.__setattr__(tool, '_traced', True)
+        return tool
+
+    def instrument(self, agents, tasks=()):
+        """Attach the callback handler to every agent's LLM and time every agent and task tool."""
+        for agent in agents:
+            callbacks = list(agent.llm.callbacks or [])
+            if self.handler not in callbacks:
+                agent.llm.callbacks = callbacks + [self.handler]
+            for tool in agent.tools or []:
+                self.instrument_tool(tool)
+        for task in tasks:
+            for tool in task.tools or []:
+                self.instrument_tool(tool)
+
+    def write(self, output_path):
+        """
+        Write the trace next to ``output_path``: ``<stem>.trace.jsonl`` with one
+        span per line, and ``<stem>.trace.json`` in Chrome trace-event format for
+        chrome://tracing or Perfetto. Returns both paths.
+        """
+        stem = os.path.splitext(output_path)[0]
+        jsonl_path, chrome_path = f"{stem}.trace.jsonl", f"{stem}.trace.json"
+        spans = sorted(self.spans, key=lambda span: span.start)
+
+        with open(jsonl_path, 'w') as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), default=str) + '\n')
+
+        events = [
+            {
+                'name': span.name,
+                'cat': span.kind,
+                'ph': 'X',
+                'ts': (span.start - self.origin) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': os.getpid(),
+                'tid': span.thread,
+                'args': {**span.attributes, **span.metrics},
+            }
+            for span in spans
+        ]
+        with open(chrome_path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file, default=str)
+        return jsonl_path, chrome_path
+
+    def agent_breakdown(self):
+        agents = defaultdict(lambda: defaultdict(float))
+        for span in self.spans:
+            if span.kind == 'task':
+                totals = agents[span.attributes.get('agent', span.name)]
+                totals['tasks'] += 1
+                totals['wall_seconds'] += span.duration
+                for key, value in span.metrics.items():
+                    totals[key] += value
+        return agents
+
+    def summary(self):
+        columns = ('tasks', 'wall_seconds', 'llm_seconds', 'tool_seconds', 'prompt_tokens', 'completion_tokens',
+                   'retries', 'llm_cache_hits')
+        breakdown = sorted(self.agent_breakdown().items(), key=lambda item: item[1]['wall_seconds'], reverse=True)
+        width = max([len('agent')] + [len(agent) for agent, _ in breakdown])
+        lines = [f"{'agent':<{width}}  " + "  ".join(columns)]
+        for agent, totals in breakdown:
+            cells = (f"{totals[column]:>{len(column)},.1f}" for column in columns)
+            lines.append(f"{agent:<{width}}  " + "  ".join(cells))
+        return "\n".join(lines)
+
+
+def _token_usage(response):
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    prompt, completion = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+    if not usage:
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                prompt += metadata.get('input_tokens', 0)
+                completion += metadata.get('output_tokens', 0)
+    return prompt, completion
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler turning LLM calls into Tracer spans."""
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self._spans = {}
+
+    def _start(self, run_id, kwargs):
+        params = kwargs.get('invocation_params') or {}
+        model = params.get('model_name') or params.get('model') or 'llm'
+        self._spans[run_id] = self.tracer.start_span('llm', model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            prompt, completion = _token_usage(response)
+            self.tracer.finish_span(span, prompt_tokens=prompt, completion_tokens=completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.attributes['error'] = repr(error)
+            self.tracer.finish_span(span, errors=1)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        self.tracer.count('retries')